@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic.v1 import BaseSettings
 
 from src import commands
@@ -7,8 +9,23 @@ BOT_COMMANDS = [commands.START, commands.HELP]
 
 class Settings(BaseSettings):
     ASVTTK_DATABASE_URL: str
+    ASVTTK_REPLICA_DATABASE_URL: Optional[str] = None
     ADMIN_ACCESS_KEY: str
     BOT_TOKEN: str
+    DATABASE_DROP_ALL: str = "no"
+    DATABASE_POOL_SIZE: int = 5
+    DATABASE_MAX_OVERFLOW: int = 10
+    DATABASE_POOL_RECYCLE: int = 1800
+    DATABASE_POOL_PRE_PING: bool = True
+    DATABASE_STATEMENT_CACHE_SIZE: int = 100
+    DATABASE_REPLICA_STICKINESS: float = 5.0
+    DATABASE_REPLICA_STICKY_WRITERS: int = 10000
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT: int = 5000
+    SQLITE_FOREIGN_KEYS: bool = True
+    REPORT_WORKERS: int = 2
+    REPORT_QUEUE_SIZE: int = 10
 
     class Config:
         env_file = ".env"
@@ -2,8 +2,8 @@ from typing import Dict, Any, Optional
 
 from aiogram.fsm.storage.base import BaseStorage, StorageKey, StateType
 
-from data.asvttk_service import user_states_service
 from data.asvttk_service.database import database
+from data.asvttk_service.user_states_cache import UserStatesCache
 
 
 TOKEN = "token"
@@ -11,29 +11,31 @@ TOKEN = "token"
 
 class CustomStorage(BaseStorage):
 
-    def __init__(self, ignore_users_id: Optional[list[int]] = None):
+    def __init__(self, ignore_users_id: Optional[list[int]] = None, cache: Optional[UserStatesCache] = None):
         self.ignore_users_id = ignore_users_id if ignore_users_id else []
+        self.cache = cache if cache else UserStatesCache()
 
     async def set_state(self, key: StorageKey, state: StateType = None) -> None:
         if key.user_id in self.ignore_users_id:
             return
         new_state = state.state if state else None
-        await user_states_service.set_state(user_id=key.user_id, chat_id=key.chat_id, state=new_state)
+        await self.cache.set_state(user_id=key.user_id, chat_id=key.chat_id, state=new_state)
 
     async def get_state(self, key: StorageKey) -> Optional[str]:
         if key.user_id in self.ignore_users_id:
             return None
-        return await user_states_service.get_state(user_id=key.user_id, chat_id=key.chat_id)
+        return await self.cache.get_state(user_id=key.user_id, chat_id=key.chat_id)
 
     async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
         if key.user_id in self.ignore_users_id:
             return
-        await user_states_service.set_data(user_id=key.user_id, chat_id=key.chat_id, data=data)
+        await self.cache.set_data(user_id=key.user_id, chat_id=key.chat_id, data=data)
 
     async def get_data(self, key: StorageKey) -> Dict[str, Any]:
         if key.user_id in self.ignore_users_id:
             return dict()
-        return await user_states_service.get_data(user_id=key.user_id, chat_id=key.chat_id)
+        return await self.cache.get_data(user_id=key.user_id, chat_id=key.chat_id)
 
     async def close(self) -> None:
+        await self.cache.close()
         await database.disconnect()
@@ -1,15 +1,18 @@
-import itertools
+import dataclasses
+import functools
 import logging
-import uuid
-from typing import Any
+import secrets
+from typing import Any, Callable, Sequence
 
-from sqlalchemy import select, CursorResult, Result
+from sqlalchemy import select, insert, Row
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import joinedload, defer
+from sqlalchemy.orm.exc import StaleDataError
 from typeguard import typechecked
 
-from data.asvttk_service.database import database
+from data.asvttk_service import report_queries, unit_of_work
+from data.asvttk_service.caches import LRUCache
 from data.asvttk_service.datetime_utils import get_date_str, DateFormat
 from data.asvttk_service.exceptions import *
 from data.asvttk_service.mappers import *
@@ -18,6 +21,7 @@ from data.asvttk_service.types import *
 from data.asvttk_service.utils import *
 from data.asvttk_service.xlsx_generation import xlsx_engine
 from data.asvttk_service.xlsx_generation.tables import RTrainingState, RStudentState, ReportRT
+from data.asvttk_service.xlsx_generation.types import ReportFormat
 
 logger = logging.getLogger(__name__)
 
@@ -29,96 +33,239 @@ class ValidateByTokenData:
         self.key = key
 
 
+class BufferedResult:
+    def __init__(self, rows: Sequence[Row]):
+        self.rows = rows
+
+    def first(self) -> Any:
+        return self.rows[0][0] if self.rows else None
+
+    def all(self) -> list[Any]:
+        return [i[0] for i in self.rows]
+
+
 async def __safe_execute(s: AsyncSession, query: Any,
-                         e: Optional[Exception] = NotFoundError()) -> Result | CursorResult:
+                         e: Optional[Exception] = NotFoundError()) -> BufferedResult:
     res = await s.execute(query)
-    res_items = res.unique().fetchall()
-    if not len(res_items) and e:
+    rows = res.unique().all()
+    if not len(rows) and e:
         raise e
-    res = await s.execute(query)
-    return res
+    return BufferedResult(rows)
 
 
-async def __validate_by_token(s: AsyncSession, token: Optional[str]) -> ValidateByTokenData:
-    if token is None:
-        raise TokenNotValidError()
-    query = await __safe_execute(s, select(SessionOrm).filter(SessionOrm.token == token).with_for_update(),
-                                 TokenNotValidError())
-    session = query.scalars().first()
+CONFLICT_RETRIES = 3
+
+
+def __retry_on_conflict(func):
+    # e: UnknownError
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        for attempt in range(1, CONFLICT_RETRIES + 1):
+            try:
+                return await func(*args, **kwargs)
+            except ConflictError:
+                logger.warning(f"Version conflict in {func.__name__}, attempt {attempt} of {CONFLICT_RETRIES}")
+        raise ConflictError()
+    return wrapper
+
+
+@dataclasses.dataclass(frozen=True)
+class TokenData:
+    session_id: int
+    key_id: int
+    account_id: int
+    account_type: AccountType
+
+
+token_cache = LRUCache(max_size=10000, ttl=600.0)
+
 
-    query = await __safe_execute(s, select(KeyOrm).filter(KeyOrm.id == session.key_id).with_for_update(),
-                                 TokenNotValidError())
-    key: KeyOrm = query.scalars().first()
+def __forget_unit_of_work_tokens():
+    uow = unit_of_work.current()
+    if uow is not None:
+        uow.tokens.clear()
 
-    query = await __safe_execute(s, select(AccountOrm).filter(AccountOrm.id == key.account_id).with_for_update(),
-                                 TokenNotValidError())
-    account: AccountOrm = query.scalars().first()
 
+def __invalidate_token(token: Optional[str]):
+    __forget_unit_of_work_tokens()
+    unit_of_work.invalidate(lambda: token_cache.pop(token))
+
+
+def __invalidate_tokens_by_key(key_id: int):
+    __forget_unit_of_work_tokens()
+    unit_of_work.invalidate(lambda: token_cache.pop_where(lambda k, v: v.key_id == key_id))
+
+
+def __invalidate_tokens_by_accounts(account_ids: list[int]):
+    __forget_unit_of_work_tokens()
+    unit_of_work.invalidate(lambda: token_cache.pop_where(lambda k, v: v.account_id in account_ids))
+
+
+async def __get_token_orms(s: AsyncSession, token: Optional[str]) -> ValidateByTokenData:
+    # e: TokenNotValidError
+    if token is None:
+        raise TokenNotValidError()
+    query = await s.execute(select(SessionOrm, KeyOrm, AccountOrm)
+                            .join(KeyOrm, KeyOrm.id == SessionOrm.key_id)
+                            .join(AccountOrm, AccountOrm.id == KeyOrm.account_id)
+                            .filter(SessionOrm.token == token))
+    row = query.first()
+    if row is None:
+        __invalidate_token(token)
+        raise TokenNotValidError()
+    session, key, account = row
+    token_cache.set(token, TokenData(session.id, key.id, account.id, account.type))
     return ValidateByTokenData(session=session, key=key, account=account)
 
 
-async def __check_access_to_update_training(s: AsyncSession, training_id: int, account_id: int):
-    # e: AccessError, AccountNotFoundError
-    query = await __safe_execute(s, select(AccountOrm).filter(AccountOrm.id == account_id).with_for_update())
-    account: AccountOrm = query.scalars().first()
-    if account.type == AccountType.ADMIN:
+def __get_cached_token(token: str) -> Optional[TokenData]:
+    uow = unit_of_work.current()
+    token_data = uow.tokens.get(token) if uow else None
+    return token_data if token_data is not None else token_cache.get(token)
+
+
+async def __validate_by_token(s: AsyncSession, token: Optional[str]) -> TokenData:
+    # e: TokenNotValidError
+    if token is None:
+        raise TokenNotValidError()
+    uow = unit_of_work.current()
+    token_data = __get_cached_token(token)
+    if token_data is None:
+        query = await s.execute(select(SessionOrm.id, KeyOrm.id, AccountOrm.id, AccountOrm.type)
+                                .join(KeyOrm, KeyOrm.id == SessionOrm.key_id)
+                                .join(AccountOrm, AccountOrm.id == KeyOrm.account_id)
+                                .filter(SessionOrm.token == token))
+        row = query.first()
+        if row is None:
+            raise TokenNotValidError()
+        token_data = TokenData(*row)
+        token_cache.set(token, token_data)
+    if uow is not None:
+        uow.tokens[token] = token_data
+    return token_data
+
+
+training_acl = LRUCache(max_size=10000, ttl=600.0)
+
+
+async def __get_allowed_training_ids(s: AsyncSession, account_id: int) -> frozenset[int]:
+    training_ids = training_acl.get(account_id)
+    if training_ids is None:
+        query = await __safe_execute(s, select(TrainingAndRoleOrm.training_id).distinct()
+                                     .join(RoleAndAccountOrm, RoleAndAccountOrm.role_id == TrainingAndRoleOrm.role_id)
+                                     .filter(RoleAndAccountOrm.account_id == account_id), None)
+        training_ids = frozenset(query.all())
+        training_acl.set(account_id, training_ids)
+    return training_ids
+
+
+async def __get_account_ids_by_role(s: AsyncSession, role_id: int) -> list[int]:
+    query = await __safe_execute(s, select(RoleAndAccountOrm.account_id).filter(RoleAndAccountOrm.role_id == role_id),
+                                 None)
+    return query.all()
+
+
+async def __get_training_ids_by_role(s: AsyncSession, role_id: int) -> list[int]:
+    query = await __safe_execute(s, select(TrainingAndRoleOrm.training_id)
+                                 .filter(TrainingAndRoleOrm.role_id == role_id), None)
+    return query.all()
+
+
+def __acl_add_trainings(account_ids: list[int], training_ids: list[int]):
+    def add():
+        for account_id in account_ids:
+            allowed_training_ids = training_acl.get(account_id)
+            if allowed_training_ids is not None:
+                training_acl.set(account_id, allowed_training_ids | frozenset(training_ids))
+    unit_of_work.after_commit(add)
+
+
+def __acl_invalidate(account_ids: list[int]):
+    def invalidate():
+        for account_id in account_ids:
+            training_acl.pop(account_id)
+    unit_of_work.invalidate(invalidate)
+
+
+async def __check_access_to_update_training(s: AsyncSession, training_id: int, token_data: TokenData):
+    # e: AccessError
+    if token_data.account_type == AccountType.ADMIN:
         return
-    elif account.type == AccountType.EMPLOYEE:
-        query = await s.execute(select(RoleOrm).options(joinedload(RoleOrm.trainings))
-                                .join(RoleAndAccountOrm, RoleOrm.id == RoleAndAccountOrm.role_id)
-                                .filter(RoleAndAccountOrm.account_id == account_id))
-        roles = query.unique().scalars().all()
-        training_ids = list(itertools.chain(*[[n.id for n in i.trainings] for i in roles]))
-        if training_id not in training_ids:
+    elif token_data.account_type == AccountType.EMPLOYEE:
+        if training_id not in await __get_allowed_training_ids(s, token_data.account_id):
             raise AccessError()
-    elif account.type == AccountType.STUDENT:
+    elif token_data.account_type == AccountType.STUDENT:
         raise AccessError()
     else:
         raise TypeError()
 
 
-async def __check_access_to_get_training(s: AsyncSession, training_id: int, account_id: int):
+async def __check_access_to_get_training(s: AsyncSession, training_id: int, token_data: TokenData):
     # e: AccountNotFoundError, AccessError
-    query = await __safe_execute(s, select(AccountOrm).filter(AccountOrm.id == account_id).with_for_update(),
-                                 AccountNotFoundError())
-    account: AccountOrm = query.scalars().first()
-    if account.type == AccountType.ADMIN:
+    if token_data.account_type == AccountType.ADMIN:
         return
-    elif account.type == AccountType.EMPLOYEE:
-        query = await s.execute(select(RoleOrm).options(joinedload(RoleOrm.trainings))
-                                .join(RoleAndAccountOrm, RoleOrm.id == RoleAndAccountOrm.role_id)
-                                .filter(RoleAndAccountOrm.account_id == account_id))
-        roles = query.unique().scalars().all()
-        training_ids = list(itertools.chain(*[[n.id for n in i.trainings] for i in roles]))
-        if training_id not in training_ids:
+    elif token_data.account_type == AccountType.EMPLOYEE:
+        if training_id not in await __get_allowed_training_ids(s, token_data.account_id):
             raise AccessError()
-    elif account.type == AccountType.STUDENT:
+    elif token_data.account_type == AccountType.STUDENT:
+        account = await s.get(AccountOrm, token_data.account_id)
+        if account is None:
+            raise AccountNotFoundError()
         if account.training_id != training_id:
             raise AccessError()
     else:
         raise TypeError()
 
 
-async def __generate_session_token(s: AsyncSession):
-    query = await s.execute(select(SessionOrm).with_for_update())
-    sessions = query.scalars().all()
-    tokens = [i.token for i in sessions]
-    while True:
-        res = str(uuid.uuid4()).replace("-", "")[20:]
-        if res not in tokens:
-            break
-    return res
+KEY_GENERATION_ATTEMPTS = 5
+# Tokens are packed into the callback data of inline buttons, which Telegram limits to 64 bytes:
+# 9 bytes give 12 characters, the length of the former tokens. Access keys never go into callback data.
+SESSION_TOKEN_BYTES = 9
+ACCESS_KEY_BYTES = 16
+
+
+def __new_session_token() -> str:
+    return secrets.token_urlsafe(SESSION_TOKEN_BYTES)
 
 
-async def __generate_access_key(s: AsyncSession):
-    query = await s.execute(select(KeyOrm).with_for_update())
-    keys = query.scalars().all()
-    access_keys = [i.access_key for i in keys]
-    while True:
-        res = str(uuid.uuid4()).replace("-", "")[16:]
-        if res not in access_keys:
-            break
-    return res
+def __new_access_key() -> str:
+    return secrets.token_urlsafe(ACCESS_KEY_BYTES)
+
+
+async def __with_unique_retry(s: AsyncSession, apply: Callable[[], Any]) -> Any:
+    # e: IntegrityError
+    # Uniqueness is left to the unique constraints: a collision only rolls back the savepoint
+    # and apply() runs again with new values.
+    for attempt in range(1, KEY_GENERATION_ATTEMPTS + 1):
+        try:
+            async with s.begin_nested():
+                res = apply()
+            return res
+        except IntegrityError:
+            if attempt == KEY_GENERATION_ATTEMPTS:
+                raise
+
+
+async def __create_access_keys(s: AsyncSession, account_ids: list[int]) -> list[KeyOrm]:
+    def create():
+        keys = [KeyOrm(account_id=i, access_key=__new_access_key()) for i in account_ids]
+        s.add_all(keys)
+        return keys
+    return await __with_unique_retry(s, create)
+
+
+async def __regenerate_access_key(s: AsyncSession, key: KeyOrm):
+    def regenerate():
+        key.access_key = __new_access_key()
+    await __with_unique_retry(s, regenerate)
+
+
+async def __create_session(s: AsyncSession, key_id: int, user_id: int) -> SessionOrm:
+    def create():
+        session = SessionOrm(key_id=key_id, token=__new_session_token(), user_id=user_id)
+        s.add(session)
+        return session
+    return await __with_unique_retry(s, create)
 
 
 def __training_is_active(training: TrainingOrm) -> bool:
@@ -127,9 +274,9 @@ def __training_is_active(training: TrainingOrm) -> bool:
 
 async def __check_training_is_not_active(s: AsyncSession, training_id: int):
     # e: TrainingNotFoundError, TrainingIsActiveError
-    query = await __safe_execute(s, select(TrainingOrm).filter(TrainingOrm.id == training_id).with_for_update(),
+    query = await __safe_execute(s, select(TrainingOrm).filter(TrainingOrm.id == training_id),
                                  TrainingNotFoundError())
-    training = query.scalars().first()
+    training = query.first()
     if __training_is_active(training):
         raise TrainingIsActiveError()
 
@@ -137,11 +284,11 @@ async def __check_training_is_not_active(s: AsyncSession, training_id: int):
 @typechecked
 async def check_training_is_not_active(token: Optional[str], training_id: int):
     # e: TokenNotValidError, UnknownError, TrainingNotFoundError, TrainingIsActiveError, AccessError
-    async with database.session_factory() as s:
+    async with unit_of_work.session(read_only=True) as s:
         try:
             token_data = await __validate_by_token(s, token)
             try:
-                await __check_access_to_get_training(s, training_id, token_data.account.id)
+                await __check_access_to_get_training(s, training_id, token_data)
             except AccountNotFoundError:
                 raise TokenNotValidError()
             await __check_training_is_not_active(s, training_id)
@@ -161,18 +308,18 @@ async def check_training_is_not_active(token: Optional[str], training_id: int):
 
 async def __check_training_is_active(s: AsyncSession, training_id: int):
     # e: TrainingNotFoundError, TrainingIsNotActiveError
-    query = await __safe_execute(s, select(TrainingOrm).filter(TrainingOrm.id == training_id).with_for_update(),
+    query = await __safe_execute(s, select(TrainingOrm).filter(TrainingOrm.id == training_id),
                                  TrainingNotFoundError())
-    training = query.scalars().first()
+    training = query.first()
     if not __training_is_active(training):
         raise TrainingIsNotActiveError()
 
 
 async def __check_training_has_not_students(s: AsyncSession, training_id: int):
     # e: TrainingHasStudentsError
-    query = await s.execute(select(AccountOrm).filter(AccountOrm.type == AccountType.STUDENT,
-                                                      AccountOrm.training_id == training_id).with_for_update())
-    students = query.scalars().all()
+    query = await __safe_execute(s, select(AccountOrm).filter(AccountOrm.type == AccountType.STUDENT,
+                                                           AccountOrm.training_id == training_id), None)
+    students = query.all()
     if students:
         raise TrainingHasStudentsError()
 
@@ -180,11 +327,11 @@ async def __check_training_has_not_students(s: AsyncSession, training_id: int):
 @typechecked()
 async def check_training_has_not_students(token: str, training_id: int):
     # e: TokenNotValidError, UnknownError, AccessError, TrainingHasStudentsError
-    async with database.session_factory() as s:
+    async with unit_of_work.session(read_only=True) as s:
         try:
             token_data = await __validate_by_token(s, token)
             try:
-                await __check_access_to_get_training(s, training_id, token_data.account.id)
+                await __check_access_to_get_training(s, training_id, token_data)
             except AccountNotFoundError:
                 raise TokenNotValidError()
             await __check_training_has_not_students(s, training_id)
@@ -205,11 +352,11 @@ async def check_training_has_not_students(token: str, training_id: int):
 @typechecked
 async def check_training_is_active(token: Optional[str], training_id: int):
     # e: TokenNotValidError, UnknownError, TrainingNotFoundError, TrainingIsNotActiveError, AccessError
-    async with database.session_factory() as s:
+    async with unit_of_work.session(read_only=True) as s:
         token_data = await __validate_by_token(s, token)
         try:
             try:
-                await __check_access_to_get_training(s, training_id, token_data.account.id)
+                await __check_access_to_get_training(s, training_id, token_data)
             except AccountNotFoundError:
                 raise TokenNotValidError()
             await __check_training_is_active(s, training_id)
@@ -232,7 +379,9 @@ async def token_validate(token: Optional[str]):
     # e: TokenNotValidError, UnknownError
     if not token:
         raise TokenNotValidError()
-    async with database.session_factory() as s:
+    if __get_cached_token(token) is not None:
+        return
+    async with unit_of_work.session(read_only=True) as s:
         try:
             await __validate_by_token(s, token)
             await s.commit()
@@ -249,30 +398,36 @@ async def token_validate(token: Optional[str]):
             raise UnknownError()
 
 
+@__retry_on_conflict
 @typechecked
 async def give_up_account(token: Optional[str]) -> GiveUpAccountData:
     # e: TokenNotValidError, UnknownError, AccessError
-    async with database.session_factory() as s:
+    async with unit_of_work.session() as s:
         try:
-            token_data = await __validate_by_token(s, token)
+            token_data = await __get_token_orms(s, token)
             if token_data.account.type != AccountType.ADMIN:
                 raise AccessError()
             token_data.account.first_name = "ADMIN"
             token_data.account.last_name = None
             token_data.account.patronymic = None
             token_data.account.email = None
-            token_data.key.access_key = await __generate_access_key(s)
+            await __regenerate_access_key(s, token_data.key)
             token_data.key.is_first_log_in = True
-            query = await s.execute(select(SessionOrm).filter(SessionOrm.key_id == token_data.key.id))
-            sessions = query.scalars().all()
+            query = await __safe_execute(s, select(SessionOrm).filter(SessionOrm.key_id == token_data.key.id), None)
+            sessions = query.all()
             for i in sessions:
                 await s.delete(i)
             res = GiveUpAccountData(token_data.key.access_key)
+            key_id = token_data.key.id
             await s.commit()
+            __invalidate_tokens_by_key(key_id)
             return res
         except (TokenNotValidError, AccessError) as e:
             await s.rollback()
             raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
@@ -283,17 +438,22 @@ async def give_up_account(token: Optional[str]) -> GiveUpAccountData:
             raise UnknownError()
 
 
+@__retry_on_conflict
 @typechecked
 async def log_out(token: Optional[str]):
     # e: TokenNotValidError, UnknownError
-    async with database.session_factory() as s:
+    async with unit_of_work.session() as s:
         try:
             try:
-                token_data = await __validate_by_token(s, token)
+                token_data = await __get_token_orms(s, token)
                 await s.delete(token_data.session)
             except TokenNotValidError:
                 pass
             await s.commit()
+            __invalidate_token(token)
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
@@ -304,14 +464,15 @@ async def log_out(token: Optional[str]):
             raise UnknownError()
 
 
+@__retry_on_conflict
 @typechecked
 async def get_log_in_data_by_token(token: Optional[str], regenerate_access_key: bool = False) -> LogInData:
     # e: TokenNotValidError, UnknownError
-    async with database.session_factory() as s:
+    async with unit_of_work.session(read_only=not regenerate_access_key) as s:
         try:
-            token_data = await __validate_by_token(s, token)
+            token_data = await __get_token_orms(s, token)
             if regenerate_access_key:
-                token_data.key.access_key = await __generate_access_key(s)
+                await __regenerate_access_key(s, token_data.key)
             res = LogInData(token, token_data.key.is_first_log_in, token_data.key.access_key, token_data.account.type,
                             token_data.account.id)
             await s.commit()
@@ -319,6 +480,9 @@ async def get_log_in_data_by_token(token: Optional[str], regenerate_access_key:
         except TokenNotValidError as e:
             await s.rollback()
             raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
@@ -332,10 +496,11 @@ async def get_log_in_data_by_token(token: Optional[str], regenerate_access_key:
 @typechecked
 async def check_exist_of_access_key(access_key: str):
     # e: KeyNotFoundError, UnknownError
-    async with database.session_factory() as s:
+    async with unit_of_work.session(read_only=True) as s:
         try:
-            query = await s.execute(select(KeyOrm).filter(KeyOrm.access_key == access_key).with_for_update())
-            key = query.scalars().first()
+            query = await __safe_execute(s, select(KeyOrm).filter(KeyOrm.access_key == access_key),
+                                         None)
+            key = query.first()
             if not key:
                 raise KeyNotFoundError
             await s.commit()
@@ -352,36 +517,41 @@ async def check_exist_of_access_key(access_key: str):
             raise UnknownError()
 
 
+@__retry_on_conflict
 @typechecked
 async def log_in(user_id: int, key: str) -> LogInData:
     # e: KeyNotFoundError, UnknownError
-    async with database.session_factory() as s:
+    async with unit_of_work.session() as s:
         try:
             query = await __safe_execute(s, select(KeyOrm).filter(KeyOrm.access_key == key).with_for_update(),
                                          KeyNotFoundError())
-            key: KeyOrm = query.scalars().first()
-            query = await s.execute(select(SessionOrm).filter(SessionOrm.user_id == user_id).with_for_update())
-            c_session: Optional[SessionOrm] = query.scalars().first()
+            key: KeyOrm = query.first()
+            query = await __safe_execute(s, select(SessionOrm).filter(SessionOrm.user_id == user_id)
+                                         .with_for_update(), None)
+            c_session: Optional[SessionOrm] = query.first()
+            c_token = c_session.token if c_session else None
             if c_session:
-                token_data = await __validate_by_token(s, c_session.token)
-                await s.delete(token_data.session)
+                await s.delete(c_session)
             is_first = key.is_first_log_in
             if is_first:
-                key.access_key = await __generate_access_key(s)
+                await __regenerate_access_key(s, key)
                 key.is_first_log_in = False
-            token = await __generate_session_token(s)
-            new_session = SessionOrm(key_id=key.id, token=token, user_id=user_id)
-            s.add(new_session)
-            query = await __safe_execute(s, select(AccountOrm).filter(AccountOrm.id == key.account_id)
-                                         .with_for_update(), KeyNotFoundError())
-            account: AccountOrm = query.scalars().first()
+            new_session = await __create_session(s, key.id, user_id)
+            token = new_session.token
+            query = await __safe_execute(s, select(AccountOrm).filter(AccountOrm.id == key.account_id),
+                                         KeyNotFoundError())
+            account: AccountOrm = query.first()
             res = LogInData(token=token, is_first=is_first, access_key=key.access_key, account_id=account.id,
                             account_type=account.type)
             await s.commit()
+            __invalidate_token(c_token)
             return res
         except KeyNotFoundError as e:
             await s.rollback()
             raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
@@ -395,14 +565,14 @@ async def log_in(user_id: int, key: str) -> LogInData:
 @typechecked
 async def get_account_by_id(token: Optional[str], account_id: Optional[int] = None) -> AccountData:
     # e: TokenNotValidError, UnknownError, NotFoundError, AccessError
-    async with database.session_factory() as s:
+    async with unit_of_work.session(read_only=True) as s:
         try:
             token_data = await __validate_by_token(s, token)
-            account = token_data.account
-            if account_id and account.id != account_id:
-                account = await __safe_execute(s, select(AccountOrm).filter(AccountOrm.id == account_id)
-                                               .with_for_update())
-            if token_data.account.type.value < account.type.value:
+            if not account_id:
+                account_id = token_data.account_id
+            query = await __safe_execute(s, select(AccountOrm).filter(AccountOrm.id == account_id))
+            account: AccountOrm = query.first()
+            if token_data.account_type.value < account.type.value:
                 raise AccessError()
             res = account_orm_to_account_data(account)
             await s.commit()
@@ -423,14 +593,15 @@ async def get_account_by_id(token: Optional[str], account_id: Optional[int] = No
 @typechecked
 async def get_all_employees(token: Optional[str]) -> list[EmployeeData]:
     # e: TokenNotValidError, UnknownError, AccessError
-    async with database.session_factory() as s:
+    async with unit_of_work.session(read_only=True) as s:
         try:
             token_data = await __validate_by_token(s, token)
-            if token_data.account.type != AccountType.ADMIN:
+            if token_data.account_type != AccountType.ADMIN:
                 raise AccessError
-            query = await s.execute(select(AccountOrm).options(joinedload(AccountOrm.roles))
-                                    .filter(AccountOrm.type == AccountType.EMPLOYEE).order_by(AccountOrm.date_create))
-            employees = query.unique().scalars().all()
+            query = await __safe_execute(s, select(AccountOrm).options(joinedload(AccountOrm.roles))
+                                         .filter(AccountOrm.type == AccountType.EMPLOYEE)
+                                         .order_by(AccountOrm.date_create), None)
+            employees = query.all()
             employees_data = []
             for i in employees:
                 roles_data = [role_orm_to_role_data(r) for r in i.roles]
@@ -453,17 +624,17 @@ async def get_all_employees(token: Optional[str]) -> list[EmployeeData]:
 @typechecked
 async def get_employee_by_id(token: Optional[str], employee_id: int) -> EmployeeData:
     # e: TokenNotValidError, UnknownError, AccessError, NotFoundError
-    async with database.session_factory() as s:
+    async with unit_of_work.session(read_only=True) as s:
         try:
             token_data = await __validate_by_token(s, token)
-            if token_data.account.type not in [AccountType.ADMIN, AccountType.EMPLOYEE]:
+            if token_data.account_type not in [AccountType.ADMIN, AccountType.EMPLOYEE]:
                 raise AccessError
-            if token_data.account.type == AccountType.EMPLOYEE and token_data.account.id != employee_id:
+            if token_data.account_type == AccountType.EMPLOYEE and token_data.account_id != employee_id:
                 raise AccessError
             query = await __safe_execute(s, select(AccountOrm).options(joinedload(AccountOrm.roles))
                                          .filter(AccountOrm.type == AccountType.EMPLOYEE,
                                                  AccountOrm.id == employee_id))
-            employee = query.scalars().first()
+            employee = query.first()
             roles_data = [role_orm_to_role_data(r) for r in employee.roles]
             employee_data = account_orm_to_employee_data(employee, roles_data)
             await s.commit()
@@ -491,21 +662,18 @@ async def __create_account(s: AsyncSession, account_type: AccountType, first_nam
                           patronymic=patronymic, training_id=training_id)
     s.add(employee)
     await s.flush()
-    access_key = await __generate_access_key(s)
-    key_orm = KeyOrm(account_id=employee.id, access_key=access_key)
-    s.add(key_orm)
-    await s.flush()
+    key_orm, = await __create_access_keys(s, [employee.id])
     return CreatedAccountData(employee.id, key_orm.access_key)
 
 
 @typechecked
 async def get_account_by_token(token: Optional[str]) -> AccountData | EmployeeData:
     # e: TokenNotValidError, UnknownError, NotFoundError, AccessError
-    async with database.session_factory() as s:
+    async with unit_of_work.session(read_only=True) as s:
         try:
             token_data = await __validate_by_token(s, token)
-            account_id = token_data.account.id
-            account_type = token_data.account.type
+            account_id = token_data.account_id
+            account_type = token_data.account_type
             await s.commit()
             if account_type == AccountType.ADMIN:
                 return await get_account_by_id(token, account_id)
@@ -528,14 +696,15 @@ async def get_account_by_token(token: Optional[str]) -> AccountData | EmployeeDa
             raise UnknownError()
 
 
+@__retry_on_conflict
 @typechecked
 async def create_employee(token: Optional[str], first_name: str, last_name: Optional[str] = None,
                           patronymic: Optional[str] = None, email: Optional[str] = None) -> CreatedAccountData:
     # e: TokenNotValidError, UnknownError, AccessError
-    async with database.session_factory() as s:
+    async with unit_of_work.session() as s:
         try:
             token_data = await __validate_by_token(s, token)
-            if token_data.account.type != AccountType.ADMIN:
+            if token_data.account_type != AccountType.ADMIN:
                 raise AccessError()
             res = await __create_account(s, AccountType.EMPLOYEE, first_name, last_name, patronymic, email)
             await s.commit()
@@ -543,6 +712,9 @@ async def create_employee(token: Optional[str], first_name: str, last_name: Opti
         except (TokenNotValidError, AccessError) as e:
             await s.rollback()
             raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
@@ -553,21 +725,27 @@ async def create_employee(token: Optional[str], first_name: str, last_name: Opti
             raise UnknownError()
 
 
+@__retry_on_conflict
 @typechecked
 async def delete_employee(token: Optional[str], employee_id: int):
     # e: TokenNotValidError, UnknownError, AccessError, NotFoundError
-    async with database.session_factory() as s:
+    async with unit_of_work.session() as s:
         try:
             token_data = await __validate_by_token(s, token)
-            if token_data.account.type != AccountType.ADMIN:
+            if token_data.account_type != AccountType.ADMIN:
                 raise AccessError()
-            query = await __safe_execute(s, select(AccountOrm).filter(AccountOrm.id == employee_id).with_for_update())
-            account_orm = query.scalars().first()
+            query = await __safe_execute(s, select(AccountOrm).filter(AccountOrm.id == employee_id))
+            account_orm = query.first()
             await s.delete(account_orm)
             await s.commit()
+            __invalidate_tokens_by_accounts([employee_id])
+            __acl_invalidate([employee_id])
         except (TokenNotValidError, AccessError, NotFoundError) as e:
             await s.rollback()
             raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
@@ -578,26 +756,33 @@ async def delete_employee(token: Optional[str], employee_id: int):
             raise UnknownError()
 
 
+@__retry_on_conflict
 @typechecked
 async def delete_student(token: Optional[str], student_id: int):
     # e: TokenNotValidError, UnknownError, AccessError, NotFoundError
-    async with database.session_factory() as s:
+    async with unit_of_work.session() as s:
         try:
             token_data = await __validate_by_token(s, token)
-            if token_data.account.type not in [AccountType.ADMIN, AccountType.EMPLOYEE]:
+            if token_data.account_type not in [AccountType.ADMIN, AccountType.EMPLOYEE]:
                 raise AccessError()
             query = await __safe_execute(s, select(AccountOrm).filter(AccountOrm.type == AccountType.STUDENT)
                                          .filter(AccountOrm.id == student_id))
-            student: AccountOrm = query.scalars().first()
+            student: AccountOrm = query.first()
             try:
-                await __check_access_to_get_training(s, student.training_id, token_data.account.id)
+                await __check_access_to_get_training(s, student.training_id, token_data)
             except AccountNotFoundError:
                 raise TokenNotValidError()
+            training_id = student.training_id
             await s.delete(student)
             await s.commit()
+            __invalidate_tokens_by_accounts([student_id])
+            __invalidate_training_report(training_id)
         except (TokenNotValidError, AccessError, NotFoundError) as e:
             await s.rollback()
             raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
@@ -608,20 +793,21 @@ async def delete_student(token: Optional[str], student_id: int):
             raise UnknownError()
 
 
+@__retry_on_conflict
 @typechecked
 async def update_email_account(token: Optional[str], account_id: Optional[int] = None, email: Optional[str] = None):
     # e: TokenNotValidError, UnknownError, AccessError, NotFoundError
-    async with database.session_factory() as s:
+    async with unit_of_work.session() as s:
         try:
             token_data = await __validate_by_token(s, token)
-            if token_data.account.type not in [AccountType.ADMIN, AccountType.EMPLOYEE]:
+            if token_data.account_type not in [AccountType.ADMIN, AccountType.EMPLOYEE]:
                 raise AccessError()
             if not account_id:
-                account_id = token_data.account.id
-            if token_data.account.type == AccountType.EMPLOYEE and account_id != token_data.account.id:
+                account_id = token_data.account_id
+            if token_data.account_type == AccountType.EMPLOYEE and account_id != token_data.account_id:
                 raise AccessError()
-            query = await __safe_execute(s, select(AccountOrm).filter(AccountOrm.id == account_id).with_for_update())
-            account_orm = query.scalars().first()
+            query = await __safe_execute(s, select(AccountOrm).filter(AccountOrm.id == account_id))
+            account_orm = query.first()
             if email == '-':
                 email = None
             email_check(email)
@@ -630,6 +816,9 @@ async def update_email_account(token: Optional[str], account_id: Optional[int] =
         except (TokenNotValidError, AccessError, NotFoundError) as e:
             await s.rollback()
             raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
@@ -640,22 +829,23 @@ async def update_email_account(token: Optional[str], account_id: Optional[int] =
             raise UnknownError()
 
 
+@__retry_on_conflict
 @typechecked
 async def update_full_name_account(token: Optional[str], account_id: int, first_name: Optional[str] = None,
                                    last_name: Optional[str] = None, patronymic: Optional[str] = None):
     # e: TokenNotValidError, UnknownError, AccessError, NotFoundError
-    async with database.session_factory() as s:
+    async with unit_of_work.session() as s:
         try:
             token_data = await __validate_by_token(s, token)
-            if token_data.account.type not in [AccountType.ADMIN, AccountType.EMPLOYEE]:
+            if token_data.account_type not in [AccountType.ADMIN, AccountType.EMPLOYEE]:
                 raise AccessError()
-            query = await __safe_execute(s, select(AccountOrm).filter(AccountOrm.id == account_id).with_for_update())
-            account_orm: AccountOrm = query.scalars().first()
-            if token_data.account.type == AccountType.EMPLOYEE and account_orm.type != AccountType.STUDENT:
+            query = await __safe_execute(s, select(AccountOrm).filter(AccountOrm.id == account_id))
+            account_orm: AccountOrm = query.first()
+            if token_data.account_type == AccountType.EMPLOYEE and account_orm.type != AccountType.STUDENT:
                 raise AccessError()
-            if token_data.account.type == AccountType.EMPLOYEE and account_orm.type == AccountType.STUDENT:
+            if token_data.account_type == AccountType.EMPLOYEE and account_orm.type == AccountType.STUDENT:
                 try:
-                    await __check_access_to_get_training(s, account_orm.training_id, token_data.account.id)
+                    await __check_access_to_get_training(s, account_orm.training_id, token_data)
                 except AccountNotFoundError:
                     raise TokenNotValidError()
             first_name, last_name, patronymic = (None if i == '-' else i for i in (first_name, last_name, patronymic))
@@ -663,10 +853,16 @@ async def update_full_name_account(token: Optional[str], account_id: int, first_
             account_orm.first_name = first_name
             account_orm.last_name = last_name
             account_orm.patronymic = patronymic
+            training_id = account_orm.training_id
             await s.commit()
+            if training_id:
+                __invalidate_training_report(training_id)
         except (TokenNotValidError, AccessError, NotFoundError) as e:
             await s.rollback()
             raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
@@ -677,26 +873,32 @@ async def update_full_name_account(token: Optional[str], account_id: int, first_
             raise UnknownError()
 
 
+@__retry_on_conflict
 @typechecked
 async def add_role_to_employee(token: Optional[str], employee_id: int, role_id: int):
     # e: TokenNotValidError, UnknownError, AccessError, NotFoundError (role), AccountNotFoundError (employee)
-    async with database.session_factory() as s:
+    async with unit_of_work.session() as s:
         try:
             token_data = await __validate_by_token(s, token)
-            if token_data.account.type != AccountType.ADMIN:
+            if token_data.account_type != AccountType.ADMIN:
                 raise AccessError()
             query = await __safe_execute(s, select(AccountOrm).filter(AccountOrm.id == employee_id),
                                          AccountNotFoundError())
-            employee = query.scalars().first()
+            employee = query.first()
             await __safe_execute(s, select(RoleOrm).filter(RoleOrm.id == role_id), NotFoundError())
             if employee.type != AccountType.EMPLOYEE:
                 raise ValueError("Only for employees")
             account_and_role = RoleAndAccountOrm(account_id=employee_id, role_id=role_id)
             s.add(account_and_role)
+            training_ids = await __get_training_ids_by_role(s, role_id)
             await s.commit()
+            __acl_add_trainings([employee_id], training_ids)
         except (TokenNotValidError, AccessError, NotFoundError, AccountNotFoundError) as e:
             await s.rollback()
             raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
@@ -707,22 +909,27 @@ async def add_role_to_employee(token: Optional[str], employee_id: int, role_id:
             raise UnknownError()
 
 
+@__retry_on_conflict
 @typechecked
 async def remove_role_from_employee(token: Optional[str], employee_id: int, role_id: int):
     # e: TokenNotValidError, UnknownError, AccessError, NotFoundError
-    async with database.session_factory() as s:
+    async with unit_of_work.session() as s:
         try:
             token_data = await __validate_by_token(s, token)
-            if token_data.account.type != AccountType.ADMIN:
+            if token_data.account_type != AccountType.ADMIN:
                 raise AccessError()
             query = await __safe_execute(s, select(RoleAndAccountOrm).filter(RoleAndAccountOrm.role_id == role_id)
                                          .filter(RoleAndAccountOrm.account_id == employee_id).with_for_update())
-            account_and_role = query.scalars().first()
+            account_and_role = query.first()
             await s.delete(account_and_role)
             await s.commit()
+            __acl_invalidate([employee_id])
         except (TokenNotValidError, AccessError, NotFoundError) as e:
             await s.rollback()
             raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
@@ -734,13 +941,14 @@ async def remove_role_from_employee(token: Optional[str], employee_id: int, role
 
 
 # Roles
+@__retry_on_conflict
 @typechecked
 async def create_role(token: Optional[str], name: str) -> RoleData:
     # e: TokenNotValidError, UnknownError, AccessError, RoleNotUniqueNameError
-    async with database.session_factory() as s:
+    async with unit_of_work.session() as s:
         try:
             token_data = await __validate_by_token(s, token)
-            if token_data.account.type != AccountType.ADMIN:
+            if token_data.account_type != AccountType.ADMIN:
                 raise AccessError()
             role_name_check(name)
             new_role = RoleOrm(name=name)
@@ -755,6 +963,9 @@ async def create_role(token: Optional[str], name: str) -> RoleData:
         except (TokenNotValidError, AccessError, RoleNotUniqueNameError) as e:
             await s.rollback()
             raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
@@ -765,21 +976,27 @@ async def create_role(token: Optional[str], name: str) -> RoleData:
             raise UnknownError()
 
 
+@__retry_on_conflict
 @typechecked
 async def delete_role(token: Optional[str], role_id: int):
     # e: TokenNotValidError, UnknownError, AccessError, NotFoundError
-    async with database.session_factory() as s:
+    async with unit_of_work.session() as s:
         try:
             token_data = await __validate_by_token(s, token)
-            if token_data.account.type != AccountType.ADMIN:
+            if token_data.account_type != AccountType.ADMIN:
                 raise AccessError()
             query = await __safe_execute(s, select(RoleOrm).filter(RoleOrm.id == role_id).with_for_update())
-            role = query.scalars().first()
+            role = query.first()
+            account_ids = await __get_account_ids_by_role(s, role_id)
             await s.delete(role)
             await s.commit()
+            __acl_invalidate(account_ids)
         except (TokenNotValidError, AccessError, NotFoundError) as e:
             await s.rollback()
             raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
@@ -790,16 +1007,17 @@ async def delete_role(token: Optional[str], role_id: int):
             raise UnknownError()
 
 
+@__retry_on_conflict
 @typechecked
 async def update_role(token: Optional[str], role_id: int, name: str):
     # e: TokenNotValidError, UnknownError, AccessError, NotFoundError, RoleNotUniqueNameError
-    async with database.session_factory() as s:
+    async with unit_of_work.session() as s:
         try:
             token_data = await __validate_by_token(s, token)
-            if token_data.account.type != AccountType.ADMIN:
+            if token_data.account_type != AccountType.ADMIN:
                 raise AccessError()
             query = await __safe_execute(s, select(RoleOrm).filter(RoleOrm.id == role_id).with_for_update())
-            role = query.scalars().first()
+            role = query.first()
             role_name_check(name)
             role.name = name
             try:
@@ -809,6 +1027,9 @@ async def update_role(token: Optional[str], role_id: int, name: str):
         except (TokenNotValidError, AccessError, NotFoundError, RoleNotUniqueNameError) as e:
             await s.rollback()
             raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
@@ -822,24 +1043,24 @@ async def update_role(token: Optional[str], role_id: int, name: str):
 @typechecked
 async def get_all_roles(token: Optional[str], account_id: Optional[int] = None) -> list[RoleData]:
     # e: TokenNotValidError, UnknownError, AccessError, NotFoundError
-    async with database.session_factory() as s:
+    async with unit_of_work.session(read_only=True) as s:
         try:
             token_data = await __validate_by_token(s, token)
-            if token_data.account.type not in [AccountType.ADMIN, AccountType.EMPLOYEE]:
+            if token_data.account_type not in [AccountType.ADMIN, AccountType.EMPLOYEE]:
                 raise AccessError()
             if not account_id:
-                account_id = token_data.account.id
-            if token_data.account.type == AccountType.EMPLOYEE and account_id != token_data.account.id:
+                account_id = token_data.account_id
+            if token_data.account_type == AccountType.EMPLOYEE and account_id != token_data.account_id:
                 raise AccessError()
             query = await __safe_execute(s, select(AccountOrm).options(joinedload(AccountOrm.roles))
                                          .filter(AccountOrm.id == account_id))
-            account = query.unique().scalars().first()
+            account = query.first()
             if account.type == AccountType.EMPLOYEE:
                 res = [role_orm_to_role_data(i) for i in account.roles]
                 res.sort(key=lambda x: x.date_create)
             else:
-                query = await s.execute(select(RoleOrm).order_by(RoleOrm.date_create).with_for_update())
-                res = [role_orm_to_role_data(i) for i in query.scalars().all()]
+                query = await __safe_execute(s, select(RoleOrm).order_by(RoleOrm.date_create), None)
+                res = [role_orm_to_role_data(i) for i in query.all()]
             await s.commit()
             return res
         except (TokenNotValidError, AccessError, NotFoundError) as e:
@@ -858,21 +1079,21 @@ async def get_all_roles(token: Optional[str], account_id: Optional[int] = None)
 @typechecked
 async def get_role_by_id(token: Optional[str], role_id: int) -> RoleData:
     # e: TokenNotValidError, UnknownError, AccessError, NotFoundError
-    async with database.session_factory() as s:
+    async with unit_of_work.session(read_only=True) as s:
         try:
             token_data = await __validate_by_token(s, token)
-            if token_data.account.type not in [AccountType.ADMIN, AccountType.EMPLOYEE]:
+            if token_data.account_type not in [AccountType.ADMIN, AccountType.EMPLOYEE]:
                 raise AccessError
-            if token_data.account.type == AccountType.EMPLOYEE:
+            if token_data.account_type == AccountType.EMPLOYEE:
                 query = await __safe_execute(s, select(AccountOrm).options(joinedload(AccountOrm.roles))
-                                             .filter(AccountOrm.id == token_data.account.id), TokenNotValidError())
-                account = query.unique().scalars().first()
+                                             .filter(AccountOrm.id == token_data.account_id), TokenNotValidError())
+                account = query.first()
                 allowed_role_ids = [i.id for i in account.roles]
                 if role_id not in allowed_role_ids:
                     raise AccessError()
             query = await __safe_execute(s, select(RoleOrm).options(joinedload(RoleOrm.accounts))
                                          .options(joinedload(RoleOrm.trainings)).filter(RoleOrm.id == role_id))
-            role = query.unique().scalars().first()
+            role = query.first()
             trainings = [training_orm_to_training_data(i, None, None) for i in role.trainings]
             accounts = [account_orm_to_account_data(i) for i in role.accounts]
             role_data = role_orm_to_role_data(role, trainings, accounts)
@@ -891,23 +1112,28 @@ async def get_role_by_id(token: Optional[str], role_id: int) -> RoleData:
             raise UnknownError()
 
 
+@__retry_on_conflict
 @typechecked
 async def add_training_to_role(token: Optional[str], role_id: int, training_id: int):
     # e: TokenNotValidError, UnknownError, AccessError, NotFoundError (role), TrainingNotFoundError (training)
-    async with database.session_factory() as s:
+    async with unit_of_work.session() as s:
         try:
             token_data = await __validate_by_token(s, token)
-            if token_data.account.type != AccountType.ADMIN:
+            if token_data.account_type != AccountType.ADMIN:
                 raise AccessError()
-            await __safe_execute(s, select(TrainingOrm).filter(TrainingOrm.id == training_id)
-                                 .with_for_update(), TrainingNotFoundError())
+            await __safe_execute(s, select(TrainingOrm).filter(TrainingOrm.id == training_id), TrainingNotFoundError())
             await __safe_execute(s, select(RoleOrm).filter(RoleOrm.id == role_id).with_for_update())
             training_and_role = TrainingAndRoleOrm(training_id=training_id, role_id=role_id)
             s.add(training_and_role)
+            account_ids = await __get_account_ids_by_role(s, role_id)
             await s.commit()
+            __acl_add_trainings(account_ids, [training_id])
         except (TokenNotValidError, AccessError, NotFoundError, TrainingNotFoundError) as e:
             await s.rollback()
             raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
@@ -918,22 +1144,28 @@ async def add_training_to_role(token: Optional[str], role_id: int, training_id:
             raise UnknownError()
 
 
+@__retry_on_conflict
 @typechecked
 async def remove_training_from_role(token: Optional[str], role_id: int, training_id: int):
     # e: TokenNotValidError, UnknownError, AccessError, NotFoundError
-    async with database.session_factory() as s:
+    async with unit_of_work.session() as s:
         try:
             token_data = await __validate_by_token(s, token)
-            if token_data.account.type != AccountType.ADMIN:
+            if token_data.account_type != AccountType.ADMIN:
                 raise AccessError()
             query = await __safe_execute(s, select(TrainingAndRoleOrm).filter(TrainingAndRoleOrm.role_id == role_id)
                                          .filter(TrainingAndRoleOrm.training_id == training_id).with_for_update())
-            training_and_role = query.scalars().first()
+            training_and_role = query.first()
+            account_ids = await __get_account_ids_by_role(s, role_id)
             await s.delete(training_and_role)
             await s.commit()
+            __acl_invalidate(account_ids)
         except (TokenNotValidError, AccessError, NotFoundError) as e:
             await s.rollback()
             raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
@@ -945,19 +1177,20 @@ async def remove_training_from_role(token: Optional[str], role_id: int, training
 
 
 # Trainings
+@__retry_on_conflict
 @typechecked
 async def create_training(token: Optional[str], name: str, start_text: Optional[str] = None,
                           html_start_text: Optional[str] = None, role_id: Optional[int] = None) -> TrainingData:
     # e: TokenNotValidError, UnknownError, AccessError, NotChooseRoleError
-    async with database.session_factory() as s:
+    async with unit_of_work.session() as s:
         try:
             token_data = await __validate_by_token(s, token)
-            if token_data.account.type not in [AccountType.ADMIN, AccountType.EMPLOYEE]:
+            if token_data.account_type not in [AccountType.ADMIN, AccountType.EMPLOYEE]:
                 raise AccessError()
-            if token_data.account.type == AccountType.EMPLOYEE:
+            if token_data.account_type == AccountType.EMPLOYEE:
                 query = await __safe_execute(s, select(AccountOrm).options(joinedload(AccountOrm.roles))
-                                             .filter(AccountOrm.id == token_data.account.id), TokenNotValidError())
-                account = query.unique().scalars().first()
+                                             .filter(AccountOrm.id == token_data.account_id), TokenNotValidError())
+                account = query.first()
                 allowed_role_ids = [i.id for i in account.roles]
                 if role_id is None and len(allowed_role_ids) == 1:
                     role_id = allowed_role_ids[0]
@@ -975,14 +1208,20 @@ async def create_training(token: Optional[str], name: str, start_text: Optional[
             s.add(new_training)
             await s.flush()
             training_data = training_orm_to_training_data(new_training, None, None)
+            account_ids = []
             if role_id:
                 training_and_role = TrainingAndRoleOrm(role_id=role_id, training_id=new_training.id)
                 s.add(training_and_role)
+                account_ids = await __get_account_ids_by_role(s, role_id)
             await s.commit()
+            __acl_add_trainings(account_ids, [training_data.id])
             return training_data
         except (TokenNotValidError, AccessError, NotChooseRoleError) as e:
             await s.rollback()
             raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
@@ -996,24 +1235,24 @@ async def create_training(token: Optional[str], name: str, start_text: Optional[
 @typechecked
 async def get_all_trainings(token: Optional[str]):
     # e: TokenNotValidError, UnknownError, AccessError
-    async with database.session_factory() as s:
+    async with unit_of_work.session(read_only=True) as s:
         try:
             token_data = await __validate_by_token(s, token)
-            if token_data.account.type not in [AccountType.ADMIN, AccountType.EMPLOYEE]:
+            if token_data.account_type not in [AccountType.ADMIN, AccountType.EMPLOYEE]:
                 raise AccessError()
-            if token_data.account.type == AccountType.EMPLOYEE:
+            if token_data.account_type == AccountType.EMPLOYEE:
                 await __safe_execute(s, select(RoleOrm).join(RoleAndAccountOrm, RoleOrm.id == RoleAndAccountOrm.role_id)
-                                     .filter(RoleAndAccountOrm.account_id == token_data.account.id), AccessError())
-                query = await s.execute(select(TrainingOrm).options(joinedload(TrainingOrm.students))
-                                        .join(TrainingAndRoleOrm, TrainingOrm.id == TrainingAndRoleOrm.training_id)
-                                        .join(RoleOrm, TrainingAndRoleOrm.role_id == RoleOrm.id)
-                                        .join(RoleAndAccountOrm, RoleOrm.id == RoleAndAccountOrm.role_id)
-                                        .filter(RoleAndAccountOrm.account_id == token_data.account.id)
-                                        .order_by(TrainingOrm.date_create))
+                                     .filter(RoleAndAccountOrm.account_id == token_data.account_id), AccessError())
+                training_ids = await __get_allowed_training_ids(s, token_data.account_id)
+                query = await __safe_execute(s, select(TrainingOrm).options(joinedload(TrainingOrm.students))
+                                             .options(defer(TrainingOrm.message))
+                                             .filter(TrainingOrm.id.in_(training_ids))
+                                             .order_by(TrainingOrm.date_create), None)
             else:
-                query = await s.execute(select(TrainingOrm).options(joinedload(TrainingOrm.students))
-                                        .order_by(TrainingOrm.date_create))
-            trainings = query.unique().scalars().all()
+                query = await __safe_execute(s, select(TrainingOrm).options(joinedload(TrainingOrm.students))
+                                             .options(defer(TrainingOrm.message))
+                                             .order_by(TrainingOrm.date_create), None)
+            trainings = query.all()
             trainings_data = []
             for i in trainings:
                 students_data = [account_orm_to_student_data(n, None, None) for n in i.students]
@@ -1036,16 +1275,16 @@ async def get_all_trainings(token: Optional[str]):
 @typechecked
 async def get_training_by_id(token: Optional[str], training_id: int) -> TrainingData:
     # e: TokenNotValidError, UnknownError, AccessError, NotFoundError
-    async with database.session_factory() as s:
+    async with unit_of_work.session(read_only=True) as s:
         try:
             token_data = await __validate_by_token(s, token)
             try:
-                await __check_access_to_get_training(s, training_id, token_data.account.id)
+                await __check_access_to_get_training(s, training_id, token_data)
             except AccountNotFoundError:
                 raise TokenNotValidError()
             query = await __safe_execute(s, select(TrainingOrm).options(joinedload(TrainingOrm.students))
                                          .options(joinedload(TrainingOrm.levels)).filter(TrainingOrm.id == training_id))
-            training = query.unique().scalars().first()
+            training = query.first()
             students_data = [account_orm_to_student_data(i, None, None) for i in training.students]
             levels_data = [level_orm_to_level_data(i, None, None, None) for i in training.levels]
             training_data = training_orm_to_training_data(training, students_data, levels_data)
@@ -1064,27 +1303,32 @@ async def get_training_by_id(token: Optional[str], training_id: int) -> Training
             raise UnknownError()
 
 
+@__retry_on_conflict
 @typechecked
 async def update_start_msg_training(token: Optional[str], training_id: int, msg: list[Message]):
     # e: TokenNotValidError, UnknownError, AccessError, TrainingNotFoundError, TrainingIsActiveError,
     # TrainingHasStudentsError
-    async with database.session_factory() as s:
+    async with unit_of_work.session() as s:
         try:
             token_data = await __validate_by_token(s, token)
             try:
-                await __check_access_to_update_training(s, training_id, token_data.account.id)
+                await __check_access_to_update_training(s, training_id, token_data)
             except AccountNotFoundError:
                 raise TokenNotValidError()
-            query = await __safe_execute(s, select(TrainingOrm).filter(TrainingOrm.id == training_id).with_for_update())
-            training = query.scalars().first()
+            query = await __safe_execute(s, select(TrainingOrm).filter(TrainingOrm.id == training_id))
+            training = query.first()
             await __check_training_is_not_active(s, training_id)
             await __check_training_has_not_students(s, training_id)
             training.message = msg
             await s.commit()
+            __invalidate_training_report(training_id)
         except (TokenNotValidError, AccessError, TrainingNotFoundError, TrainingIsActiveError,
                 TrainingHasStudentsError) as e:
             await s.rollback()
             raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
@@ -1095,18 +1339,19 @@ async def update_start_msg_training(token: Optional[str], training_id: int, msg:
             raise UnknownError()
 
 
+@__retry_on_conflict
 @typechecked
 async def delete_training(token: Optional[str], training_id: int):
     # e: TokenNotValidError, UnknownError, AccessError, NotFoundError, TrainingIsActiveError, TrainingHasStudentsError
-    async with database.session_factory() as s:
+    async with unit_of_work.session() as s:
         try:
             token_data = await __validate_by_token(s, token)
             try:
-                await __check_access_to_update_training(s, training_id, token_data.account.id)
+                await __check_access_to_update_training(s, training_id, token_data)
             except AccountNotFoundError:
                 raise TokenNotValidError()
-            query = await __safe_execute(s, select(TrainingOrm).filter(TrainingOrm.id == training_id).with_for_update())
-            training = query.scalars().first()
+            query = await __safe_execute(s, select(TrainingOrm).filter(TrainingOrm.id == training_id))
+            training = query.first()
             try:
                 await __check_training_is_not_active(s, training_id)
                 await __check_training_has_not_students(s, training_id)
@@ -1114,9 +1359,14 @@ async def delete_training(token: Optional[str], training_id: int):
                 raise NotFoundError()
             await s.delete(training)
             await s.commit()
+            __forget_level_manifest(training_id)
+            __forget_training_report(training_id)
         except (TokenNotValidError, AccessError, NotFoundError, TrainingIsActiveError, TrainingHasStudentsError) as e:
             await s.rollback()
             raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
@@ -1127,18 +1377,19 @@ async def delete_training(token: Optional[str], training_id: int):
             raise UnknownError()
 
 
+@__retry_on_conflict
 @typechecked
 async def update_name_training(token: Optional[str], training_id: int, name: Optional[str] = None):
     # e: TokenNotValidError, UnknownError, AccessError, NotFoundError, TrainingIsActiveError, TrainingHasStudentsError
-    async with database.session_factory() as s:
+    async with unit_of_work.session() as s:
         try:
             token_data = await __validate_by_token(s, token)
             try:
-                await __check_access_to_update_training(s, training_id, token_data.account.id)
+                await __check_access_to_update_training(s, training_id, token_data)
             except AccountNotFoundError:
                 raise TokenNotValidError()
-            query = await __safe_execute(s, select(TrainingOrm).filter(TrainingOrm.id == training_id).with_for_update())
-            training = query.scalars().first()
+            query = await __safe_execute(s, select(TrainingOrm).filter(TrainingOrm.id == training_id))
+            training = query.first()
             try:
                 await __check_training_is_not_active(s, training_id)
                 await __check_training_has_not_students(s, training_id)
@@ -1146,9 +1397,13 @@ async def update_name_training(token: Optional[str], training_id: int, name: Opt
                 raise NotFoundError()
             training.name = name
             await s.commit()
+            __invalidate_training_report(training_id)
         except (TokenNotValidError, AccessError, NotFoundError, TrainingIsActiveError, TrainingHasStudentsError) as e:
             await s.rollback()
             raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
@@ -1159,33 +1414,41 @@ async def update_name_training(token: Optional[str], training_id: int, name: Opt
             raise UnknownError()
 
 
+@__retry_on_conflict
 @typechecked
 async def start_training(token: Optional[str], training_id: int):
     # e: TokenNotValidError, UnknownError, AccessError, NotFoundError, TrainingIsEmptyError,
     # TrainingAlreadyHasThisStateError
-    async with database.session_factory() as s:
+    async with unit_of_work.session() as s:
         try:
             token_data = await __validate_by_token(s, token)
             try:
-                await __check_access_to_update_training(s, training_id, token_data.account.id)
+                await __check_access_to_update_training(s, training_id, token_data)
             except AccountNotFoundError:
                 raise TokenNotValidError()
             query = await __safe_execute(s, select(TrainingOrm).options(joinedload(TrainingOrm.students))
                                          .options(joinedload(TrainingOrm.levels)).filter(TrainingOrm.id == training_id))
-            training = query.unique().scalars().first()
+            training = query.first()
             if len(training.levels) == 0:
                 raise TrainingIsEmptyError()
             if __training_is_active(training):
                 raise TrainingAlreadyHasThisStateError()
             training.date_start = get_current_time()
             training.date_end = None
+            student_ids = [i.id for i in training.students]
             for student in training.students:
                 await s.delete(student)
             await s.commit()
+            __invalidate_level_manifest(training_id)
+            __invalidate_training_report(training_id)
+            __invalidate_tokens_by_accounts(student_ids)
         except (TokenNotValidError, AccessError, NotFoundError, TrainingIsEmptyError,
                 TrainingAlreadyHasThisStateError) as e:
             await s.rollback()
             raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
@@ -1196,25 +1459,31 @@ async def start_training(token: Optional[str], training_id: int):
             raise UnknownError()
 
 
+@__retry_on_conflict
 @typechecked
 async def stop_training(token: Optional[str], training_id: int):
     # e: TokenNotValidError, UnknownError, AccessError, NotFoundError, TrainingAlreadyHasThisStateError
-    async with database.session_factory() as s:
+    async with unit_of_work.session() as s:
         try:
             token_data = await __validate_by_token(s, token)
             try:
-                await __check_access_to_update_training(s, training_id, token_data.account.id)
+                await __check_access_to_update_training(s, training_id, token_data)
             except AccountNotFoundError:
                 raise TokenNotValidError()
-            query = await __safe_execute(s, select(TrainingOrm).filter(TrainingOrm.id == training_id).with_for_update())
-            training = query.scalars().first()
+            query = await __safe_execute(s, select(TrainingOrm).filter(TrainingOrm.id == training_id))
+            training = query.first()
             if not (training.date_start and not training.date_end):
                 raise TrainingAlreadyHasThisStateError()
             training.date_end = get_current_time()
             await s.commit()
+            __invalidate_level_manifest(training_id)
+            __invalidate_training_report(training_id)
         except (TokenNotValidError, AccessError, NotFoundError, TrainingAlreadyHasThisStateError) as e:
             await s.rollback()
             raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
@@ -1225,28 +1494,36 @@ async def stop_training(token: Optional[str], training_id: int):
             raise UnknownError()
 
 
+@__retry_on_conflict
 @typechecked
 async def clear_training(token: Optional[str], training_id: int):
     # e: TokenNotValidError, UnknownError, AccessError, NotFoundError, TrainingIsActiveError
-    async with database.session_factory() as s:
+    async with unit_of_work.session() as s:
         try:
             token_data = await __validate_by_token(s, token)
             try:
-                await __check_access_to_update_training(s, training_id, token_data.account.id)
+                await __check_access_to_update_training(s, training_id, token_data)
             except AccountNotFoundError:
                 raise TokenNotValidError()
-            await __safe_execute(s, select(TrainingOrm).filter(TrainingOrm.id == training_id).with_for_update())
+            await __safe_execute(s, select(TrainingOrm).filter(TrainingOrm.id == training_id))
             query = await __safe_execute(s, select(TrainingOrm).options(joinedload(TrainingOrm.students))
                                          .options(joinedload(TrainingOrm.levels)).filter(TrainingOrm.id == training_id))
-            training = query.unique().scalars().first()
+            training = query.first()
             await __check_training_is_not_active(s, training_id)
             training.date_start, training.date_end = None, None
+            student_ids = [i.id for i in training.students]
             for student in training.students:
                 await s.delete(student)
             await s.commit()
+            __invalidate_level_manifest(training_id)
+            __invalidate_training_report(training_id)
+            __invalidate_tokens_by_accounts(student_ids)
         except (TokenNotValidError, AccessError, NotFoundError, TrainingIsActiveError) as e:
             await s.rollback()
             raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
@@ -1258,34 +1535,34 @@ async def clear_training(token: Optional[str], training_id: int):
 
 
 # Levels
+@__retry_on_conflict
 @typechecked
 async def create_level(token: Optional[str], level_type: str, training_id: int, title: str, messages: list[Message]):
     # e: TokenNotValidError, UnknownError, AccessError, TrainingNotFoundError, TrainingIsActiveError,
     # TrainingHasStudentsError
-    async with database.session_factory() as s:
+    async with unit_of_work.session() as s:
         try:
             token_data = await __validate_by_token(s, token)
             try:
-                await __check_access_to_update_training(s, training_id, token_data.account.id)
+                await __check_access_to_update_training(s, training_id, token_data)
             except AccountNotFoundError:
                 raise TokenNotValidError()
             await __check_training_is_not_active(s, training_id)
             await __check_training_has_not_students(s, training_id)
-            query = await s.execute(select(LevelOrm).filter(LevelOrm.training_id == training_id,
-                                                            LevelOrm.next_level_id == None).with_for_update())
-            last_level = query.scalars().first()
-            last_level_id = last_level.id if last_level else None
-            level = LevelOrm(previous_level_id=last_level_id, training_id=training_id, type=level_type,
-                             title=title, messages=messages)
+            position = await __get_last_level_position(s, training_id) + LEVEL_POSITION_STEP
+            level = LevelOrm(position=position, training_id=training_id, type=level_type, title=title,
+                             messages=messages)
             s.add(level)
-            await s.flush()
-            if last_level:
-                last_level.next_level_id = level.id
             await s.commit()
+            __invalidate_level_manifest(training_id)
+            __invalidate_training_report(training_id)
         except (TokenNotValidError, AccessError, TrainingNotFoundError, TrainingIsActiveError,
                 TrainingHasStudentsError) as e:
             await s.rollback()
             raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
@@ -1296,28 +1573,35 @@ async def create_level(token: Optional[str], level_type: str, training_id: int,
             raise UnknownError()
 
 
+@__retry_on_conflict
 @typechecked
 async def update_content_level_by_id(token: Optional[str], level_type: str, level_id: int, messages: list[Message]):
     # e: TokenNotValidError, UnknownError, AccessError, NotFoundError, TrainingNotFoundError, TrainingIsActiveError,
     # TrainingHasStudentsError
-    async with database.session_factory() as s:
+    async with unit_of_work.session() as s:
         try:
             token_data = await __validate_by_token(s, token)
-            query = await __safe_execute(s, select(LevelOrm).filter(LevelOrm.id == level_id).with_for_update())
-            level = query.scalars().first()
+            query = await __safe_execute(s, select(LevelOrm).filter(LevelOrm.id == level_id))
+            level = query.first()
             try:
-                await __check_access_to_update_training(s, level.training_id, token_data.account.id)
+                await __check_access_to_update_training(s, level.training_id, token_data)
             except AccountNotFoundError:
                 raise TokenNotValidError()
             await __check_training_is_not_active(s, level.training_id)
             await __check_training_has_not_students(s, level.training_id)
             level.messages = messages
             level.type = level_type
+            training_id = level.training_id
             await s.commit()
+            __invalidate_level_manifest(training_id)
+            __invalidate_training_report(training_id)
         except (TokenNotValidError, AccessError, NotFoundError, TrainingNotFoundError, TrainingIsActiveError,
                 TrainingHasStudentsError) as e:
             await s.rollback()
             raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
@@ -1328,27 +1612,34 @@ async def update_content_level_by_id(token: Optional[str], level_type: str, leve
             raise UnknownError()
 
 
+@__retry_on_conflict
 @typechecked
 async def update_title_level_by_id(token: Optional[str], level_id: int, title: str):
     # e: TokenNotValidError, UnknownError, AccessError, NotFoundError, TrainingNotFoundError, TrainingIsActiveError,
     # TrainingHasStudentsError
-    async with database.session_factory() as s:
+    async with unit_of_work.session() as s:
         try:
             token_data = await __validate_by_token(s, token)
-            query = await __safe_execute(s, select(LevelOrm).filter(LevelOrm.id == level_id).with_for_update())
-            level = query.scalars().first()
+            query = await __safe_execute(s, select(LevelOrm).filter(LevelOrm.id == level_id))
+            level = query.first()
             try:
-                await __check_access_to_update_training(s, level.training_id, token_data.account.id)
+                await __check_access_to_update_training(s, level.training_id, token_data)
             except AccountNotFoundError:
                 raise TokenNotValidError()
             await __check_training_is_not_active(s, level.training_id)
             await __check_training_has_not_students(s, level.training_id)
             level.title = title
+            training_id = level.training_id
             await s.commit()
+            __invalidate_level_manifest(training_id)
+            __invalidate_training_report(training_id)
         except (TokenNotValidError, AccessError, NotFoundError, TrainingNotFoundError, TrainingIsActiveError,
                 TrainingHasStudentsError) as e:
             await s.rollback()
             raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
@@ -1359,36 +1650,34 @@ async def update_title_level_by_id(token: Optional[str], level_id: int, title: s
             raise UnknownError()
 
 
+@__retry_on_conflict
 @typechecked
 async def delete_level_by_id(token: Optional[str], level_id: int):
     # e: TokenNotValidError, UnknownError, AccessError, NotFoundError, TrainingNotFoundError, TrainingIsActiveError,
     # TrainingHasStudentsError
-    async with database.session_factory() as s:
+    async with unit_of_work.session() as s:
         try:
             token_data = await __validate_by_token(s, token)
-            query = await __safe_execute(s, select(LevelOrm).filter(LevelOrm.id == level_id).with_for_update())
-            level = query.scalars().first()
+            query = await __safe_execute(s, select(LevelOrm).filter(LevelOrm.id == level_id))
+            level = query.first()
             try:
-                await __check_access_to_update_training(s, level.training_id, token_data.account.id)
+                await __check_access_to_update_training(s, level.training_id, token_data)
             except AccountNotFoundError:
                 raise TokenNotValidError()
             await __check_training_is_not_active(s, level.training_id)
             await __check_training_has_not_students(s, level.training_id)
-            if level.next_level_id:
-                query = await s.execute(select(LevelOrm).filter(LevelOrm.id == level.next_level_id).with_for_update())
-                next_level = query.scalars().first()
-                next_level.previous_level_id = level.previous_level_id
-            if level.previous_level_id:
-                query = await s.execute(
-                    select(LevelOrm).filter(LevelOrm.id == level.previous_level_id).with_for_update())
-                previous_level = query.scalars().first()
-                previous_level.next_level_id = level.next_level_id
             await s.delete(level)
+            training_id = level.training_id
             await s.commit()
+            __invalidate_level_manifest(training_id)
+            __invalidate_training_report(training_id)
         except (TokenNotValidError, AccessError, NotFoundError, TrainingNotFoundError, TrainingIsActiveError,
                 TrainingHasStudentsError) as e:
             await s.rollback()
             raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
@@ -1399,39 +1688,151 @@ async def delete_level_by_id(token: Optional[str], level_id: int):
             raise UnknownError()
 
 
-async def __get_levels_sorted(s: AsyncSession, training_id: int) -> list[LevelOrm]:
+@__retry_on_conflict
+@typechecked
+async def move_level_by_id(token: Optional[str], level_id: int, previous_level_id: Optional[int] = None):
+    # e: TokenNotValidError, UnknownError, AccessError, NotFoundError, TrainingNotFoundError, TrainingIsActiveError,
+    # TrainingHasStudentsError
+    async with unit_of_work.session() as s:
+        try:
+            token_data = await __validate_by_token(s, token)
+            query = await __safe_execute(s, select(LevelOrm).filter(LevelOrm.id == level_id))
+            level = query.first()
+            try:
+                await __check_access_to_update_training(s, level.training_id, token_data)
+            except AccountNotFoundError:
+                raise TokenNotValidError()
+            await __check_training_is_not_active(s, level.training_id)
+            await __check_training_has_not_students(s, level.training_id)
+            previous_level = None
+            if previous_level_id is not None:
+                query = await __safe_execute(s, select(LevelOrm).filter(LevelOrm.id == previous_level_id,
+                                                                     LevelOrm.training_id == level.training_id))
+                previous_level = query.first()
+            if previous_level_id != level_id:
+                level.position = await __get_position_after(s, level.training_id, level_id, previous_level)
+            training_id = level.training_id
+            await s.commit()
+            __invalidate_level_manifest(training_id)
+            __invalidate_training_report(training_id)
+        except (TokenNotValidError, AccessError, NotFoundError, TrainingNotFoundError, TrainingIsActiveError,
+                TrainingHasStudentsError) as e:
+            await s.rollback()
+            raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
+        except SQLAlchemyError as e:
+            await s.rollback()
+            logger.error(f"SQLAlchemyError occurred: {str(e)}")
+            raise UnknownError()
+        except Exception as e:
+            await s.rollback()
+            logger.error(f"Exception occurred: {str(e)}")
+            raise UnknownError()
+
+
+async def __get_levels_sorted(s: AsyncSession, training_id: int, with_messages: bool = True) -> list[LevelOrm]:
+    # e: TrainingNotFoundError
+    query = select(TrainingOrm).filter(TrainingOrm.id == training_id)
+    levels_query = select(LevelOrm).filter(LevelOrm.training_id == training_id).order_by(LevelOrm.position, LevelOrm.id)
+    if with_messages:
+        levels_query = levels_query.options(joinedload(LevelOrm.training))
+    else:
+        query = query.options(defer(TrainingOrm.message))
+        levels_query = levels_query.options(defer(LevelOrm.messages),
+                                            joinedload(LevelOrm.training).defer(TrainingOrm.message))
+    await __safe_execute(s, query, TrainingNotFoundError())
+    query = await __safe_execute(s, levels_query, None)
+    return query.all()
+
+
+@dataclasses.dataclass
+class LevelManifest:
+    version: int
+    levels: list[LevelData]
+    levels_by_id: dict[int, LevelData]
+
+
+level_manifests = LRUCache(max_size=1000)
+training_versions: dict[int, int] = {}
+
+
+def __invalidate_level_manifest(training_id: int):
+    def invalidate():
+        training_versions[training_id] = training_versions.get(training_id, 0) + 1
+        level_manifests.pop(training_id)
+    unit_of_work.invalidate(invalidate)
+
+
+def __forget_level_manifest(training_id: int):
+    # A deleted training is not read again, so its version goes with the manifest and the dict stays bounded.
+    def forget():
+        training_versions.pop(training_id, None)
+        level_manifests.pop(training_id)
+    unit_of_work.invalidate(forget)
+
+
+async def __get_level_manifest(s: AsyncSession, training_id: int) -> LevelManifest:
     # e: TrainingNotFoundError
-    await __safe_execute(s, select(TrainingOrm).filter(TrainingOrm.id == training_id).with_for_update(),
-                         TrainingNotFoundError())
-    query = await s.execute(select(LevelOrm).options(joinedload(LevelOrm.training))
-                            .filter(LevelOrm.training_id == training_id))
-    levels = query.unique().scalars().all()
-    first_level = next((lvl for lvl in levels if lvl.previous_level_id is None), None)
-    if first_level is None:
-        return []
-    levels_sorted = []
-    current_level = first_level
-    while current_level is not None:
-        levels_sorted.append(current_level)
-        current_level = next((lvl for lvl in levels if lvl.id == current_level.next_level_id), None)
-    return levels_sorted
+    version = training_versions.get(training_id, 0)
+    manifest = level_manifests.get(training_id)
+    if manifest is not None and manifest.version == version:
+        return manifest
+    levels = await __get_levels_sorted(s, training_id)
+    levels_data = []
+    for index, i in enumerate(levels):
+        previous_level_id = levels[index - 1].id if index > 0 else None
+        next_level_id = levels[index + 1].id if index + 1 < len(levels) else None
+        levels_data.append(level_orm_to_level_data(i, index + 1, None, None, previous_level_id, next_level_id))
+    manifest = LevelManifest(version, levels_data, {i.id: i for i in levels_data})
+    if training_versions.get(training_id, 0) == version:
+        level_manifests.set(training_id, manifest)
+    return manifest
+
+
+async def __get_last_level_position(s: AsyncSession, training_id: int) -> int:
+    query = await __safe_execute(s, select(LevelOrm.position).filter(LevelOrm.training_id == training_id)
+                                 .order_by(LevelOrm.position.desc()).limit(1), None)
+    position = query.first()
+    return position if position is not None else 0
+
+
+async def __get_position_after(s: AsyncSession, training_id: int, level_id: int,
+                               previous_level: Optional[LevelOrm]) -> int:
+    where = [LevelOrm.training_id == training_id, LevelOrm.id != level_id]
+    if previous_level:
+        where.append(LevelOrm.position > previous_level.position)
+    query = await __safe_execute(s, select(LevelOrm.position).filter(*where).order_by(LevelOrm.position).limit(1),
+                                 None)
+    lower = previous_level.position if previous_level else 0
+    upper = query.first()
+    if upper is None:
+        return lower + LEVEL_POSITION_STEP
+    if upper - lower > 1:
+        return (lower + upper) // 2
+    levels = await __get_levels_sorted(s, training_id, with_messages=False)
+    for i, level in enumerate(levels, 1):
+        level.position = i * LEVEL_POSITION_STEP
+    await s.flush()
+    return await __get_position_after(s, training_id, level_id, previous_level)
 
 
 @typechecked
 async def get_levels_by_training(token: Optional[str], training_id: int) -> list[LevelData]:
     # e: TokenNotValidError, UnknownError, AccessError, TrainingNotFoundError
-    async with database.session_factory() as s:
+    async with unit_of_work.session(read_only=True) as s:
         try:
             token_data = await __validate_by_token(s, token)
             try:
-                await __check_access_to_update_training(s, training_id, token_data.account.id)
+                await __check_access_to_update_training(s, training_id, token_data)
             except AccountNotFoundError:
                 raise TokenNotValidError()
-            levels: Any = await __get_levels_sorted(s, training_id)
+            levels: Any = await __get_levels_sorted(s, training_id, with_messages=False)
             levels_data = []
-            for i in levels:
+            for index, i in enumerate(levels):
                 training_data = training_orm_to_training_data(i.training, None, None)
-                levels_data.append(level_orm_to_level_data(i, levels.index(i) + 1, training_data, None))
+                levels_data.append(level_orm_to_level_data(i, index + 1, training_data, None))
             await s.commit()
             return levels_data
         except (TokenNotValidError, AccessError, TrainingNotFoundError) as e:
@@ -1450,23 +1851,26 @@ async def get_levels_by_training(token: Optional[str], training_id: int) -> list
 @typechecked
 async def get_level_by_id(token: Optional[str], level_id: int) -> LevelData:
     # e: TokenNotValidError, UnknownError, AccessError, NotFoundError
-    async with database.session_factory() as s:
+    async with unit_of_work.session(read_only=True) as s:
         try:
             token_data = await __validate_by_token(s, token)
             query = await __safe_execute(s, select(LevelOrm).options(joinedload(LevelOrm.training))
                                          .options(joinedload(LevelOrm.answers)).filter(LevelOrm.id == level_id))
-            level = query.unique().scalars().first()
-            levels: Any = await __get_levels_sorted(s, level.training_id)
+            level = query.first()
+            levels: Any = await __get_levels_sorted(s, level.training_id, with_messages=False)
             index = next((i for i in range(len(levels)) if levels[i].id == level_id), None)
             if index is None:
                 raise ValueError
+            previous_level_id = levels[index - 1].id if index > 0 else None
+            next_level_id = levels[index + 1].id if index + 1 < len(levels) else None
             try:
-                await __check_access_to_update_training(s, level.training_id, token_data.account.id)
+                await __check_access_to_update_training(s, level.training_id, token_data)
             except AccountNotFoundError:
                 raise TokenNotValidError()
             training_data = training_orm_to_training_data(level.training, None, None)
             answers = [level_answer_orm_to_level_answer_data(i, None, None) for i in level.answers]
-            level_data = level_orm_to_level_data(level, index + 1, training_data, answers=answers)
+            level_data = level_orm_to_level_data(level, index + 1, training_data, answers=answers,
+                                                 previous_level_id=previous_level_id, next_level_id=next_level_id)
             await s.commit()
             return level_data
         except (TokenNotValidError, AccessError, NotFoundError) as e:
@@ -1483,25 +1887,85 @@ async def get_level_by_id(token: Optional[str], level_id: int) -> LevelData:
 
 
 # Students
+@__retry_on_conflict
 @typechecked
 async def create_student(token: Optional[str], training_id: int, first_name: str, last_name: Optional[str] = None,
                          patronymic: Optional[str] = None) -> CreatedAccountData:
     # e: TokenNotValidError, UnknownError, AccessError, TrainingIsNotActiveError, TrainingNotFoundError
-    async with database.session_factory() as s:
+    async with unit_of_work.session() as s:
         try:
             token_data = await __validate_by_token(s, token)
             try:
-                await __check_access_to_update_training(s, training_id, token_data.account.id)
+                await __check_access_to_update_training(s, training_id, token_data)
             except AccountNotFoundError:
                 raise TokenNotValidError()
             await __check_training_is_active(s, training_id)
             res = await __create_account(s, AccountType.STUDENT, first_name, last_name, patronymic,
                                          training_id=training_id)
+            manifest = await __get_level_manifest(s, training_id)
+            student = await s.get(AccountOrm, res.account_id)
+            __set_current_level(student, manifest.levels, set())
             await s.commit()
+            __invalidate_training_report(training_id)
             return res
         except (TokenNotValidError, AccessError, TrainingIsNotActiveError, TrainingNotFoundError) as e:
             await s.rollback()
             raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
+        except SQLAlchemyError as e:
+            await s.rollback()
+            logger.error(f"SQLAlchemyError occurred: {str(e)}")
+            raise UnknownError()
+        except Exception as e:
+            await s.rollback()
+            logger.error(f"Exception occurred: {str(e)}")
+            raise UnknownError()
+
+
+@__retry_on_conflict
+@typechecked
+async def create_students(token: Optional[str], training_id: int,
+                          full_names: list[tuple[Optional[str], str, Optional[str]]]) -> list[CreatedAccountData]:
+    # e: TokenNotValidError, UnknownError, AccessError, TrainingIsNotActiveError, TrainingNotFoundError
+    # full_names: (last_name, first_name, patronymic) for each student, the result keeps their order.
+    async with unit_of_work.session() as s:
+        try:
+            token_data = await __validate_by_token(s, token)
+            try:
+                await __check_access_to_update_training(s, training_id, token_data)
+            except AccountNotFoundError:
+                raise TokenNotValidError()
+            await __check_training_is_active(s, training_id)
+            for last_name, first_name, patronymic in full_names:
+                initials_check(first_name, last_name, patronymic)
+            manifest = await __get_level_manifest(s, training_id)
+            # As __set_current_level does for a student without answers: the first level, or completed if none.
+            if manifest.levels:
+                progress = dict(current_level_id=manifest.levels[0].id, progress_state=StudentProgressState.CREATED,
+                                date_complete_training=None)
+            else:
+                progress = dict(current_level_id=None, progress_state=StudentProgressState.COMPLETED,
+                                date_complete_training=get_current_time())
+            rows = [dict(type=AccountType.STUDENT, first_name=first_name, last_name=last_name, patronymic=patronymic,
+                         training_id=training_id, **progress)
+                    for last_name, first_name, patronymic in full_names]
+            res = []
+            if rows:
+                query = await s.execute(insert(AccountOrm).returning(AccountOrm.id, sort_by_parameter_order=True),
+                                        rows)
+                keys = await __create_access_keys(s, list(query.scalars()))
+                res = [CreatedAccountData(i.account_id, i.access_key) for i in keys]
+            await s.commit()
+            __invalidate_training_report(training_id)
+            return res
+        except (TokenNotValidError, AccessError, TrainingIsNotActiveError, TrainingNotFoundError) as e:
+            await s.rollback()
+            raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
@@ -1515,20 +1979,20 @@ async def create_student(token: Optional[str], training_id: int, first_name: str
 @typechecked
 async def get_student_by_id(token: Optional[str], student_id: int) -> StudentData:
     # e: TokenNotValidError, UnknownError, AccessError, NotFoundError
-    async with database.session_factory() as s:
+    async with unit_of_work.session(read_only=True) as s:
         try:
             token_data = await __validate_by_token(s, token)
             query = await __safe_execute(s, select(AccountOrm).options(joinedload(AccountOrm.training))
                                          .options(joinedload(AccountOrm.answers))
                                          .filter(AccountOrm.type == AccountType.STUDENT, AccountOrm.id == student_id))
-            student = query.unique().scalars().first()
+            student = query.first()
             if student.type != AccountType.STUDENT:
                 raise ValueError()
-            if token_data.account.type == AccountType.STUDENT and token_data.account.id != student_id:
+            if token_data.account_type == AccountType.STUDENT and token_data.account_id != student_id:
                 raise AccessError
-            if token_data.account.type == AccountType.EMPLOYEE:
+            if token_data.account_type == AccountType.EMPLOYEE:
                 try:
-                    await __check_access_to_update_training(s, student.training_id, token_data.account.id)
+                    await __check_access_to_update_training(s, student.training_id, token_data)
                 except AccountNotFoundError:
                     raise TokenNotValidError()
             training = training_orm_to_training_data(student.training, None, None)
@@ -1549,51 +2013,52 @@ async def get_student_by_id(token: Optional[str], student_id: int) -> StudentDat
             raise UnknownError()
 
 
+def __set_current_level(student: AccountOrm, levels: list[LevelData], answered_level_ids: set[int]):
+    current_level = next((i for i in levels if i.id not in answered_level_ids), None)
+    student.current_level_id = current_level.id if current_level else None
+    if current_level is None:
+        student.progress_state = StudentProgressState.COMPLETED
+        student.date_complete_training = get_current_time()
+    elif student.answered_count:
+        student.progress_state = StudentProgressState.LEARNING
+    else:
+        student.progress_state = StudentProgressState.CREATED
+
+
+def __student_orm_to_progress_data(student: AccountOrm, training: TrainingOrm, manifest: LevelManifest,
+                                   answers: Optional[list[LevelAnswerOrm]]) -> StudentProgressData:
+    current_level = manifest.levels_by_id.get(student.current_level_id) if student.current_level_id else None
+    answers_data = None
+    if answers is not None:
+        answers_data = [level_answer_orm_to_level_answer_data(i, None, None) for i in answers]
+    student_data = account_orm_to_student_data(student, None, None)
+    training_data = training_orm_to_training_data(training, None, manifest.levels)
+    return StudentProgressData(is_access=__training_is_active(training), student=student_data,
+                               progress_state=student.progress_state, current_level=current_level,
+                               answered_count=student.answered_count, correct_count=student.correct_count,
+                               answers=answers_data, training=training_data)
+
+
 @typechecked
 async def get_all_student_progresses(token: Optional[str], training_id: int) -> list[StudentProgressData]:
     # e: TokenNotValidError, UnknownError, AccessError, TrainingNotFoundError
-    async with database.session_factory() as s:
+    async with unit_of_work.session(read_only=True) as s:
         try:
             token_data = await __validate_by_token(s, token)
-            if token_data.account.type == AccountType.EMPLOYEE:
+            if token_data.account_type == AccountType.EMPLOYEE:
                 try:
-                    await __check_access_to_update_training(s, training_id, token_data.account.id)
+                    await __check_access_to_update_training(s, training_id, token_data)
                 except AccountNotFoundError:
                     raise TokenNotValidError()
-            query = await __safe_execute(s, select(TrainingOrm).filter(TrainingOrm.id == training_id).with_for_update(),
+            query = await __safe_execute(s, select(TrainingOrm).options(defer(TrainingOrm.message))
+                                         .filter(TrainingOrm.id == training_id),
                                          TrainingNotFoundError())
-            training = query.scalars().first()
-            query = await s.execute(select(AccountOrm).options(joinedload(AccountOrm.training))
-                                    .options(joinedload(AccountOrm.answers).joinedload(LevelAnswerOrm.level))
-                                    .filter(AccountOrm.type == AccountType.STUDENT)
-                                    .filter(AccountOrm.training_id == training_id))
-            students = query.unique().scalars().all()
-            is_access = __training_is_active(training)
-            all_levels: Any = await __get_levels_sorted(s, training_id)
-            res = []
-            for student in students:
-                level_ids_by_answers = [i.level_id for i in student.answers]
-                not_completed_levels = [i for i in all_levels if i.id not in level_ids_by_answers]
-                progress_state = StudentProgressState.COMPLETED
-                current_level = None
-                if len(not_completed_levels) == len(all_levels):
-                    progress_state = StudentProgressState.CREATED
-                    current_level = not_completed_levels[0]
-                elif not_completed_levels:
-                    progress_state = StudentProgressState.LEARNING
-                    current_level = not_completed_levels[0]
-                answers_data = [level_answer_orm_to_level_answer_data(i, None, None) for i in student.answers]
-                student_data = account_orm_to_student_data(student, None, None)
-                if current_level:
-                    current_level_data = level_orm_to_level_data(current_level, None, None, None)
-                else:
-                    current_level_data = None
-                all_level = [level_orm_to_level_data(i, None, None, None) for i in all_levels]
-                training_data = training_orm_to_training_data(student.training, None, all_level)
-                result = StudentProgressData(is_access=is_access, student=student_data, progress_state=progress_state,
-                                             current_level=current_level_data, answers=answers_data,
-                                             training=training_data)
-                res.append(result)
+            training = query.first()
+            query = await __safe_execute(s, select(AccountOrm).filter(AccountOrm.type == AccountType.STUDENT)
+                                         .filter(AccountOrm.training_id == training_id), None)
+            students = query.all()
+            manifest = await __get_level_manifest(s, training_id)
+            res = [__student_orm_to_progress_data(i, training, manifest, None) for i in students]
             await s.commit()
             return res
         except (TokenNotValidError, AccessError, TrainingNotFoundError) as e:
@@ -1612,48 +2077,26 @@ async def get_all_student_progresses(token: Optional[str], training_id: int) ->
 @typechecked
 async def get_student_progress(token: Optional[str], student_id: Optional[int] = None) -> StudentProgressData:
     # e: TokenNotValidError, UnknownError, AccessError, NotFoundError
-    async with database.session_factory() as s:
+    async with unit_of_work.session(read_only=True) as s:
         try:
             token_data = await __validate_by_token(s, token)
             if not student_id:
-                student_id = token_data.account.id
-            if token_data.account.type == AccountType.STUDENT and student_id != token_data.account.id:
+                student_id = token_data.account_id
+            if token_data.account_type == AccountType.STUDENT and student_id != token_data.account_id:
                 raise AccessError()
             query = await __safe_execute(s, select(AccountOrm).options(joinedload(AccountOrm.training))
-                                         .options(joinedload(AccountOrm.answers).joinedload(LevelAnswerOrm.level))
+                                         .options(joinedload(AccountOrm.answers))
                                          .filter(AccountOrm.type == AccountType.STUDENT, AccountOrm.id == student_id))
-            student = query.scalars().first()
-            if token_data.account.type == AccountType.EMPLOYEE:
+            student = query.first()
+            if token_data.account_type == AccountType.EMPLOYEE:
                 try:
-                    await __check_access_to_update_training(s, student.training_id, token_data.account.id)
+                    await __check_access_to_update_training(s, student.training_id, token_data)
                 except AccountNotFoundError:
                     raise TokenNotValidError()
-            is_access = __training_is_active(student.training)
-            all_levels: Any = await __get_levels_sorted(s, student.training_id)
-
-            level_ids_by_answers = [i.level_id for i in student.answers]
-            not_completed_levels = [i for i in all_levels if i.id not in level_ids_by_answers]
-            progress_state = StudentProgressState.COMPLETED
-            current_level = None
-            if len(not_completed_levels) == len(all_levels):
-                progress_state = StudentProgressState.CREATED
-                current_level = not_completed_levels[0]
-            elif not_completed_levels:
-                progress_state = StudentProgressState.LEARNING
-                current_level = not_completed_levels[0]
-            answers_data = [level_answer_orm_to_level_answer_data(i, None, None) for i in student.answers]
-            student_data = account_orm_to_student_data(student, None, None)
-            if current_level:
-                current_level_data = level_orm_to_level_data(current_level, None, None, None)
-            else:
-                current_level_data = None
-            all_level = [level_orm_to_level_data(i, None, None, None) for i in all_levels]
-            training_data = training_orm_to_training_data(student.training, None, all_level)
-            res = StudentProgressData(is_access=is_access, student=student_data, progress_state=progress_state,
-                                      current_level=current_level_data, answers=answers_data, training=training_data)
+            manifest = await __get_level_manifest(s, student.training_id)
+            res = __student_orm_to_progress_data(student, student.training, manifest, student.answers)
             await s.commit()
             return res
-
         except (TokenNotValidError, AccessError, NotFoundError) as e:
             await s.rollback()
             raise e
@@ -1680,66 +2123,142 @@ def __training_state_to_r_training_state(is_active: bool) -> RTrainingState:
     return RTrainingState.INACTIVE
 
 
-def __student_state_to_r_student_state(student: AccountOrm, levels: list[LevelOrm]) -> RStudentState:
-    level_ids_by_answers = [i.level_id for i in student.answers]
-    not_completed_levels = [i for i in levels if i.id not in level_ids_by_answers]
-    progress_state = RStudentState.COMPLETED
-    if len(not_completed_levels) == len(levels):
-        progress_state = RStudentState.CREATED
-    elif not_completed_levels:
-        progress_state = RStudentState.LEARNING
-    return progress_state
+def __student_state_to_r_student_state(it: StudentProgressState) -> RStudentState:
+    if it == StudentProgressState.CREATED:
+        return RStudentState.CREATED
+    elif it == StudentProgressState.LEARNING:
+        return RStudentState.LEARNING
+    return RStudentState.COMPLETED
+
+
+def __student_orm_to_student_rt(student: AccountOrm, stats: report_queries.StudentStats, level_count: int) -> StudentRT:
+    state = __student_state_to_r_student_state(stats.get_progress_state(level_count))
+    return account_orm_to_student_rt(student, state, stats.get_progress(level_count), stats.answered_count,
+                                     stats.correct_count)
+
+
+@dataclasses.dataclass
+class CachedReport:
+    version: int
+    file_id: str
+    date_create: int
+
+
+report_cache = LRUCache(max_size=1000)
+report_versions: dict[int, int] = {}
+
+
+def __invalidate_training_report(training_id: int):
+    def invalidate():
+        report_versions[training_id] = report_versions.get(training_id, 0) + 1
+        report_cache.pop_where(lambda k, v: k[0] == training_id)
+    unit_of_work.invalidate(invalidate)
+
+
+def __forget_training_report(training_id: int):
+    def forget():
+        report_versions.pop(training_id, None)
+        report_cache.pop_where(lambda k, v: k[0] == training_id)
+    unit_of_work.invalidate(forget)
+
+
+def cache_training_report(report: TrainingReportData, file_id: str):
+    if report_versions.get(report.training_id, 0) == report.version:
+        report_cache.set((report.training_id, report.report_format),
+                         CachedReport(report.version, file_id, report.date_create))
+
+
+async def __check_access_to_training_report(s: AsyncSession, training_id: int, token_data: TokenData):
+    # e: TokenNotValidError, AccessError, TrainingNotFoundError
+    if token_data.account_type == AccountType.EMPLOYEE:
+        try:
+            await __check_access_to_update_training(s, training_id, token_data)
+        except AccountNotFoundError:
+            raise TokenNotValidError()
+
+
+@typechecked
+async def get_cached_training_report(token: Optional[str], training_id: int,
+                                     report_format: str = ReportFormat.XLSX) -> Optional[TrainingReportData]:
+    # e: TokenNotValidError, UnknownError, AccessError, TrainingNotFoundError
+    async with unit_of_work.session(read_only=True) as s:
+        try:
+            token_data = await __validate_by_token(s, token)
+            await __check_access_to_training_report(s, training_id, token_data)
+            cached_report: Optional[CachedReport] = report_cache.get((training_id, report_format))
+            if cached_report is None or cached_report.version != report_versions.get(training_id, 0):
+                return None
+            training = await s.get(TrainingOrm, training_id)
+            if training is None:
+                raise TrainingNotFoundError()
+            account = await s.get(AccountOrm, token_data.account_id)
+            if account is None:
+                raise TokenNotValidError()
+            res = TrainingReportData(None, cached_report.date_create, training_id, training.name,
+                                     account_orm_to_account_data(account), cached_report.version,
+                                     report_format, cached_report.file_id)
+            await s.commit()
+            return res
+        except (TokenNotValidError, AccessError, TrainingNotFoundError) as e:
+            await s.rollback()
+            raise e
+        except SQLAlchemyError as e:
+            await s.rollback()
+            logger.error(f"SQLAlchemyError occurred: {str(e)}")
+            raise UnknownError()
+        except Exception as e:
+            await s.rollback()
+            logger.error(f"Exception occurred: {str(e)}")
+            raise UnknownError()
 
 
 # noinspection PyTypeChecker
 @typechecked
-async def get_training_report(token: Optional[str], training_id: int) -> TrainingReportData:
+async def get_training_report(token: Optional[str], training_id: int,
+                              report_format: str = ReportFormat.XLSX) -> TrainingReportData:
     # e: TokenNotValidError, UnknownError, AccessError, TrainingNotFoundError
-    async with database.session_factory() as s:
+    async with unit_of_work.session(read_only=True) as s:
         try:
             token_data = await __validate_by_token(s, token)
-            if token_data.account.type == AccountType.EMPLOYEE:
-                try:
-                    await __check_access_to_update_training(s, training_id, token_data.account.id)
-                except AccountNotFoundError:
-                    raise TokenNotValidError()
+            await __check_access_to_training_report(s, training_id, token_data)
+            version = report_versions.get(training_id, 0)
             levels = await __get_levels_sorted(s, training_id)
-            query = await __safe_execute(s, select(TrainingOrm).filter(TrainingOrm.id == training_id)
-                                         .with_for_update(), TrainingNotFoundError())
-            training: TrainingOrm = query.scalars().first()
-            await s.execute(select(AccountOrm).filter(AccountOrm.training_id == training_id)
-                            .with_for_update(), None)
-            query = await s.execute(select(AccountOrm)
-                                    .options(joinedload(AccountOrm.answers).joinedload(LevelAnswerOrm.level))
-                                    .filter(AccountOrm.training_id == training_id))
-            students: list[AccountOrm] = query.unique().scalars().all()
-            level_answers = list(itertools.chain(*[i.answers for i in students]))
-            level_answers.sort(key=lambda x: x.date_create)
-
+            query = await __safe_execute(s, select(TrainingOrm).filter(TrainingOrm.id == training_id),
+                                         TrainingNotFoundError())
+            training: TrainingOrm = query.first()
+            account = await s.get(AccountOrm, token_data.account_id)
+            if account is None:
+                raise TokenNotValidError()
+            account_data = account_orm_to_account_data(account)
+            query = await __safe_execute(s, select(AccountOrm).filter(AccountOrm.training_id == training_id), None)
+            students: list[AccountOrm] = query.all()
+            student_stats = await report_queries.get_student_stats(s, training_id)
+            level_stats = await report_queries.get_level_stats(s, training_id)
+            levels_by_id = {i.id: i for i in levels}
             training_state = __training_state_to_r_training_state(__training_is_active(training))
-            training_rt = training_orm_to_training_rt(training, training_state)
-            levels_rt = []
-            for i in range(len(levels)):
-                level_type = __level_type_to_r_level_type(levels[i].type)
-                levels_rt.append(level_orm_to_level_rt(levels[i], i + 1, level_type))
-            students_rt = []
-            for student in students:
-                level_ids_by_answers = [i.level_id for i in student.answers]
-                progress_percent = len(level_ids_by_answers) / len(levels)
-                student_state = __student_state_to_r_student_state(student, levels)
-                students_rt.append(account_orm_to_student_rt(student, student_state, progress_percent))
-            answers_rt = []
-            for answer in level_answers:
-                answers_rt.append(level_answer_orm_to_answer_rt(answer, answer.level, training_id))
             report_date_create = datetime.utcnow()
             report_date_create_timestamp = int(report_date_create.timestamp())
-            report_rt = ReportRT(date_create=report_date_create)
-            await s.commit()
+
+            async def get_tables():
+                # Answers come from the server-side cursor while the worker writes them. The transaction is finished
+                # once every row is queued, the worker does not need it to finish the file.
+                async for i in report_queries.stream_answers(s, training_id):
+                    yield level_answer_orm_to_answer_rt(i, levels_by_id[i.level_id], training_id)
+                for n, i in enumerate(levels, 1):
+                    yield level_orm_to_level_rt(i, n, __level_type_to_r_level_type(i.type),
+                                                level_stats[i.id].answered_count, level_stats[i.id].correct_rate)
+                for i in students:
+                    yield __student_orm_to_student_rt(i, student_stats[i.id], len(levels))
+                yield training_orm_to_training_rt(training, training_state)
+                yield ReportRT(date_create=report_date_create)
+
             date = get_date_str(report_date_create_timestamp, DateFormat.FORMAT_FULL_2)
-            tables = [*answers_rt, *levels_rt, *students_rt, training_rt, report_rt]
             table_types = [AnswerRT, LevelRT, StudentRT, TrainingRT, ReportRT]
-            report_file = await xlsx_engine.create_xlsx(f"Report_{training_id}_{date}", table_types, tables)
-            return TrainingReportData(report_file, report_date_create_timestamp, training_id)
+            training_name = training.name
+            report_file = await xlsx_engine.create_report(f"Report_{training_id}_{date}", table_types, get_tables(),
+                                                          report_format, s.commit)
+            return TrainingReportData(report_file, report_date_create_timestamp, training_id, training_name,
+                                      account_data, version, report_format)
         except (TokenNotValidError, AccessError, TrainingNotFoundError) as e:
             await s.rollback()
             raise e
@@ -1754,56 +2273,125 @@ async def get_training_report(token: Optional[str], training_id: int) -> Trainin
 
 
 # LevelAnswer
+async def __record_level_answer(s: AsyncSession, student: AccountOrm, level: LevelData,
+                                answer_option_ids: Optional[list[int]]) -> LevelAnswerOrm:
+    # e: LevelAnswerAlreadyExistsError
+    if level.type == LevelType.CONTROL and answer_option_ids:
+        msg: Message = level.messages[0]
+        is_correct = msg.poll.correct_option_id == answer_option_ids[0]
+        level_answer = LevelAnswerOrm(account_id=student.id, level_id=level.id, is_correct=is_correct,
+                                      answer_option_ids=answer_option_ids)
+    elif level.type == LevelType.INFO:
+        level_answer = LevelAnswerOrm(account_id=student.id, level_id=level.id)
+    else:
+        raise ValueError()
+
+    s.add(level_answer)
+    try:
+        await s.flush()
+    except IntegrityError:
+        raise LevelAnswerAlreadyExistsError()
+    student.answered_count += 1
+    student.correct_count += 1 if level_answer.is_correct else 0
+    if student.current_level_id in (None, level.id):
+        manifest = await __get_level_manifest(s, level.training_id)
+        query = await __safe_execute(s, select(LevelAnswerOrm.level_id)
+                                     .filter(LevelAnswerOrm.account_id == student.id), None)
+        __set_current_level(student, manifest.levels, set(query.all()))
+    elif student.progress_state == StudentProgressState.CREATED:
+        student.progress_state = StudentProgressState.LEARNING
+    return level_answer
+
+
+@__retry_on_conflict
 @typechecked
 async def create_level_answer(token: Optional[str], level_id: int,
                               answer_option_ids: Optional[list[int]] = None) -> LevelAnswerData:
     # e: TokenNotValidError, UnknownError, AccessError, NotFoundError, TrainingIsNotActiveError,
     # LevelAnswerAlreadyExistsError
-    async with database.session_factory() as s:
+    async with unit_of_work.session() as s:
         try:
             token_data = await __validate_by_token(s, token)
-            if token_data.account.type != AccountType.STUDENT:
+            if token_data.account_type != AccountType.STUDENT:
                 raise AccessError
-            query = await __safe_execute(s, select(LevelOrm).filter(LevelOrm.id == level_id).with_for_update())
-            level = query.scalars().first()
+            query = await __safe_execute(s, select(LevelOrm).filter(LevelOrm.id == level_id))
+            level = query.first()
             try:
-                await __check_access_to_get_training(s, level.training_id, token_data.account.id)
+                await __check_access_to_get_training(s, level.training_id, token_data)
             except AccountNotFoundError:
                 raise TokenNotValidError()
             try:
                 await __check_training_is_active(s, level.training_id)
             except TrainingNotFoundError:
                 raise NotFoundError()
-            query = await s.execute(select(LevelAnswerOrm)
-                                    .filter(LevelAnswerOrm.level_id == level_id,
-                                            LevelAnswerOrm.account_id == token_data.account.id)
-                                    .with_for_update())
-            exist_level_answer = query.scalars().first()
-            if exist_level_answer:
-                raise LevelAnswerAlreadyExistsError()
-
-            if level.type == LevelType.CONTROL and answer_option_ids:
-                msg: Message = level.messages[0]
-                is_correct = msg.poll.correct_option_id == answer_option_ids[0]
-                level_answer = LevelAnswerOrm(account_id=token_data.account.id, level_id=level_id,
-                                              is_correct=is_correct,
-                                              answer_option_ids=answer_option_ids)
-            elif level.type == LevelType.INFO:
-                level_answer = LevelAnswerOrm(account_id=token_data.account.id, level_id=level_id)
-            else:
-                raise ValueError()
-
-            s.add(level_answer)
-            await s.flush()
             level_data = level_orm_to_level_data(level, None, None, None)
-            student = account_orm_to_student_data(token_data.account, None, None)
+            account = await s.get(AccountOrm, token_data.account_id)
+            level_answer = await __record_level_answer(s, account, level_data, answer_option_ids)
+            student = account_orm_to_student_data(account, None, None)
             res = level_answer_orm_to_level_answer_data(level_answer, level_data, student)
             await s.commit()
+            __invalidate_training_report(level_data.training_id)
             return res
         except (TokenNotValidError, AccessError, NotFoundError, TrainingIsNotActiveError,
                 LevelAnswerAlreadyExistsError) as e:
             await s.rollback()
             raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
+        except SQLAlchemyError as e:
+            await s.rollback()
+            logger.error(f"SQLAlchemyError occurred: {str(e)}")
+            raise UnknownError()
+        except Exception as e:
+            await s.rollback()
+            logger.error(f"Exception occurred: {str(e)}")
+            raise UnknownError()
+
+
+@__retry_on_conflict
+@typechecked
+async def advance_student(token: Optional[str], level_id: Optional[int] = None,
+                          answer_option_ids: Optional[list[int]] = None) -> StudentStepData:
+    # e: TokenNotValidError, UnknownError, AccessError, NotFoundError, TrainingIsNotActiveError,
+    # LevelAnswerAlreadyExistsError
+    async with unit_of_work.session() as s:
+        try:
+            token_data = await __validate_by_token(s, token)
+            if token_data.account_type != AccountType.STUDENT:
+                raise AccessError()
+            query = (select(AccountOrm).options(joinedload(AccountOrm.training).defer(TrainingOrm.message))
+                     .filter(AccountOrm.id == token_data.account_id))
+            query = await __safe_execute(s, query, TokenNotValidError())
+            student: AccountOrm = query.first()
+            training: TrainingOrm = student.training
+            if training is None:
+                raise NotFoundError()
+            training_id = training.id
+            manifest = await __get_level_manifest(s, training_id)
+            answer = None
+            if level_id is not None:
+                level = manifest.levels_by_id.get(level_id)
+                if level is None:
+                    raise NotFoundError()
+                if not __training_is_active(training):
+                    raise TrainingIsNotActiveError()
+                level_answer = await __record_level_answer(s, student, level, answer_option_ids)
+                answer = level_answer_orm_to_level_answer_data(level_answer, level,
+                                                               account_orm_to_student_data(student, None, None))
+            progress = __student_orm_to_progress_data(student, training, manifest, None)
+            res = StudentStepData(answer=answer, progress=progress, next_level=progress.current_level)
+            await s.commit()
+            if answer is not None:
+                __invalidate_training_report(training_id)
+            return res
+        except (TokenNotValidError, AccessError, NotFoundError, TrainingIsNotActiveError,
+                LevelAnswerAlreadyExistsError) as e:
+            await s.rollback()
+            raise e
+        except StaleDataError:
+            await s.rollback()
+            raise ConflictError()
         except SQLAlchemyError as e:
             await s.rollback()
             logger.error(f"SQLAlchemyError occurred: {str(e)}")
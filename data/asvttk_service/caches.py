@@ -0,0 +1,45 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+
+class LRUCache:
+    def __init__(self, max_size: int = 10000, ttl: Optional[float] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.__items: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self):
+        return len(self.__items)
+
+    def __contains__(self, key: Hashable):
+        return self.get(key) is not None
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        item = self.__items.get(key)
+        if item is None:
+            return default
+        date_set, value = item
+        if self.ttl is not None and time.monotonic() - date_set >= self.ttl:
+            del self.__items[key]
+            return default
+        self.__items.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self.__items[key] = (time.monotonic(), value)
+        self.__items.move_to_end(key)
+        while len(self.__items) > self.max_size:
+            self.__items.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        item = self.__items.pop(key, None)
+        return item[1] if item else default
+
+    def pop_where(self, predicate: Callable[[Hashable, Any], bool]):
+        keys = [k for k, (_, v) in self.__items.items() if predicate(k, v)]
+        for k in keys:
+            del self.__items[k]
+
+    def clear(self):
+        self.__items.clear()
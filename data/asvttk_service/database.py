@@ -1,7 +1,11 @@
-from sqlalchemy import select, text
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+import dataclasses
+from typing import Any, Optional
 
-from config import settings
+from sqlalchemy import select, text, event, make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession, AsyncEngine
+
+from config import settings, Settings
+from data.asvttk_service.migrations import migrate
 from data.asvttk_service.models import AccountOrm, Base, KeyOrm, AccountType
 
 
@@ -10,20 +14,95 @@ async def is_foreign_key(session: AsyncSession, value: bool):
     await session.execute(text(f"PRAGMA foreign_keys = {value_str}"))
 
 
+@dataclasses.dataclass(frozen=True)
+class EngineProfile:
+    pool_size: int = 5
+    max_overflow: int = 10
+    pool_recycle: int = 1800
+    pool_pre_ping: bool = True
+    statement_cache_size: int = 100
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout: int = 5000
+    sqlite_foreign_keys: bool = True
+
+    @staticmethod
+    def from_settings(it: Settings) -> "EngineProfile":
+        return EngineProfile(
+            pool_size=it.DATABASE_POOL_SIZE,
+            max_overflow=it.DATABASE_MAX_OVERFLOW,
+            pool_recycle=it.DATABASE_POOL_RECYCLE,
+            pool_pre_ping=it.DATABASE_POOL_PRE_PING,
+            statement_cache_size=it.DATABASE_STATEMENT_CACHE_SIZE,
+            sqlite_journal_mode=it.SQLITE_JOURNAL_MODE,
+            sqlite_synchronous=it.SQLITE_SYNCHRONOUS,
+            sqlite_busy_timeout=it.SQLITE_BUSY_TIMEOUT,
+            sqlite_foreign_keys=it.SQLITE_FOREIGN_KEYS,
+        )
+
+    def get_engine_options(self, url: str) -> dict[str, Any]:
+        url_obj = make_url(url)
+        if url_obj.get_backend_name() == "sqlite":
+            return {}
+        options = {"pool_size": self.pool_size, "max_overflow": self.max_overflow,
+                   "pool_recycle": self.pool_recycle, "pool_pre_ping": self.pool_pre_ping}
+        if url_obj.get_driver_name() == "asyncpg":
+            options["connect_args"] = {"prepared_statement_cache_size": self.statement_cache_size}
+        return options
+
+    def get_sqlite_pragmas(self) -> list[str]:
+        return [
+            f"PRAGMA journal_mode = {self.sqlite_journal_mode}",
+            f"PRAGMA synchronous = {self.sqlite_synchronous}",
+            f"PRAGMA busy_timeout = {int(self.sqlite_busy_timeout)}",
+            f"PRAGMA foreign_keys = {'ON' if self.sqlite_foreign_keys else 'OFF'}",
+        ]
+
+
+def create_engine(url: str, profile: EngineProfile) -> AsyncEngine:
+    engine = create_async_engine(url, echo=False, **profile.get_engine_options(url))
+    if engine.dialect.name == "sqlite":
+        pragmas = profile.get_sqlite_pragmas()
+
+        @event.listens_for(engine.sync_engine, "connect")
+        def set_sqlite_pragmas(dbapi_connection, _):
+            cursor = dbapi_connection.cursor()
+            for pragma in pragmas:
+                cursor.execute(pragma)
+            cursor.close()
+            # The driver's own transaction handling breaks SAVEPOINT, so transactions are begun explicitly.
+            dbapi_connection.isolation_level = None
+
+        @event.listens_for(engine.sync_engine, "begin")
+        def begin_sqlite_transaction(conn):
+            conn.exec_driver_sql("BEGIN")
+    return engine
+
+
 class ASVTTKDatabase:
-    def __init__(self, url: str, admin_access_key: str):
-        self.engine = create_async_engine(url, echo=False)
+    def __init__(self, url: str, admin_access_key: str, profile: EngineProfile = EngineProfile(),
+                 replica_url: Optional[str] = None):
+        self.engine = create_engine(url, profile)
         self.session_factory = async_sessionmaker(self.engine)
+        self.read_only_engine = self.engine.execution_options(postgresql_readonly=True)
+        self.read_only_session_factory = async_sessionmaker(self.read_only_engine)
+        self.replica_engine = create_engine(replica_url, profile) if replica_url else None
+        self.has_replica = self.replica_engine is not None
+        if self.replica_engine is not None:
+            self.replica_read_only_engine = self.replica_engine.execution_options(postgresql_readonly=True)
+        else:
+            self.replica_read_only_engine = self.read_only_engine
+        self.replica_session_factory = async_sessionmaker(self.replica_read_only_engine)
         self.admin_access_key = admin_access_key
 
     async def connect(self, drop_all: str = "no"):
         async with self.engine.begin() as conn:
             if drop_all.lower() == "yes":
                 await conn.run_sync(Base.metadata.drop_all)
-            await conn.run_sync(Base.metadata.create_all)
+            await migrate(conn)
         async with self.session_factory() as service:
-            res = await service.execute(select(AccountOrm))
-            if res.scalars().first() is None:
+            res = await service.execute(select(select(AccountOrm.id).exists()))
+            if not res.scalar():
                 await self.__first_connect()
                 await service.commit()
 
@@ -38,6 +117,10 @@ class ASVTTKDatabase:
 
     async def disconnect(self):
         await self.engine.dispose()
+        if self.replica_engine is not None:
+            await self.replica_engine.dispose()
 
 
-database = ASVTTKDatabase(url=settings.ASVTTK_DATABASE_URL, admin_access_key=settings.ADMIN_ACCESS_KEY)
+database = ASVTTKDatabase(url=settings.ASVTTK_DATABASE_URL, admin_access_key=settings.ADMIN_ACCESS_KEY,
+                          profile=EngineProfile.from_settings(settings),
+                          replica_url=settings.ASVTTK_REPLICA_DATABASE_URL)
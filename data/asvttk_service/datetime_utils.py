@@ -5,7 +5,11 @@ from enum import Enum
 import pytz
 
 
-locale.setlocale(locale.LC_TIME, 'ru_RU.UTF-8')
+try:
+    locale.setlocale(locale.LC_TIME, 'ru_RU.UTF-8')
+except locale.Error:
+    # Without the locale month names stay English, e.g. on CI machines.
+    pass
 
 moscow_tz = pytz.timezone('Europe/Moscow')
 
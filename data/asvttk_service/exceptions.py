@@ -82,3 +82,19 @@ class LevelAnswerAlreadyExistsError(Exception):
 
 class NoArgsError(Exception):
     pass
+
+
+class ReportJobAlreadyExistsError(Exception):
+    pass
+
+
+class ReportJobQueueIsFullError(Exception):
+    pass
+
+
+class ReportJobCancelledError(Exception):
+    pass
+
+
+class ConflictError(UnknownError):
+    pass
@@ -3,6 +3,7 @@ from typing import Optional
 
 from aiogram.enums import ContentType
 from aiogram.types import Message
+from sqlalchemy import inspect, Row
 
 from data.asvttk_service.models import AccountOrm, RoleOrm, TrainingOrm, LevelOrm, LevelAnswerOrm
 from data.asvttk_service.types import AccountData, RoleData, TrainingData, EmployeeData, StudentData, LevelData, \
@@ -12,6 +13,10 @@ from data.asvttk_service.xlsx_generation.tables import LevelRT, TrainingRT, Stud
     RStudentState, AnswerRT
 
 
+def get_loaded_value(it, key: str):
+    return None if key in inspect(it).unloaded else getattr(it, key)
+
+
 def account_orm_to_account_data(it: AccountOrm) -> AccountData:
     return AccountData(
         id=it.id,
@@ -63,7 +68,7 @@ def training_orm_to_training_data(it: TrainingOrm, students: Optional[list[Accou
     return TrainingData(
         id=it.id,
         name=it.name,
-        message=it.message,
+        message=get_loaded_value(it, "message"),
         date_create=it.date_create,
         date_start=it.date_start,
         date_end=it.date_end,
@@ -73,24 +78,27 @@ def training_orm_to_training_data(it: TrainingOrm, students: Optional[list[Accou
 
 
 def level_orm_to_level_data(it: LevelOrm, order: Optional[int], training: Optional[TrainingData],
-                            answers: Optional[list[LevelAnswerData]]) -> LevelData:
+                            answers: Optional[list[LevelAnswerData]], previous_level_id: Optional[int] = None,
+                            next_level_id: Optional[int] = None) -> LevelData:
     return LevelData(
         id=it.id,
         order=order,
-        previous_level_id=it.previous_level_id,
-        next_level_id=it.next_level_id,
+        position=it.position,
+        previous_level_id=previous_level_id,
+        next_level_id=next_level_id,
         training_id=it.training_id,
         type=it.type,
         date_create=it.date_create,
         title=it.title,
-        messages=it.messages,
+        messages=get_loaded_value(it, "messages"),
         training=training,
         answers=answers,
     )
 
 
 # noinspection PyTypeChecker
-def level_orm_to_level_rt(it: LevelOrm, order: int, level_type: RLevelType) -> LevelRT:
+def level_orm_to_level_rt(it: LevelOrm, order: int, level_type: RLevelType, answered_count: int = 0,
+                          correct_rate: Optional[float] = None) -> LevelRT:
     options = None
     correct_option = None
     explanation = None
@@ -110,6 +118,8 @@ def level_orm_to_level_rt(it: LevelOrm, order: int, level_type: RLevelType) -> L
         options=options,
         correct_option=correct_option,
         explanation=explanation,
+        answered_count=answered_count,
+        correct_rate=correct_rate,
     )
 
 
@@ -132,7 +142,8 @@ def training_orm_to_training_rt(it: TrainingOrm, state: RTrainingState) -> Train
     )
 
 
-def account_orm_to_student_rt(it: AccountOrm, state: RStudentState, progress_percent: float) -> StudentRT:
+def account_orm_to_student_rt(it: AccountOrm, state: RStudentState, progress_percent: float, answered_count: int = 0,
+                              correct_count: int = 0) -> StudentRT:
     return StudentRT(
         id=it.id,
         first_name=it.first_name,
@@ -141,11 +152,13 @@ def account_orm_to_student_rt(it: AccountOrm, state: RStudentState, progress_per
         date_create=datetime.utcfromtimestamp(it.date_create),
         state=state,
         progress=progress_percent,
+        answered_count=answered_count,
+        correct_count=correct_count,
     )
 
 
 # noinspection PyTypeChecker
-def level_answer_orm_to_answer_rt(it: LevelAnswerOrm, level: LevelOrm, training_id: int) -> AnswerRT:
+def level_answer_orm_to_answer_rt(it: LevelAnswerOrm | Row, level: LevelOrm, training_id: int) -> AnswerRT:
     select_answer = None
     if level.messages[0].content_type == ContentType.POLL:
         options = [i.text for i in level.messages[0].poll.options]
@@ -0,0 +1,105 @@
+import base64
+import functools
+import json
+import zlib
+from typing import Any, Iterator, SupportsIndex
+
+from aiogram.types import Message
+
+MESSAGES_FORMAT_VERSION = 2
+MESSAGE_CONTENT_FIELDS = {"message_id", "date", "chat", "media_group_id", "effect_id", "text", "entities", "caption",
+                          "caption_entities", "show_caption_above_media", "has_media_spoiler", "photo", "video",
+                          "document", "animation", "audio", "sticker", "poll", "contact", "location"}
+MESSAGE_CHAT_FIELDS = {"id", "type"}
+
+
+@functools.lru_cache(maxsize=4096)
+def decode_message(raw: str) -> Message:
+    return Message.model_validate_json(raw)
+
+
+class LazyMessages(list):
+    def __init__(self, raw_items: list[str] = ()):
+        super().__init__(raw_items)
+
+    def raw_items(self) -> list[str | Message]:
+        return list(super().__iter__())
+
+    def __getitem__(self, index: SupportsIndex | slice):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        item = super().__getitem__(index)
+        if isinstance(item, str):
+            item = decode_message(item)
+            super().__setitem__(index, item)
+        return item
+
+    def __iter__(self) -> Iterator[Message]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def __reversed__(self) -> Iterator[Message]:
+        for i in reversed(range(len(self))):
+            yield self[i]
+
+    def __contains__(self, item) -> bool:
+        return any(i == item for i in self)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, list) and len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __ne__(self, other) -> bool:
+        return not self == other
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+    def copy(self) -> list[Message]:
+        return list(self)
+
+    def pop(self, index: SupportsIndex = -1) -> Message:
+        item = self[index]
+        super().pop(index)
+        return item
+
+    def index(self, item, *args) -> int:
+        return list(self).index(item, *args)
+
+    def count(self, item) -> int:
+        return list(self).count(item)
+
+
+def __drop_none(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: __drop_none(v) for k, v in value.items() if v is not None}
+    if isinstance(value, list):
+        return [__drop_none(i) for i in value]
+    return value
+
+
+def __compact_message(data: dict) -> dict:
+    data = {k: __drop_none(v) for k, v in data.items() if k in MESSAGE_CONTENT_FIELDS and v is not None}
+    if "chat" in data:
+        data["chat"] = {k: v for k, v in data["chat"].items() if k in MESSAGE_CHAT_FIELDS}
+    return data
+
+
+def encode_messages(messages: list[Message]) -> str:
+    items = messages.raw_items() if isinstance(messages, LazyMessages) else list(messages)
+    payload = [__compact_message(json.loads(i) if isinstance(i, str) else i.model_dump(mode="json")) for i in items]
+    data = zlib.compress(json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode())
+    return f"{MESSAGES_FORMAT_VERSION}:{base64.b64encode(data).decode()}"
+
+
+def decode_messages(value: str) -> LazyMessages:
+    if is_legacy_messages(value):
+        return LazyMessages(json.loads(value))
+    version, data = value.split(":", 1)
+    if int(version) != MESSAGES_FORMAT_VERSION:
+        raise ValueError(f"Unknown messages format version: {version}")
+    payload = json.loads(zlib.decompress(base64.b64decode(data)))
+    return LazyMessages([json.dumps(i, ensure_ascii=False, separators=(",", ":")) for i in payload])
+
+
+def is_legacy_messages(value: str) -> bool:
+    return value.startswith("[")
@@ -0,0 +1,192 @@
+import dataclasses
+import logging
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import select, text, inspect, update, Connection, Column, bindparam
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.sql.sqltypes import SchemaType
+
+from data.asvttk_service.message_codec import is_legacy_messages, decode_messages, encode_messages
+from data.asvttk_service.models import AccountOrm, Base, AccountType, LevelOrm, LEVEL_POSITION_STEP, \
+    StudentProgressState, SchemaVersionOrm, TrainingOrm, KeyOrm
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION_ID = 1
+
+
+def get_column_names(conn: Connection, table_name: str) -> list[str]:
+    return [i["name"] for i in inspect(conn).get_columns(table_name)]
+
+
+def add_column(conn: Connection, table_name: str, column: Column):
+    if isinstance(column.type, SchemaType):
+        column.type.create(conn, checkfirst=True)
+    column_type = column.type.compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column.name} {column_type}"))
+
+
+async def migrate_level_positions(conn: AsyncConnection):
+    columns = await conn.run_sync(get_column_names, LevelOrm.__tablename__)
+    if "position" in columns:
+        return
+    await conn.execute(text("ALTER TABLE levels ADD COLUMN position INTEGER"))
+    if "previous_level_id" in columns and "next_level_id" in columns:
+        res = await conn.execute(text("SELECT id, training_id, previous_level_id, next_level_id FROM levels"))
+        levels_by_training: dict[int, dict[int, tuple[int | None, int | None]]] = {}
+        for level_id, training_id, previous_level_id, next_level_id in res.all():
+            levels_by_training.setdefault(training_id, {})[level_id] = (previous_level_id, next_level_id)
+        positions = []
+        for levels in levels_by_training.values():
+            current_id = next((k for k, v in levels.items() if v[0] is None), None)
+            visited = set()
+            while current_id is not None and current_id not in visited:
+                visited.add(current_id)
+                positions.append({"id": current_id, "position": len(visited) * LEVEL_POSITION_STEP})
+                current_id = levels.get(current_id, (None, None))[1]
+            for level_id in sorted(set(levels) - visited):
+                visited.add(level_id)
+                positions.append({"id": level_id, "position": len(visited) * LEVEL_POSITION_STEP})
+        if positions:
+            await conn.execute(text("UPDATE levels SET position = :position WHERE id = :id"), positions)
+    await conn.run_sync(lambda c: [i.create(c, checkfirst=True) for i in LevelOrm.__table__.indexes])
+
+
+async def migrate_messages_format(conn: AsyncConnection):
+    for table_name, column_name in (("levels", "messages"), ("trainings", "message")):
+        res = await conn.execute(text(f"SELECT id, {column_name} FROM {table_name} WHERE {column_name} LIKE '[%'"))
+        values = [{"id": i, "value": encode_messages(decode_messages(v))} for i, v in res.all()
+                  if v is not None and is_legacy_messages(v)]
+        if values:
+            await conn.execute(text(f"UPDATE {table_name} SET {column_name} = :value WHERE id = :id"), values)
+
+
+async def migrate_student_progress(conn: AsyncConnection):
+    columns = await conn.run_sync(get_column_names, AccountOrm.__tablename__)
+    if "answered_count" in columns:
+        return
+    table = AccountOrm.__table__
+    for name in ("progress_state", "current_level_id", "answered_count", "correct_count"):
+        await conn.run_sync(add_column, table.name, table.c[name])
+    await conn.execute(text("UPDATE accounts SET progress_state = :state, answered_count = 0, correct_count = 0"),
+                       {"state": StudentProgressState.CREATED.name})
+    res = await conn.execute(text("SELECT id, training_id FROM levels ORDER BY training_id, position, id"))
+    levels_by_training: dict[int, list[int]] = {}
+    for level_id, training_id in res.all():
+        levels_by_training.setdefault(training_id, []).append(level_id)
+    res = await conn.execute(text("SELECT account_id, level_id, is_correct FROM level_answers"))
+    answers_by_student: dict[int, list[tuple[int, bool | None]]] = {}
+    for account_id, level_id, is_correct in res.all():
+        answers_by_student.setdefault(account_id, []).append((level_id, is_correct))
+    res = await conn.execute(text("SELECT id, training_id FROM accounts WHERE type = :type"),
+                             {"type": AccountType.STUDENT.name})
+    values = []
+    for student_id, training_id in res.all():
+        answers = answers_by_student.get(student_id, [])
+        answered_level_ids = {i[0] for i in answers}
+        levels = levels_by_training.get(training_id, [])
+        current_level_id = next((i for i in levels if i not in answered_level_ids), None)
+        state = StudentProgressState.COMPLETED if current_level_id is None else \
+            StudentProgressState.LEARNING if answers else StudentProgressState.CREATED
+        values.append({"id": student_id, "state": state.name, "current_level_id": current_level_id,
+                       "answered_count": len(answers), "correct_count": len([i for i in answers if i[1]])})
+    if values:
+        await conn.execute(text("UPDATE accounts SET progress_state = :state, current_level_id = :current_level_id, "
+                                "answered_count = :answered_count, correct_count = :correct_count WHERE id = :id"),
+                           values)
+
+
+def create_indexes(conn: Connection):
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+async def migrate_indexes(conn: AsyncConnection):
+    res = await conn.execute(text("SELECT account_id, level_id, MIN(id) FROM level_answers "
+                                  "GROUP BY account_id, level_id HAVING COUNT(id) > 1"))
+    duplicates = res.all()
+    for account_id, level_id, answer_id in duplicates:
+        await conn.execute(text("DELETE FROM level_answers WHERE account_id = :account_id AND level_id = :level_id "
+                                "AND id != :id"), {"account_id": account_id, "level_id": level_id, "id": answer_id})
+    if duplicates:
+        await conn.execute(text("UPDATE accounts SET "
+                                "answered_count = (SELECT COUNT(id) FROM level_answers "
+                                "WHERE level_answers.account_id = accounts.id), "
+                                "correct_count = (SELECT COUNT(id) FROM level_answers "
+                                "WHERE level_answers.account_id = accounts.id AND level_answers.is_correct = :true) "
+                                "WHERE id IN :ids").bindparams(bindparam("ids", expanding=True)),
+                           {"true": True, "ids": list({i[0] for i in duplicates})})
+    await conn.run_sync(create_indexes)
+
+
+async def add_version_column(conn: AsyncConnection, table_name: str):
+    columns = await conn.run_sync(get_column_names, table_name)
+    if "version" not in columns:
+        await conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+
+
+async def migrate_row_versions(conn: AsyncConnection):
+    for table_name in (AccountOrm.__tablename__, TrainingOrm.__tablename__, LevelOrm.__tablename__):
+        await add_version_column(conn, table_name)
+
+
+async def migrate_key_versions(conn: AsyncConnection):
+    await add_version_column(conn, KeyOrm.__tablename__)
+
+
+@dataclasses.dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    upgrade: Callable[[AsyncConnection], Awaitable[None]]
+
+
+MIGRATIONS = [
+    Migration(1, "level_positions", migrate_level_positions),
+    Migration(2, "messages_format", migrate_messages_format),
+    Migration(3, "student_progress", migrate_student_progress),
+    Migration(4, "indexes", migrate_indexes),
+    Migration(5, "row_versions", migrate_row_versions),
+    Migration(6, "key_versions", migrate_key_versions),
+]
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+def has_table(conn: Connection, table_name: str) -> bool:
+    return inspect(conn).has_table(table_name)
+
+
+async def get_schema_version(conn: AsyncConnection) -> Optional[int]:
+    if not await conn.run_sync(has_table, SchemaVersionOrm.__tablename__):
+        return None
+    res = await conn.execute(select(SchemaVersionOrm.version).filter(SchemaVersionOrm.id == SCHEMA_VERSION_ID))
+    return res.scalar()
+
+
+async def set_schema_version(conn: AsyncConnection, version: int):
+    res = await conn.execute(update(SchemaVersionOrm).filter(SchemaVersionOrm.id == SCHEMA_VERSION_ID)
+                             .values(version=version))
+    if not res.rowcount:
+        await conn.execute(SchemaVersionOrm.__table__.insert().values(id=SCHEMA_VERSION_ID, version=version))
+
+
+async def migrate(conn: AsyncConnection):
+    version = await get_schema_version(conn)
+    if version == SCHEMA_VERSION:
+        return
+    if version is not None and version > SCHEMA_VERSION:
+        raise RuntimeError(f"Database schema version {version} is newer than {SCHEMA_VERSION}")
+    if version is None:
+        is_new_database = not await conn.run_sync(has_table, AccountOrm.__tablename__)
+        await conn.run_sync(Base.metadata.create_all)
+        if is_new_database:
+            await set_schema_version(conn, SCHEMA_VERSION)
+            return
+        version = 0
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+        logger.info(f"Applying migration {migration.version}: {migration.name}")
+        await migration.upgrade(conn)
+        await set_schema_version(conn, migration.version)
@@ -1,13 +1,13 @@
-import json
 from enum import Enum
 from typing import Optional
 
 import sqlalchemy
 from aiogram.types import Message
-from sqlalchemy import JSON, ForeignKey, BigInteger, TypeDecorator, VARCHAR
+from sqlalchemy import JSON, ForeignKey, BigInteger, TypeDecorator, VARCHAR, Index
 from sqlalchemy.orm import Mapped, mapped_column, declarative_base, relationship
 
 from data.asvttk_service import default
+from data.asvttk_service.message_codec import encode_messages, decode_messages
 from data.asvttk_service.utils import get_current_time
 
 
@@ -17,6 +17,15 @@ class AccountType(Enum):
     STUDENT = 8
 
 
+class StudentProgressState(Enum):
+    CREATED = 0
+    LEARNING = 1
+    COMPLETED = 2
+
+
+LEVEL_POSITION_STEP = 1024
+
+
 class LevelType:
     INFO = "info"
     CONTROL = "control"
@@ -33,19 +42,25 @@ class MSGS(TypeDecorator):
 
     def process_bind_param(self, value, dialect):
         if value is not None:
-            value = json.dumps([i.model_dump_json() for i in value])
+            value = encode_messages(value)
         return value
 
     def process_result_value(self, value, dialect):
         if value is not None:
-            msgs_json = json.loads(value)
-            value = [Message.model_validate_json(i) for i in msgs_json]
+            value = decode_messages(value)
         return value
 
 
 Base = declarative_base()
 
 
+class SchemaVersionOrm(Base):
+    __tablename__ = "schema_version"
+    id: Mapped[int] = mapped_column(primary_key=True)
+    version: Mapped[int]
+    date_update: Mapped[int] = mapped_column(default=get_current_time, onupdate=get_current_time)
+
+
 class UserStateOrm(Base):
     __tablename__ = "user_states"
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
@@ -61,43 +76,57 @@ class KeyOrm(Base):
     access_key: Mapped[str] = mapped_column(unique=True)
     date_create: Mapped[int] = mapped_column(default=get_current_time)
     is_first_log_in: Mapped[bool] = mapped_column(default=True)
-    account_id: Mapped[int] = mapped_column(ForeignKey("accounts.id", ondelete="CASCADE"))
+    account_id: Mapped[int] = mapped_column(ForeignKey("accounts.id", ondelete="CASCADE"), index=True)
+    version: Mapped[int] = mapped_column(server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
 
 
 class SessionOrm(Base):
     __tablename__ = "sessions"
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    key_id: Mapped[int] = mapped_column(ForeignKey("keys.id", ondelete="CASCADE"))
+    key_id: Mapped[int] = mapped_column(ForeignKey("keys.id", ondelete="CASCADE"), index=True)
     token: Mapped[str] = mapped_column(unique=True)
-    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("user_states.user_id", ondelete="CASCADE"))
+    user_id: Mapped[int] = mapped_column(BigInteger, ForeignKey("user_states.user_id", ondelete="CASCADE"),
+                                         index=True)
     date_create: Mapped[int] = mapped_column(default=get_current_time)
 
 
 class AccountOrm(Base):
     __tablename__ = "accounts"
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    type: Mapped[AccountType] = mapped_column(sqlalchemy.Enum(AccountType))
+    type: Mapped[AccountType] = mapped_column(sqlalchemy.Enum(AccountType), index=True)
     email: Mapped[Optional[str]] = mapped_column(nullable=True)
     date_create: Mapped[int] = mapped_column(default=get_current_time)
     first_name: Mapped[str]
     last_name: Mapped[Optional[str]] = mapped_column(nullable=True)
     patronymic: Mapped[Optional[str]] = mapped_column(nullable=True)
     training_id: Mapped[Optional[int]] = mapped_column(
-        ForeignKey("trainings.id", ondelete="CASCADE", name="fk_training_id_in_account"), nullable=True)
+        ForeignKey("trainings.id", ondelete="CASCADE", name="fk_training_id_in_account"), nullable=True, index=True)
     date_complete_training: Mapped[Optional[int]] = mapped_column(nullable=True)
+    progress_state: Mapped[StudentProgressState] = mapped_column(sqlalchemy.Enum(StudentProgressState),
+                                                                 default=StudentProgressState.CREATED)
+    current_level_id: Mapped[Optional[int]] = mapped_column(nullable=True)
+    answered_count: Mapped[int] = mapped_column(default=0)
+    correct_count: Mapped[int] = mapped_column(default=0)
+    version: Mapped[int] = mapped_column(server_default="1")
 
     roles = relationship("RoleOrm", secondary="role_and_accounts", back_populates="accounts")
     training = relationship("TrainingOrm", back_populates="students")
     answers = relationship("LevelAnswerOrm", back_populates="student", cascade="all, delete")
 
+    __mapper_args__ = {"version_id_col": version}
+
 
 class RoleAndAccountOrm(Base):
     __tablename__ = "role_and_accounts"
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     account_id: Mapped[int] = mapped_column(ForeignKey("accounts.id", ondelete="CASCADE"))
-    role_id: Mapped[int] = mapped_column(ForeignKey("roles.id", ondelete="CASCADE"))
+    role_id: Mapped[int] = mapped_column(ForeignKey("roles.id", ondelete="CASCADE"), index=True)
     date_create: Mapped[int] = mapped_column(default=get_current_time)
 
+    __table_args__ = (Index("ix_role_and_accounts_account_id_role_id", "account_id", "role_id"),)
+
 
 class RoleOrm(Base):
     __tablename__ = "roles"
@@ -113,39 +142,44 @@ class TrainingAndRoleOrm(Base):
     __tablename__ = "training_and_roles"
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     role_id: Mapped[int] = mapped_column(ForeignKey("roles.id", ondelete="CASCADE"))
-    training_id: Mapped[int] = mapped_column(ForeignKey("trainings.id", ondelete="CASCADE"))
+    training_id: Mapped[int] = mapped_column(ForeignKey("trainings.id", ondelete="CASCADE"), index=True)
     date_create: Mapped[int] = mapped_column(default=get_current_time)
 
+    __table_args__ = (Index("ix_training_and_roles_role_id_training_id", "role_id", "training_id"),)
+
 
 class LevelOrm(Base):
     __tablename__ = "levels"
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
-    previous_level_id: Mapped[Optional[int]] = mapped_column(
-        ForeignKey("levels.id", ondelete="SET NULL"), nullable=True)
-    next_level_id: Mapped[Optional[int]] = mapped_column(
-        ForeignKey("levels.id", ondelete="SET NULL"), nullable=True)
     training_id: Mapped[int] = mapped_column(ForeignKey("trainings.id", ondelete="CASCADE"))
+    position: Mapped[int]
     type: Mapped[str]
     date_create: Mapped[int] = mapped_column(default=get_current_time)
     title: Mapped[str]
     messages: Mapped[list[Message]] = mapped_column(MSGS)
+    version: Mapped[int] = mapped_column(server_default="1")
 
     training = relationship("TrainingOrm", back_populates="levels")
     answers = relationship("LevelAnswerOrm", back_populates="level", cascade="all, delete")
 
+    __table_args__ = (Index("ix_levels_training_id_position", "training_id", "position"),)
+    __mapper_args__ = {"version_id_col": version}
+
 
 class LevelAnswerOrm(Base):
     __tablename__ = "level_answers"
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     date_create: Mapped[int] = mapped_column(default=get_current_time)
     account_id: Mapped[int] = mapped_column(ForeignKey("accounts.id", ondelete="CASCADE"))
-    level_id: Mapped[int] = mapped_column(ForeignKey("levels.id", ondelete="CASCADE"))
+    level_id: Mapped[int] = mapped_column(ForeignKey("levels.id", ondelete="CASCADE"), index=True)
     answer_option_ids: Mapped[Optional[list[int]]] = mapped_column(JSON, nullable=True)
     is_correct: Mapped[Optional[bool]] = mapped_column(nullable=True)
 
     level = relationship("LevelOrm", back_populates="answers")
     student = relationship("AccountOrm", back_populates="answers", cascade="all, delete")
 
+    __table_args__ = (Index("ux_level_answers_account_id_level_id", "account_id", "level_id", unique=True),)
+
 
 class TrainingOrm(Base):
     __tablename__ = "trainings"
@@ -155,9 +189,12 @@ class TrainingOrm(Base):
     date_create: Mapped[int] = mapped_column(default=get_current_time)
     date_start: Mapped[Optional[int]] = mapped_column(nullable=True)
     date_end: Mapped[Optional[int]] = mapped_column(nullable=True)
+    version: Mapped[int] = mapped_column(server_default="1")
 
     students = relationship("AccountOrm", back_populates="training", cascade="all, delete")
     roles = relationship("RoleOrm", secondary="training_and_roles",
                          secondaryjoin="RoleOrm.id == TrainingAndRoleOrm.role_id",
                          primaryjoin="TrainingOrm.id == TrainingAndRoleOrm.training_id", back_populates="trainings")
-    levels = relationship("LevelOrm", back_populates="training", cascade="all, delete")
+    levels = relationship("LevelOrm", back_populates="training", cascade="all, delete", order_by="LevelOrm.position")
+
+    __mapper_args__ = {"version_id_col": version}
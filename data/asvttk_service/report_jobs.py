@@ -0,0 +1,129 @@
+import asyncio
+import contextvars
+import logging
+from enum import Enum
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from config import settings
+from data.asvttk_service.exceptions import ReportJobAlreadyExistsError, ReportJobQueueIsFullError, \
+    ReportJobCancelledError
+from data.asvttk_service.xlsx_generation import xlsx_engine
+
+logger = logging.getLogger(__name__)
+
+
+class ReportJobState(Enum):
+    QUEUED = 0
+    RUNNING = 1
+
+
+StatusCallback = Callable[[ReportJobState, int], Awaitable[None]]
+
+
+class ReportJob:
+    def __init__(self, key: Hashable, func: Callable[[], Awaitable[Any]], on_status: Optional[StatusCallback]):
+        self.key = key
+        self.func = func
+        self.on_status = on_status
+        self.state = ReportJobState.QUEUED
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.task: Optional[asyncio.Task] = None
+        # The job runs in the context of its requester, e.g. with its unit of work's user id.
+        self.context = contextvars.copy_context()
+
+
+class ReportJobQueue:
+    def __init__(self, workers: int = 2, max_size: int = 10):
+        self.workers = workers
+        self.max_size = max_size
+        self.__jobs: dict[Hashable, ReportJob] = {}
+        self.__queue: Optional[asyncio.Queue[ReportJob]] = None
+        self.__worker_tasks: list[asyncio.Task] = []
+        self.__is_closing = False
+
+    def start(self):
+        if self.__worker_tasks:
+            return
+        xlsx_engine.start_executor(self.workers)
+        self.__queue = asyncio.Queue(self.max_size)
+        # Workers outlive the update that started them, so they must not keep its context.
+        self.__worker_tasks = [contextvars.Context().run(asyncio.create_task, self.__work())
+                               for _ in range(self.workers)]
+
+    async def close(self):
+        self.__is_closing = True
+        for job in list(self.__jobs.values()):
+            self.cancel(job.key)
+        for task in self.__worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self.__worker_tasks, return_exceptions=True)
+        self.__worker_tasks = []
+        self.__is_closing = False
+        self.__queue = None
+        xlsx_engine.shutdown_executor()
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[Any]],
+                  on_status: Optional[StatusCallback] = None) -> Any:
+        # e: ReportJobAlreadyExistsError, ReportJobQueueIsFullError, ReportJobCancelledError
+        self.start()
+        if key in self.__jobs:
+            raise ReportJobAlreadyExistsError()
+        if self.__queue.full():
+            raise ReportJobQueueIsFullError()
+        job = ReportJob(key, func, on_status)
+        self.__jobs[key] = job
+        self.__queue.put_nowait(job)
+        await self.__notify(job)
+        try:
+            return await job.future
+        finally:
+            if self.__jobs.get(key) is job:
+                del self.__jobs[key]
+
+    def cancel(self, key: Hashable) -> bool:
+        job = self.__jobs.get(key)
+        if job is None or job.future.done():
+            return False
+        job.future.set_exception(ReportJobCancelledError())
+        if job.task:
+            job.task.cancel()
+        return True
+
+    def get_position(self, job: ReportJob) -> int:
+        queued_jobs = [i for i in self.__jobs.values() if i.state == ReportJobState.QUEUED and not i.future.done()]
+        return queued_jobs.index(job) if job in queued_jobs else 0
+
+    async def __notify(self, job: ReportJob):
+        if job.on_status is None or job.future.done():
+            return
+        try:
+            await job.on_status(job.state, self.get_position(job))
+        except Exception as e:
+            logger.error(f"Exception occurred while reporting job status: {str(e)}")
+
+    async def __work(self):
+        while True:
+            job = await self.__queue.get()
+            try:
+                if job.future.done():
+                    continue
+                job.state = ReportJobState.RUNNING
+                for i in list(self.__jobs.values()):
+                    await self.__notify(i)
+                job.task = job.context.run(asyncio.create_task, job.func())
+                try:
+                    result = await job.task
+                    if not job.future.done():
+                        job.future.set_result(result)
+                except asyncio.CancelledError:
+                    # A cancelled job is swallowed, but the worker's own cancellation reaches it through the job too.
+                    if not job.future.done() or self.__is_closing:
+                        raise
+                except Exception as e:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+            finally:
+                self.__queue.task_done()
+
+
+report_job_queue = ReportJobQueue(workers=settings.REPORT_WORKERS, max_size=settings.REPORT_QUEUE_SIZE)
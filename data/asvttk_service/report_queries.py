@@ -0,0 +1,77 @@
+import dataclasses
+from typing import AsyncIterator, Optional
+
+from sqlalchemy import select, func, case, Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from data.asvttk_service.models import AccountOrm, LevelOrm, LevelAnswerOrm, StudentProgressState
+
+ANSWERS_STREAM_BATCH_SIZE = 1000
+
+
+@dataclasses.dataclass(frozen=True)
+class StudentStats:
+    account_id: int
+    answered_count: int
+    correct_count: int
+    answered_level_count: int
+
+    def get_progress(self, level_count: int) -> float:
+        return self.answered_level_count / level_count if level_count else 0.0
+
+    def get_progress_state(self, level_count: int) -> StudentProgressState:
+        if self.answered_level_count >= level_count:
+            return StudentProgressState.COMPLETED
+        elif self.answered_level_count:
+            return StudentProgressState.LEARNING
+        return StudentProgressState.CREATED
+
+
+@dataclasses.dataclass(frozen=True)
+class LevelStats:
+    level_id: int
+    answered_count: int
+    graded_count: int
+    correct_count: int
+
+    @property
+    def correct_rate(self) -> Optional[float]:
+        return self.correct_count / self.graded_count if self.graded_count else None
+
+
+def __correct_count():
+    return func.coalesce(func.sum(case((LevelAnswerOrm.is_correct.is_(True), 1), else_=0)), 0)
+
+
+async def get_student_stats(s: AsyncSession, training_id: int) -> dict[int, StudentStats]:
+    query = (select(AccountOrm.id, func.count(LevelAnswerOrm.id), __correct_count(),
+                    func.count(func.distinct(LevelAnswerOrm.level_id)))
+             .outerjoin(LevelAnswerOrm, LevelAnswerOrm.account_id == AccountOrm.id)
+             .filter(AccountOrm.training_id == training_id)
+             .group_by(AccountOrm.id))
+    res = await s.execute(query)
+    return {i[0]: StudentStats(*i) for i in res.all()}
+
+
+async def get_level_stats(s: AsyncSession, training_id: int) -> dict[int, LevelStats]:
+    query = (select(LevelOrm.id, func.count(LevelAnswerOrm.id), func.count(LevelAnswerOrm.is_correct),
+                    __correct_count())
+             .outerjoin(LevelAnswerOrm, LevelAnswerOrm.level_id == LevelOrm.id)
+             .filter(LevelOrm.training_id == training_id)
+             .group_by(LevelOrm.id))
+    res = await s.execute(query)
+    return {i[0]: LevelStats(*i) for i in res.all()}
+
+
+async def stream_answers(s: AsyncSession, training_id: int,
+                         batch_size: int = ANSWERS_STREAM_BATCH_SIZE) -> AsyncIterator[Row]:
+    query = (select(LevelAnswerOrm.id, LevelAnswerOrm.account_id, LevelAnswerOrm.level_id,
+                    LevelAnswerOrm.date_create, LevelAnswerOrm.answer_option_ids, LevelAnswerOrm.is_correct)
+             .join(LevelOrm, LevelOrm.id == LevelAnswerOrm.level_id)
+             .filter(LevelOrm.training_id == training_id)
+             .order_by(LevelAnswerOrm.date_create, LevelAnswerOrm.id)
+             .execution_options(yield_per=batch_size))
+    res = await s.stream(query)
+    async for partition in res.partitions():
+        for row in partition:
+            yield row
@@ -1,17 +1,10 @@
 import dataclasses
-from enum import Enum
 from typing import Optional
 
 from aiogram.types import Message
 
-from data.asvttk_service.models import AccountType
-from data.asvttk_service.xlsx_generation.types import ReportFile
-
-
-class StudentProgressState(Enum):
-    CREATED = 0
-    LEARNING = 1
-    COMPLETED = 2
+from data.asvttk_service.models import AccountType, StudentProgressState
+from data.asvttk_service.xlsx_generation.types import ReportFile, ReportFormat
 
 
 @dataclasses.dataclass
@@ -30,9 +23,14 @@ class GiveUpAccountData:
 
 @dataclasses.dataclass
 class TrainingReportData:
-    report_file: ReportFile
+    report_file: Optional[ReportFile]
     date_create: int
     training_id: int
+    training_name: str
+    account: "AccountData"
+    version: int
+    report_format: str = ReportFormat.XLSX
+    file_id: Optional[str] = None
 
 
 @dataclasses.dataclass
@@ -68,7 +66,7 @@ class AccountData:
 class TrainingData:
     id: int
     name: str
-    message: list[Message]
+    message: Optional[list[Message]]
     date_create: int
     date_start: Optional[int]
     date_end: Optional[int]
@@ -106,21 +104,31 @@ class StudentProgressData:
     student: StudentData
     progress_state: StudentProgressState
     current_level: Optional["LevelData"]
-    answers: list["LevelAnswerData"]
+    answered_count: int
+    correct_count: int
+    answers: Optional[list["LevelAnswerData"]]
     training: TrainingData
 
 
+@dataclasses.dataclass
+class StudentStepData:
+    answer: Optional["LevelAnswerData"]
+    progress: StudentProgressData
+    next_level: Optional["LevelData"]
+
+
 @dataclasses.dataclass
 class LevelData:
     id: int
     order: Optional[int]
-    previous_level_id: int
-    next_level_id: int
+    position: int
+    previous_level_id: Optional[int]
+    next_level_id: Optional[int]
     training_id: int
     type: str
     date_create: int
     title: str
-    messages: list[Message]
+    messages: Optional[list[Message]]
     training: Optional[TrainingData]
     answers: Optional["LevelAnswerData"]
 
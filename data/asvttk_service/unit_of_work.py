@@ -0,0 +1,186 @@
+import asyncio
+import contextlib
+import contextvars
+from typing import Any, AsyncIterator, Callable, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncSessionTransaction, async_sessionmaker
+
+from config import settings
+from data.asvttk_service.caches import LRUCache
+from data.asvttk_service.database import database
+
+
+# While a service call runs, commit() and rollback() only finish its savepoint,
+# the transaction itself is committed once by UnitOfWork.
+class UnitOfWorkSession(AsyncSession):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.savepoint: Optional[AsyncSessionTransaction] = None
+        self.read_only = False
+
+    async def commit(self):
+        if self.savepoint is None:
+            return await super().commit()
+        if self.savepoint.is_active:
+            await self.savepoint.commit()
+
+    async def rollback(self):
+        if self.savepoint is None:
+            return await super().rollback()
+        if self.savepoint.is_active:
+            await self.savepoint.rollback()
+
+
+session_factory = async_sessionmaker(database.engine, class_=UnitOfWorkSession)
+read_only_session_factory = async_sessionmaker(database.read_only_engine, class_=UnitOfWorkSession)
+replica_session_factory = async_sessionmaker(database.replica_read_only_engine, class_=UnitOfWorkSession)
+
+# Users who wrote recently read from the primary until the replica has caught up with their writes.
+# Only the last DATABASE_REPLICA_STICKY_WRITERS writers are remembered: if more users write within
+# DATABASE_REPLICA_STICKINESS, the earliest of them read from the replica too soon and may miss their own writes.
+recent_writers = LRUCache(max_size=settings.DATABASE_REPLICA_STICKY_WRITERS, ttl=settings.DATABASE_REPLICA_STICKINESS)
+
+
+def mark_write(user_id: Optional[int]):
+    if database.has_replica and user_id is not None:
+        recent_writers.set(user_id, True)
+
+
+def reads_from_replica(user_id: Optional[int]) -> bool:
+    return user_id is None or user_id not in recent_writers
+
+
+class UnitOfWork:
+    def __init__(self, user_id: Optional[int] = None):
+        self.user_id = user_id
+        self.task = asyncio.current_task()
+        self.session: Optional[UnitOfWorkSession] = None
+        self.tokens: dict[str, Any] = {}
+        self.is_closed = False
+        self.__after_commit: list[Callable[[], Any]] = []
+
+    async def get_session(self, read_only: bool = False) -> UnitOfWorkSession:
+        if self.session is not None and self.session.read_only and not read_only:
+            # A read-only transaction cannot become a writing one, so the first write starts a new transaction.
+            await self.session.close()
+            self.session = None
+        if self.session is None:
+            if not read_only:
+                self.session = session_factory()
+            elif reads_from_replica(self.user_id):
+                self.session = replica_session_factory()
+            else:
+                self.session = read_only_session_factory()
+            self.session.read_only = read_only
+        return self.session
+
+    def after_commit(self, callback: Callable[[], Any]):
+        self.__after_commit.append(callback)
+
+    async def commit(self):
+        if self.session is not None:
+            await self.session.commit()
+            if not self.session.read_only:
+                mark_write(self.user_id)
+        callbacks, self.__after_commit = self.__after_commit, []
+        for callback in callbacks:
+            callback()
+
+    async def rollback(self):
+        self.__after_commit = []
+        if self.session is not None:
+            await self.session.rollback()
+
+    async def close(self):
+        self.is_closed = True
+        if self.session is not None:
+            await self.session.close()
+
+
+current_unit_of_work: contextvars.ContextVar[Optional[UnitOfWork]] = contextvars.ContextVar("current_unit_of_work",
+                                                                                           default=None)
+
+
+def current() -> Optional[UnitOfWork]:
+    uow = current_unit_of_work.get()
+    # Tasks spawned while an update is handled inherit its context, but must not share its session.
+    if uow is None or uow.is_closed or uow.task is not asyncio.current_task():
+        return None
+    return uow
+
+
+def get_user_id() -> Optional[int]:
+    # Also seen by tasks spawned while an update is handled, e.g. report jobs.
+    uow = current_unit_of_work.get()
+    return uow.user_id if uow else None
+
+
+@contextlib.asynccontextmanager
+async def begin(user_id: Optional[int] = None) -> AsyncIterator[UnitOfWork]:
+    uow = UnitOfWork(user_id)
+    reset_token = current_unit_of_work.set(uow)
+    try:
+        yield uow
+        await uow.commit()
+    except BaseException:
+        await uow.rollback()
+        raise
+    finally:
+        current_unit_of_work.reset(reset_token)
+        await uow.close()
+
+
+@contextlib.asynccontextmanager
+async def session(read_only: bool = False) -> AsyncIterator[AsyncSession]:
+    uow = current()
+    if uow is None:
+        user_id = get_user_id()
+        if not read_only:
+            factory = database.session_factory
+        elif reads_from_replica(user_id):
+            factory = database.replica_session_factory
+        else:
+            factory = database.read_only_session_factory
+        async with factory() as s:
+            yield s
+        if not read_only:
+            mark_write(user_id)
+        return
+    if uow.session is not None and uow.session.savepoint is not None:
+        yield uow.session
+        return
+    s = await uow.get_session(read_only)
+    s.savepoint = await s.begin_nested()
+    try:
+        yield s
+    finally:
+        savepoint, s.savepoint = s.savepoint, None
+        if savepoint.is_active:
+            await savepoint.rollback()
+
+
+async def commit():
+    # For handlers that go on to slow non-database work: what is done so far is committed now, later service calls
+    # run in a new transaction of the same unit of work. Inside a service call there is nothing to commit yet.
+    uow = current()
+    if uow is not None and (uow.session is None or uow.session.savepoint is None):
+        await uow.commit()
+
+
+def after_commit(callback: Callable[[], Any]):
+    uow = current()
+    if uow is None:
+        callback()
+    else:
+        uow.after_commit(callback)
+
+
+def invalidate(callback: Callable[[], Any]):
+    # Runs now for the rest of the unit of work and again after its commit, so that other updates
+    # do not cache rows read before it. With a replica it runs once more when the replica should have caught up.
+    callback()
+    uow = current()
+    if uow is not None:
+        uow.after_commit(callback)
+    if database.has_replica:
+        asyncio.get_running_loop().call_later(settings.DATABASE_REPLICA_STICKINESS, callback)
@@ -0,0 +1,158 @@
+import asyncio
+import copy
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from data.asvttk_service import user_states_service
+
+logger = logging.getLogger(__name__)
+
+UserStateKey = tuple[int, int]
+
+
+class UserStateEntry:
+    __slots__ = ("state", "data", "date_load")
+
+    def __init__(self, state: Optional[str], data: dict):
+        self.state = state
+        self.data = data
+        self.date_load = time.monotonic()
+
+
+class UserStatesCache:
+    def __init__(self, max_size: int = 10000, ttl: float = 600.0, flush_delay: float = 0.5,
+                 max_flush_attempts: int = 5):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.flush_delay = flush_delay
+        self.max_flush_attempts = max_flush_attempts
+        self.lost_count = 0
+        self.__entries: OrderedDict[UserStateKey, UserStateEntry] = OrderedDict()
+        self.__pending: dict[UserStateKey, tuple[Optional[str], dict]] = {}
+        self.__flush_attempts: dict[UserStateKey, int] = {}
+        self.__flush_task: Optional[asyncio.Task] = None
+        self.__flush_lock = asyncio.Lock()
+        self.__is_closed = False
+
+    async def get_state(self, user_id: int, chat_id: int) -> Optional[str]:
+        entry = await self.__get_entry((user_id, chat_id))
+        return entry.state
+
+    async def get_data(self, user_id: int, chat_id: int) -> dict:
+        entry = await self.__get_entry((user_id, chat_id))
+        return copy.deepcopy(entry.data)
+
+    async def set_state(self, user_id: int, chat_id: int, state: Optional[str]):
+        entry = await self.__get_entry((user_id, chat_id))
+        entry.state = state
+        self.__mark_dirty((user_id, chat_id), entry)
+
+    async def set_data(self, user_id: int, chat_id: int, data: dict):
+        entry = await self.__get_entry((user_id, chat_id))
+        entry.data = copy.deepcopy(data)
+        self.__mark_dirty((user_id, chat_id), entry)
+
+    async def flush(self):
+        async with self.__flush_lock:
+            if not self.__pending:
+                return
+            items, self.__pending = self.__pending, {}
+            try:
+                await user_states_service.set_states_and_data(items)
+                failed = {}
+            except IntegrityError as e:
+                logger.error(f"IntegrityError occurred while flushing user states: {str(e)}")
+                failed = await self.__flush_one_by_one(items)
+            except Exception as e:
+                logger.error(f"Exception occurred while flushing user states: {str(e)}")
+                failed = items
+            for key in items.keys() - failed.keys():
+                self.__flush_attempts.pop(key, None)
+            self.__requeue(failed)
+
+    async def close(self) -> int:
+        # Returns how many changed states were never written.
+        self.__is_closed = True
+        if self.__flush_task and not self.__flush_task.done():
+            self.__flush_task.cancel()
+        self.__flush_task = None
+        await self.flush()
+        self.lost_count += len(self.__pending)
+        self.__pending = {}
+        if self.lost_count:
+            logger.error(f"{self.lost_count} user states were lost")
+        return self.lost_count
+
+    async def __flush_one_by_one(self, items: dict[UserStateKey, tuple[Optional[str], dict]]) \
+            -> dict[UserStateKey, tuple[Optional[str], dict]]:
+        # A row that breaks a constraint would fail every batch, so it is dropped and the rest is written.
+        failed = {}
+        for key, value in items.items():
+            try:
+                await user_states_service.set_states_and_data({key: value})
+            except IntegrityError as e:
+                self.__drop(key, str(e))
+            except Exception:
+                failed[key] = value
+        return failed
+
+    def __requeue(self, failed: dict[UserStateKey, tuple[Optional[str], dict]]):
+        for key, value in failed.items():
+            attempts = self.__flush_attempts.get(key, 0) + 1
+            if attempts >= self.max_flush_attempts:
+                self.__drop(key, f"{attempts} flush attempts failed")
+                continue
+            self.__flush_attempts[key] = attempts
+            # A state set during the flush is newer than the failed one.
+            self.__pending.setdefault(key, value)
+        if self.__pending:
+            attempts = max((self.__flush_attempts.get(i, 0) for i in self.__pending), default=0)
+            self.__schedule_flush(self.flush_delay * 2 ** attempts)
+
+    def __drop(self, key: UserStateKey, reason: str):
+        self.__flush_attempts.pop(key, None)
+        self.lost_count += 1
+        logger.error(f"The user state {key} is not saved: {reason}")
+
+    async def __get_entry(self, key: UserStateKey) -> UserStateEntry:
+        entry = self.__entries.get(key)
+        if entry is not None and (key in self.__pending or time.monotonic() - entry.date_load < self.ttl):
+            self.__entries.move_to_end(key)
+            return entry
+        if key in self.__pending:
+            state, data = self.__pending[key]
+            entry = UserStateEntry(state, copy.deepcopy(data))
+        else:
+            date_request = time.monotonic()
+            state, data = await user_states_service.get_state_and_data(*key)
+            entry = self.__entries.get(key)
+            if entry is not None and (key in self.__pending or entry.date_load >= date_request):
+                return entry
+            entry = UserStateEntry(state, data if data is not None else dict())
+        self.__entries[key] = entry
+        self.__entries.move_to_end(key)
+        self.__evict()
+        return entry
+
+    def __evict(self):
+        while len(self.__entries) > self.max_size:
+            self.__entries.popitem(last=False)
+
+    def __mark_dirty(self, key: UserStateKey, entry: UserStateEntry):
+        self.__pending[key] = (entry.state, copy.deepcopy(entry.data))
+        self.__schedule_flush(self.flush_delay)
+
+    def __schedule_flush(self, delay: float):
+        if self.__is_closed:
+            return
+        if self.__flush_task is None or self.__flush_task.done():
+            self.__flush_task = asyncio.create_task(self.__delayed_flush(delay))
+
+    async def __delayed_flush(self, delay: float):
+        await asyncio.sleep(delay)
+        self.__flush_task = None
+        await self.flush()
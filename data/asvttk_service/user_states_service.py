@@ -1,51 +1,81 @@
+from typing import Optional
+
 from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from data.asvttk_service.database import database
 from data.asvttk_service.models import UserStateOrm
 
 
-async def __create_user_state(s: AsyncSession, user_id: int, chat_id: int):
-    user_state = UserStateOrm(user_id=user_id, chat_id=chat_id, state=None, data=dict())
-    s.add(user_state)
-    await s.commit()
+def __insert():
+    dialect_name = database.engine.dialect.name
+    if dialect_name == "postgresql":
+        return postgresql.insert(UserStateOrm)
+    elif dialect_name == "sqlite":
+        return sqlite.insert(UserStateOrm)
+    else:
+        raise NotImplementedError(f"Upsert is not supported for {dialect_name}")
+
+
+async def __get_state_and_data(s: AsyncSession, user_id: int, chat_id: int) -> Optional[tuple[str | None, dict]]:
+    res = await s.execute(select(UserStateOrm.state, UserStateOrm.data)
+                          .filter(UserStateOrm.user_id == user_id, UserStateOrm.chat_id == chat_id))
+    return res.one_or_none()
 
 
-async def __get_user_state_or_create(s: AsyncSession, user_id: int, chat_id: int) -> UserStateOrm:
-    where = (UserStateOrm.user_id == user_id, UserStateOrm.chat_id == chat_id)
-    res = await s.execute(select(UserStateOrm).filter(*where))
-    user_state = res.scalar_one_or_none()
-    if not user_state:
-        await __create_user_state(s, user_id, chat_id)
-        res = await s.execute(select(UserStateOrm).filter(*where))
-        user_state = res.scalar_one_or_none()
-    return user_state
+async def __upsert(s: AsyncSession, rows: list[dict], *columns: str):
+    # A user has one row, it follows the chat the user wrote from last.
+    stmt = __insert().values(rows)
+    update = {i: stmt.excluded[i] for i in ("chat_id", *columns)}
+    await s.execute(stmt.on_conflict_do_update(index_elements=[UserStateOrm.user_id], set_=update))
 
 
 async def set_state(user_id: int, chat_id: int, state: str | None):
     async with database.session_factory() as session:
-        user_state = await __get_user_state_or_create(session, user_id, chat_id)
-        user_state.state = state
+        await __upsert(session, [dict(user_id=user_id, chat_id=chat_id, state=state, data=dict())], "state")
         await session.commit()
 
 
 async def set_data(user_id: int, chat_id: int, data: dict):
     async with database.session_factory() as session:
-        user_state = await __get_user_state_or_create(session, user_id, chat_id)
-        user_state.data = data
+        await __upsert(session, [dict(user_id=user_id, chat_id=chat_id, state=None, data=data)], "data")
         await session.commit()
 
 
 async def get_state(user_id: int, chat_id: int) -> str | None:
-    async with database.session_factory() as session:
-        user_state = await __get_user_state_or_create(session, user_id, chat_id)
-        return user_state.state
+    state, _ = await get_state_and_data(user_id, chat_id)
+    return state
 
 
 async def get_data(user_id: int, chat_id: int) -> dict:
-    async with database.session_factory() as session:
-        user_state = await __get_user_state_or_create(session, user_id, chat_id)
-        return user_state.data
-
+    _, data = await get_state_and_data(user_id, chat_id)
+    return data
 
 
+async def get_state_and_data(user_id: int, chat_id: int) -> tuple[str | None, dict]:
+    async with database.session_factory() as session:
+        res = await __get_state_and_data(session, user_id, chat_id)
+        if res is None:
+            # Only a missing row is written. If the user or the chat already has another row, nothing is inserted
+            # and the empty state is returned.
+            await session.execute(__insert().values(user_id=user_id, chat_id=chat_id, state=None, data=dict())
+                                  .on_conflict_do_nothing())
+            await session.commit()
+            res = await __get_state_and_data(session, user_id, chat_id)
+        await session.commit()
+        return tuple(res) if res is not None else (None, dict())
+
+
+async def set_states_and_data(items: dict[tuple[int, int], tuple[str | None, dict]]):
+    # One statement may not touch a row twice, so only the last item of a user and of a chat is written.
+    rows_by_user_id = {}
+    for (user_id, chat_id), (state, data) in items.items():
+        rows_by_user_id.pop(user_id, None)
+        rows_by_user_id[user_id] = dict(user_id=user_id, chat_id=chat_id, state=state, data=data)
+    rows = list({i["chat_id"]: i for i in rows_by_user_id.values()}.values())
+    if not rows:
+        return
+    async with database.session_factory() as session:
+        await __upsert(session, rows, "state", "data")
+        await session.commit()
@@ -14,8 +14,14 @@ class LIST(ColumnConverter):
             return v
         return self.sep.join(map(str, v))
 
+    def convert_many(self, values: list[Optional[list[Any]]]) -> list[Any]:
+        join = self.sep.join
+        return [None if i is None else join(map(str, i)) for i in values]
+
 
 class MSKDATE(ColumnConverter):
+    result_type = datetime
+
     def __init__(self, sep: str = ", "):
         self.sep = sep
 
@@ -24,6 +30,10 @@ class MSKDATE(ColumnConverter):
             return v
         return datetime.fromtimestamp(v.timestamp() + 3 * 3600)
 
+    def convert_many(self, values: list[Optional[datetime]]) -> list[Any]:
+        fromtimestamp = datetime.fromtimestamp
+        return [None if v is None else fromtimestamp(v.timestamp() + 3 * 3600) for v in values]
+
 
 class ENUM(ColumnConverter):
 
@@ -31,3 +41,16 @@ class ENUM(ColumnConverter):
         if v is None:
             return v
         return str(v.value)
+
+    def convert_many(self, values: list[Optional[Enum]]) -> list[Any]:
+        cache: dict[Enum, str] = {}
+        res = []
+        for v in values:
+            if v is None:
+                res.append(None)
+                continue
+            value = cache.get(v)
+            if value is None:
+                value = cache[v] = str(v.value)
+            res.append(value)
+        return res
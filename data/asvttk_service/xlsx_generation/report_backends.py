@@ -0,0 +1,281 @@
+import abc
+import csv
+import functools
+import gzip
+import os
+import queue
+import typing
+import zipfile
+from abc import ABC
+from datetime import datetime
+from typing import Any, Iterable, Iterator, Optional
+
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
+from openpyxl.utils import get_column_letter
+from openpyxl.workbook import Workbook
+from openpyxl.worksheet._write_only import WriteOnlyWorksheet
+
+from data.asvttk_service.xlsx_generation.types import ReportTable, ReportFormat
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+HEADER_HEIGHT = 30.0
+HEADER_BOLD_FONT = Font(bold=True)
+HEADER_ALIGNMENT = Alignment(vertical="bottom")
+HEADER_FILL = PatternFill(start_color="FFFFCC", end_color="FFFFCC", fill_type="solid")
+HEADER_BORDER = Border(left=Side(style="thin", color="808080"), right=Side(style="thin", color="808080"),
+                       top=Side(style="thin", color="808080"), bottom=Side(style="thin", color="808080"))
+
+CSV_ENCODING = "utf-8"
+REPORT_BATCH_SIZE = 10000
+# Markers sent through the chunk queue after the last chunk.
+REPORT_END = "end"
+REPORT_ABORT = "abort"
+
+
+@functools.lru_cache(maxsize=None)
+def get_column_types(table_type: type[ReportTable]) -> list[type]:
+    hints = typing.get_type_hints(table_type)
+    res = []
+    for name, column in table_type.__columns__.items():
+        if column.converter:
+            res.append(column.converter.result_type)
+            continue
+        hint = hints[name]
+        args = [i for i in typing.get_args(hint) if i is not type(None)]
+        if typing.get_origin(hint) is typing.Union and len(args) == 1:
+            hint = args[0]
+        res.append(hint)
+    return res
+
+
+class TableWriter(ABC):
+    @abc.abstractmethod
+    def write_columns(self, columns: list[list[Any]]):
+        pass
+
+    def append(self, values: list[Any]):
+        self.write_columns([[i] for i in values])
+
+    def close(self):
+        pass
+
+
+class ReportBackend(ABC):
+    extension: str = ""
+    archive_compression: int = zipfile.ZIP_STORED
+
+    @abc.abstractmethod
+    def open(self, path: str, file_name: str, table_types: list[type[ReportTable]]) -> dict[str, TableWriter]:
+        pass
+
+    @abc.abstractmethod
+    def save(self, writers: dict[str, TableWriter]) -> list[str]:
+        pass
+
+    def write(self, path: str, file_name: str, table_types: list[type[ReportTable]],
+              tables: Iterable[ReportTable]) -> list[str]:
+        writers = self.open(path, file_name, table_types)
+        batches: dict[str, list[ReportTable]] = {i.__tablename__: [] for i in table_types}
+        try:
+            for table in tables:
+                batch = batches[table.__tablename__]
+                batch.append(table)
+                if len(batch) >= REPORT_BATCH_SIZE:
+                    self.__flush(writers[table.__tablename__], type(table), batch)
+            for table_type in table_types:
+                self.__flush(writers[table_type.__tablename__], table_type, batches[table_type.__tablename__])
+        except Exception:
+            for writer in writers.values():
+                writer.close()
+            raise
+        return self.save(writers)
+
+    @staticmethod
+    def __flush(writer: TableWriter, table_type: type[ReportTable], batch: list[ReportTable]):
+        if batch:
+            writer.write_columns(table_type.__convert_columns__(batch))
+            batch.clear()
+
+
+class SheetWriter(TableWriter):
+    def __init__(self, wb: Workbook, table_type: type[ReportTable]):
+        self.ws: WriteOnlyWorksheet = wb.create_sheet(title=table_type.__tablename__)
+        columns = list(table_type.__columns__.values())
+        self.styles = [(n, i.style.name) for n, i in enumerate(columns) if i.style]
+        for column in columns:
+            if column.style and column.style.name not in wb.named_styles:
+                wb.add_named_style(column.style)
+        for idx, column in enumerate(columns, 1):
+            self.ws.column_dimensions[get_column_letter(idx)].width = column.width
+        self.ws.row_dimensions[1].height = HEADER_HEIGHT
+        self.ws.append([self.__header_cell(i.alias) for i in columns])
+
+    def __header_cell(self, value: str) -> WriteOnlyCell:
+        cell = WriteOnlyCell(self.ws, value=value)
+        cell.font = HEADER_BOLD_FONT
+        cell.alignment = HEADER_ALIGNMENT
+        cell.fill = HEADER_FILL
+        cell.border = HEADER_BORDER
+        return cell
+
+    def write_columns(self, columns: list[list[Any]]):
+        for row in zip(*columns):
+            self.append(row)
+
+    def append(self, values: list[Any]):
+        row = list(values)
+        for idx, style in self.styles:
+            cell = WriteOnlyCell(self.ws, value=row[idx])
+            cell.style = style
+            row[idx] = cell
+        self.ws.append(row)
+
+
+class XlsxReportBackend(ReportBackend):
+    extension = "xlsx"
+
+    def __init__(self):
+        self.wb: Optional[Workbook] = None
+        self.filename: Optional[str] = None
+
+    def open(self, path: str, file_name: str, table_types: list[type[ReportTable]]) -> dict[str, TableWriter]:
+        self.wb = Workbook(write_only=True)
+        self.filename = os.path.join(path, f"{file_name}.{self.extension}")
+        return {i.__tablename__: SheetWriter(self.wb, i) for i in table_types}
+
+    def save(self, writers: dict[str, TableWriter]) -> list[str]:
+        self.wb.save(self.filename)
+        return [self.filename]
+
+
+class CsvWriter(TableWriter):
+    def __init__(self, filename: str, table_type: type[ReportTable], compress: bool):
+        self.filename = filename
+        if compress:
+            self.file = gzip.open(filename, "wt", encoding=CSV_ENCODING, newline="")
+        else:
+            self.file = open(filename, "w", encoding=CSV_ENCODING, newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(list(table_type.__columns__.keys()))
+        self.date_columns = [n for n, i in enumerate(get_column_types(table_type)) if i is datetime]
+
+    def write_columns(self, columns: list[list[Any]]):
+        columns = list(columns)
+        for idx in self.date_columns:
+            columns[idx] = [None if i is None else i.isoformat() for i in columns[idx]]
+        self.writer.writerows(zip(*columns))
+
+    def close(self):
+        self.file.close()
+
+
+class CsvReportBackend(ReportBackend):
+    def __init__(self, compress: bool = False):
+        self.compress = compress
+        self.extension = ReportFormat.CSV_GZIP if compress else ReportFormat.CSV
+        self.archive_compression = zipfile.ZIP_STORED if compress else zipfile.ZIP_DEFLATED
+
+    def open(self, path: str, file_name: str, table_types: list[type[ReportTable]]) -> dict[str, TableWriter]:
+        return {i.__tablename__: CsvWriter(os.path.join(path, f"{file_name}_{i.__tablename__}.{self.extension}"),
+                                           i, self.compress) for i in table_types}
+
+    def save(self, writers: dict[str, TableWriter]) -> list[str]:
+        for writer in writers.values():
+            writer.close()
+        return [i.filename for i in writers.values()]
+
+
+class ParquetWriter(TableWriter):
+    ARROW_TYPES = {int: "int64", float: "float64", str: "string", bool: "bool_"}
+
+    def __init__(self, filename: str, table_type: type[ReportTable]):
+        self.filename = filename
+        fields = [pyarrow.field(name, self.__arrow_type(column_type)) for name, column_type in
+                  zip(table_type.__columns__.keys(), get_column_types(table_type))]
+        self.schema = pyarrow.schema(fields)
+        self.writer = pyarrow.parquet.ParquetWriter(filename, self.schema)
+
+    def __arrow_type(self, column_type: type):
+        if column_type is datetime:
+            return pyarrow.timestamp("s")
+        return getattr(pyarrow, self.ARROW_TYPES.get(column_type, "string"))()
+
+    def write_columns(self, columns: list[list[Any]]):
+        arrays = [pyarrow.array(i, type=field.type) for i, field in zip(columns, self.schema)]
+        self.writer.write_table(pyarrow.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+class ParquetReportBackend(ReportBackend):
+    extension = "parquet"
+
+    def __init__(self):
+        if pyarrow is None:
+            raise RuntimeError("pyarrow is required to write parquet reports")
+
+    def open(self, path: str, file_name: str, table_types: list[type[ReportTable]]) -> dict[str, TableWriter]:
+        return {i.__tablename__: ParquetWriter(os.path.join(path, f"{file_name}_{i.__tablename__}.{self.extension}"),
+                                               i) for i in table_types}
+
+    def save(self, writers: dict[str, TableWriter]) -> list[str]:
+        for writer in writers.values():
+            writer.close()
+        return [i.filename for i in writers.values()]
+
+
+def is_report_format_available(report_format: str) -> bool:
+    # pyarrow is an optional dependency, without it there are no parquet reports.
+    return report_format != ReportFormat.PARQUET or pyarrow is not None
+
+
+def get_report_backend(report_format: str) -> ReportBackend:
+    if report_format == ReportFormat.XLSX:
+        return XlsxReportBackend()
+    elif report_format == ReportFormat.CSV:
+        return CsvReportBackend()
+    elif report_format == ReportFormat.CSV_GZIP:
+        return CsvReportBackend(compress=True)
+    elif report_format == ReportFormat.PARQUET:
+        return ParquetReportBackend()
+    raise ValueError(f"Unknown report format: {report_format}")
+
+
+def write_report(path: str, file_name: str, report_format: str, table_types: list[type[ReportTable]],
+                 tables: Iterable[ReportTable]) -> str:
+    backend = get_report_backend(report_format)
+    filenames = backend.write(path, file_name, table_types, tables)
+    if len(filenames) == 1:
+        return filenames[0]
+    archive_filename = os.path.join(path, f"{file_name}.{backend.extension}.zip")
+    try:
+        with zipfile.ZipFile(archive_filename, "w", compression=backend.archive_compression) as archive:
+            for filename in filenames:
+                archive.write(filename, os.path.basename(filename))
+    finally:
+        for filename in filenames:
+            os.remove(filename)
+    return archive_filename
+
+
+def iter_chunks(chunks: queue.Queue) -> Iterator[ReportTable]:
+    while True:
+        chunk = chunks.get()
+        if chunk == REPORT_END:
+            return
+        if chunk == REPORT_ABORT:
+            raise RuntimeError("The report was aborted by its producer")
+        yield from chunk
+
+
+def write_report_from_queue(path: str, file_name: str, report_format: str, table_types: list[type[ReportTable]],
+                            chunks: queue.Queue) -> str:
+    # Rows arrive in bounded chunks while the parent still reads them, so neither process holds the whole report.
+    return write_report(path, file_name, report_format, table_types, iter_chunks(chunks))
@@ -49,6 +49,10 @@ class ResultConverter(ColumnConverter):
             return v
         return self.RESULT_TRUE if v else self.RESULT_FALSE
 
+    def convert_many(self, values: list[Optional[Any]]) -> list[Any]:
+        results = {True: self.RESULT_TRUE, False: self.RESULT_FALSE}
+        return [None if v is None else results[bool(v)] for v in values]
+
 
 @dataclasses.dataclass
 class StudentRT(ReportTable):
@@ -61,6 +65,8 @@ class StudentRT(ReportTable):
     date_create: datetime
     state: RStudentState
     progress: float
+    answered_count: int
+    correct_count: int
 
     __columns__ = {
         "id": ColumnRT("ID", width=COLUMN_WIDTH_ID),
@@ -70,6 +76,8 @@ class StudentRT(ReportTable):
         "date_create": ColumnRT("Дата создания", converter=MSKDATE(), style=DATE_STYLE, width=COLUMN_WIDTH_DATE),
         "state": ColumnRT("Состояние", converter=ENUM(), width=COLUMN_WIDTH_NAME),
         "progress": ColumnRT("Прогресс", style=PERCENT_STYLE, width=COLUMN_WIDTH_NUM),
+        "answered_count": ColumnRT("Ответов", width=COLUMN_WIDTH_NUM),
+        "correct_count": ColumnRT("Верных ответов", width=COLUMN_WIDTH_NUM),
     }
 
 
@@ -111,6 +119,8 @@ class LevelRT(ReportTable):
     options: Optional[list[str]]
     correct_option: Optional[str]
     explanation: Optional[str]
+    answered_count: int
+    correct_rate: Optional[float]
 
     __columns__ = {
         "id": ColumnRT("ID", width=COLUMN_WIDTH_ID),
@@ -124,6 +134,8 @@ class LevelRT(ReportTable):
         "options": ColumnRT("Варианты ответов", converter=LIST(), width=COLUMN_WIDTH_SMALL_LIST),
         "correct_option": ColumnRT("Верный ответ", width=COLUMN_WIDTH_NAME),
         "explanation": ColumnRT("Объяснение", width=COLUMN_WIDTH_SMALL_TEXT),
+        "answered_count": ColumnRT("Ответов", width=COLUMN_WIDTH_NUM),
+        "correct_rate": ColumnRT("Верных ответов", style=PERCENT_STYLE, width=COLUMN_WIDTH_NUM),
     }
 
 
@@ -159,3 +171,24 @@ class ReportRT(ReportTable):
     __columns__ = {
         "date_create": ColumnRT("Дата создания", converter=MSKDATE(), style=DATE_STYLE, width=COLUMN_WIDTH_DATE),
     }
+
+
+@dataclasses.dataclass
+class StudentRosterRT(ReportTable):
+    __tablename__ = "Приглашения"
+
+    id: int
+    last_name: Optional[str]
+    first_name: str
+    patronymic: Optional[str]
+    access_key: str
+    access_link: str
+
+    __columns__ = {
+        "id": ColumnRT("ID", width=COLUMN_WIDTH_ID),
+        "last_name": ColumnRT("Фамилия", width=COLUMN_WIDTH_NAME),
+        "first_name": ColumnRT("Имя", width=COLUMN_WIDTH_NAME),
+        "patronymic": ColumnRT("Отчество", width=COLUMN_WIDTH_NAME),
+        "access_key": ColumnRT("Ключ доступа", width=COLUMN_WIDTH_TITLE),
+        "access_link": ColumnRT("Ссылка-приглашение", width=COLUMN_WIDTH_TEXT),
+    }
@@ -20,11 +20,24 @@ class ReportFile:
         os.remove(self.__absolute_path__)
 
 
+class ReportFormat:
+    XLSX = "xlsx"
+    CSV = "csv"
+    CSV_GZIP = "csv.gz"
+    PARQUET = "parquet"
+
+
 class ColumnConverter(ABC):
+    result_type: type = str
+
     @abc.abstractmethod
     def convert(self, v: Optional[Any]) -> Any:
         pass
 
+    def convert_many(self, values: list[Optional[Any]]) -> list[Any]:
+        convert = self.convert
+        return [convert(i) for i in values]
+
 
 class ColumnRT:
     def __init__(self, alias: Optional[str] = None, style: Optional[NamedStyle] = None,
@@ -50,18 +63,20 @@ class ReportTable:
 
     @property
     def __values__(self):
-        return list(dataclasses.asdict(self).values())
+        return [getattr(self, i) for i in self.__columns__]
 
     @property
     def __values_converted__(self):
-        columns = list(self.__columns__.values())
-        values = list(dataclasses.asdict(self).values())
-        if len(columns) != len(values):
-            raise ValueError("len(columns) != len(values)")
+        return self.__convert_rows__([self])[0]
+
+    @classmethod
+    def __convert_columns__(cls, tables: list["ReportTable"]) -> list[list[Any]]:
         res = []
-        for i in range(len(values)):
-            if columns[i].converter:
-                res.append(columns[i].converter.convert(values[i]))
-            else:
-                res.append(values[i])
+        for key, column in cls.__columns__.items():
+            values = [getattr(i, key) for i in tables]
+            res.append(column.converter.convert_many(values) if column.converter else values)
         return res
+
+    @classmethod
+    def __convert_rows__(cls, tables: list["ReportTable"]) -> list[list[Any]]:
+        return [list(i) for i in zip(*cls.__convert_columns__(tables))]
@@ -1,64 +1,126 @@
 import asyncio
+import multiprocessing
 import os
 import platform
-from concurrent.futures import ThreadPoolExecutor
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, Future
+from multiprocessing.managers import SyncManager
+from typing import Any, AsyncIterable, Awaitable, Callable, Iterable, Optional
 
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from openpyxl.workbook import Workbook
-from openpyxl.worksheet.worksheet import Worksheet
 from typeguard import typechecked
 
-from data.asvttk_service.xlsx_generation.types import ReportTable, ReportFile
+from data.asvttk_service.xlsx_generation.report_backends import write_report_from_queue, REPORT_END, REPORT_ABORT
+from data.asvttk_service.xlsx_generation.types import ReportTable, ReportFile, ReportFormat
 
-HEADER_HEIGHT = 30.0
-HEADER_BOLD_FONT = Font(bold=True)
-HEADER_ALIGNMENT = Alignment(vertical="bottom")
-HEADER_FILL = PatternFill(start_color="FFFFCC", end_color="FFFFCC", fill_type="solid")
-HEADER_BORDER = Border(left=Side(style="thin", color="808080"), right=Side(style="thin", color="808080"),
-                       top=Side(style="thin", color="808080"), bottom=Side(style="thin", color="808080"))
+GENERATED_PATH = os.path.join('data', 'asvttk_service', 'xlsx_generation', 'generated')
 
+DEFAULT_MAX_WORKERS = 2
+REPORT_CHUNK_SIZE = 1000
+REPORT_QUEUE_CHUNKS = 4
+REPORT_PUT_TIMEOUT = 1.0
 
-@typechecked
-def __create_xlsx(file_name: str, table_types: list[type[ReportTable]], tables: list[ReportTable]) -> str:
-    wb = Workbook()
-    if table_types:
-        wb.remove(wb.active)
-    for table_type in table_types:
-        ws: Worksheet = wb.create_sheet(title=table_type.__tablename__)
-        columns = list(table_type.__columns__.values())
-        ws.append([i.alias for i in columns])
-        ws.row_dimensions[1].height = HEADER_HEIGHT
-        for idx, column in enumerate(columns, 1):
-            cell = ws.cell(row=1, column=idx)
-            cell.font = HEADER_BOLD_FONT
-            cell.alignment = HEADER_ALIGNMENT
-            cell.fill = HEADER_FILL
-            cell.border = HEADER_BORDER
-            col_letter = cell.column_letter
-            ws.column_dimensions[col_letter].width = column.width
-    for table in tables:
-        ws: Worksheet = wb[table.__tablename__]
-        ws.append(table.__values_converted__)
-        row = list(ws.rows)[-1]
-        for i in range(len(row)):
-            style = table.__named_styles__[i]
-            if style:
-                row[i].style = style
-
-    filename = os.path.join('data', 'asvttk_service', 'xlsx_generation', 'generated', f'{file_name}.xlsx')
-    wb.save(filename)
-    return filename
-
-
-async def __run_sync_code_in_thread(*args):
-    loop = asyncio.get_running_loop()
-    with ThreadPoolExecutor() as pool:
-        result = await loop.run_in_executor(pool, __create_xlsx, *args)
-    return result
+executor: Optional[ProcessPoolExecutor] = None
+manager: Optional[SyncManager] = None
+
+
+def start_executor(max_workers: int = DEFAULT_MAX_WORKERS) -> ProcessPoolExecutor:
+    global executor, manager
+    if executor is None:
+        context = multiprocessing.get_context("spawn")
+        executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+        manager = context.Manager()
+    return executor
+
+
+def shutdown_executor():
+    global executor, manager
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+        executor = None
+    if manager is not None:
+        manager.shutdown()
+        manager = None
+
+
+def __delete_abandoned_file(future: Future):
+    if not future.cancelled() and future.exception() is None:
+        os.remove(future.result())
+
+
+async def __iter_chunks(tables: Iterable[ReportTable] | AsyncIterable[ReportTable]):
+    chunk = []
+    if isinstance(tables, AsyncIterable):
+        async for table in tables:
+            chunk.append(table)
+            if len(chunk) >= REPORT_CHUNK_SIZE:
+                yield chunk
+                chunk = []
+    else:
+        for table in tables:
+            chunk.append(table)
+            if len(chunk) >= REPORT_CHUNK_SIZE:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+async def __put(chunks: queue.Queue, item, future: Future) -> bool:
+    # The queue is bounded: waits while the worker is behind, but gives up once the worker has failed.
+    while not future.done():
+        try:
+            await asyncio.to_thread(chunks.put, item, True, REPORT_PUT_TIMEOUT)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def __abort(chunks: queue.Queue, future: Future):
+    while not future.done():
+        try:
+            chunks.put(REPORT_ABORT, True, REPORT_PUT_TIMEOUT)
+            return
+        except queue.Full:
+            pass
+
+
+async def __run_sync_code_in_process(file_name: str, report_format: str, table_types: list[type[ReportTable]],
+                                     tables: Iterable[ReportTable] | AsyncIterable[ReportTable],
+                                     on_tables_read: Optional[Callable[[], Awaitable[Any]]] = None) -> str:
+    start_executor()
+    chunks = manager.Queue(REPORT_QUEUE_CHUNKS)
+    future = executor.submit(write_report_from_queue, GENERATED_PATH, file_name, report_format, table_types, chunks)
+    try:
+        async for chunk in __iter_chunks(tables):
+            if not await __put(chunks, chunk, future):
+                break
+        else:
+            await __put(chunks, REPORT_END, future)
+        if on_tables_read is not None:
+            # The worker may still be writing: whatever the rows were read from can be released already.
+            await on_tables_read()
+        return await asyncio.wrap_future(future)
+    except BaseException:
+        if not future.cancel():
+            # The worker is waiting for more rows: it stops once it reads the marker.
+            threading.Thread(target=__abort, args=(chunks, future), daemon=True).start()
+            future.add_done_callback(__delete_abandoned_file)
+        raise
 
 
 @typechecked
-async def create_xlsx(file_name: str, table_types: list[type[ReportTable]], tables: list[ReportTable]) -> ReportFile:
-    filename = await __run_sync_code_in_thread(file_name, table_types, tables)
+async def create_report(file_name: str, table_types: list[type[ReportTable]],
+                        tables: Iterable[ReportTable] | AsyncIterable[ReportTable],
+                        report_format: str = ReportFormat.XLSX,
+                        on_tables_read: Optional[Callable[[], Awaitable[Any]]] = None) -> ReportFile:
+    filename = await __run_sync_code_in_process(file_name, report_format, table_types, tables, on_tables_read)
     path = os.path.dirname(filename)
     return ReportFile(path, os.path.basename(filename))
+
+
+@typechecked
+async def create_xlsx(file_name: str, table_types: list[type[ReportTable]],
+                      tables: Iterable[ReportTable] | AsyncIterable[ReportTable]) -> ReportFile:
+    return await create_report(file_name, table_types, tables, ReportFormat.XLSX)
@@ -22,21 +22,21 @@ router = Router()
 
 TAG_LOG_OUT_WARNING = "lo_warn"
 
+# Access keys are kept in the FSM data: with a token they do not fit into the 64 bytes of callback data.
+LOG_IN_ACCESS_KEY = "log_in_access_key"
+
 
 class FirstLogInWarningCD(CallbackData, prefix='f_li_warn'):
-    first_name: str
-    access_key: str
     action: int
 
     class Action:
         READ_IT = 0
 
 
-def get_first_log_in_warning_keyboard(first_name: str, access_key: str):
+def get_first_log_in_warning_keyboard():
     kbb = InlineKeyboardBuilder()
     adjust = []
-    btn_read_it_data = FirstLogInWarningCD(first_name=first_name, access_key=access_key,
-                                           action=FirstLogInWarningCD.Action.READ_IT)
+    btn_read_it_data = FirstLogInWarningCD(action=FirstLogInWarningCD.Action.READ_IT)
     kbb.add(InlineKeyboardButton(text=strings.BTN_READ_IT, callback_data=btn_read_it_data.pack()))
     adjust += [1]
     kbb.adjust(*adjust)
@@ -61,7 +61,9 @@ async def first_log_in_data_callback(callback: CallbackQuery, state: FSMContext)
 @router.callback_query(ConfirmationCD.filter(F.tag == TAG_LOG_OUT_WARNING))
 async def log_out_warning_callback(callback: CallbackQuery, state: FSMContext):
     data = ConfirmationCD.unpack(callback.data)
-    log_in_access_key = data.args
+    state_data = await state.get_data()
+    log_in_access_key = state_data.get(LOG_IN_ACCESS_KEY, None)
+    await state.update_data({LOG_IN_ACCESS_KEY: None})
     try:
         await service.token_validate(data.token)
         if data.is_agree:
@@ -84,9 +86,10 @@ async def log_out_warning_callback(callback: CallbackQuery, state: FSMContext):
         await unknown_error_for_callback(callback, state)
 
 
-async def show_log_out_warning(token: str, msg: Message, warning_text: str, new_access_key: Optional[str] = None):
-    await show_confirmation(token, msg, item_id=0, text=warning_text,
-                            tag=TAG_LOG_OUT_WARNING, args=new_access_key, simple=True)
+async def show_log_out_warning(token: str, msg: Message, state: FSMContext, warning_text: str,
+                               new_access_key: Optional[str] = None):
+    await state.update_data({LOG_IN_ACCESS_KEY: new_access_key})
+    await show_confirmation(token, msg, item_id=0, text=warning_text, tag=TAG_LOG_OUT_WARNING, simple=True)
 
 
 async def log_in(msg: Message, user_id: int, state: FSMContext, access_key: str):
@@ -101,7 +104,7 @@ async def log_in(msg: Message, user_id: int, state: FSMContext, access_key: str)
         await msg.answer(strings.LOG_IN__SUCCESS.format(first_name=eschtml(account.first_name)))
     if log_in_data.is_first and account.type != AccountType.STUDENT:
         text = strings.LOG_IN__SUCCESS__FIRST
-        keyboard = get_first_log_in_warning_keyboard(account.first_name, access_key=log_in_data.access_key)
+        keyboard = get_first_log_in_warning_keyboard()
         await msg.answer(text, reply_markup=keyboard)
     elif account.type == AccountType.STUDENT:
         await student_handlers.show_start(log_in_data.token, msg, state)
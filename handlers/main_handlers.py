@@ -44,10 +44,10 @@ async def start_handler(msg: Message, state: FSMContext, command: CommandObject)
             account = await service.get_account_by_token(token)
             await delete_msg(msg.bot, msg.chat.id, msg.message_id)
             if account.type == AccountType.STUDENT:
-                await show_log_out_warning(token, msg, strings.LOG_IN__WARNING__STUDENT, access_key)
+                await show_log_out_warning(token, msg, state, strings.LOG_IN__WARNING__STUDENT, access_key)
                 return
             else:
-                await show_log_out_warning(token, msg, strings.LOG_OUT__WARNING, access_key)
+                await show_log_out_warning(token, msg, state, strings.LOG_OUT__WARNING, access_key)
                 return
         except TokenNotValidError:
             pass
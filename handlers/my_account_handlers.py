@@ -136,7 +136,7 @@ async def my_account_callback(callback: CallbackQuery, state: FSMContext):
             await callback.answer()
         elif data.action == data.Action.LOG_OUT:
             text = strings.LOG_OUT__WARNING
-            await show_log_out_warning(data.token, callback.message, warning_text=text)
+            await show_log_out_warning(data.token, callback.message, state, warning_text=text)
             await callback.answer()
     except AccessError:
         await access_error_for_callback(callback, state)
@@ -10,7 +10,7 @@ from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, PollAnswer
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
-from data.asvttk_service import asvttk_service as service
+from data.asvttk_service import asvttk_service as service, unit_of_work
 from data.asvttk_service.exceptions import TokenNotValidError, LevelAnswerAlreadyExistsError, \
     TrainingIsNotActiveError, UnknownError, NotFoundError, AccessError
 from data.asvttk_service.models import LevelType
@@ -80,9 +80,10 @@ async def learning_callback(callback: CallbackQuery, state: FSMContext):
         await service.token_validate(data.token)
         if data.action == data.Action.ANSWER:
             await callback.message.edit_reply_markup(reply_markup=None)
-            if data.level_type == LevelType.INFO:
-                await service.create_level_answer(data.token, data.level_id)
-            await show_current_level(data.token, callback.message, state)
+            level_id = data.level_id if data.level_type == LevelType.INFO else None
+            step = await service.advance_student(data.token, level_id)
+            await unit_of_work.commit()
+            await show_current_level(data.token, callback.message, state, step.progress)
             await callback.message.delete()
         if data.action == data.Action.SHOW:
             await callback.message.edit_reply_markup(reply_markup=None)
@@ -110,16 +111,17 @@ async def poll_answer_handler(answer: PollAnswer, state: FSMContext):
     level_id = cld[1]
     try:
         await service.token_validate(token)
-        await service.create_level_answer(token, level_id, answer.option_ids)
+        step = await service.advance_student(token, level_id, answer.option_ids)
+        await unit_of_work.commit()
         await asyncio.sleep(2)
-        await show_current_level(token, msg, state)
+        await show_current_level(token, msg, state, step.progress)
     except LevelAnswerAlreadyExistsError:
         await restart_handler(msg, state)
     except TrainingIsNotActiveError:
         await msg.answer(strings.TRAINING_PROGRESS__TRAINING_IS_STOPPED)
     except TokenNotValidError:
         await token_not_valid_error(msg, state)
-    except UnknownError:
+    except (UnknownError, NotFoundError, AccessError):
         await unknown_error(msg, state, canceled=False)
 
 
@@ -181,15 +183,18 @@ async def show_start(token: str, msg: Message, state: FSMContext, has_start_leve
         raise UnknownError()
 
 
-async def show_current_level(token: str, msg: Message, state: FSMContext):
+async def show_current_level(token: str, msg: Message, state: FSMContext,
+                             progress: Optional[StudentProgressData] = None):
     try:
-        progress = await service.get_student_progress(token)
+        if not progress:
+            progress = await service.get_student_progress(token)
         if progress.progress_state == StudentProgressState.COMPLETED:
             text = strings.TRAINING_PROGRESS__COMPLETED.format(training_name=eschtml(progress.training.name))
             await msg.answer(text, message_effect_id=CONFETTI_MSG_EFFECT_ID)
             return
         level_msg = await send_msg(msg, progress.current_level.messages)
-        await service.check_training_is_active(token, progress.training.id)
+        if not progress.is_access:
+            raise TrainingIsNotActiveError()
         if progress.current_level.type == LevelType.CONTROL:
             await state.update_data({CLD: [level_msg.model_dump_json(), progress.current_level.id]})
         if progress.current_level.type == LevelType.INFO:
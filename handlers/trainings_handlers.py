@@ -1,31 +1,42 @@
 import asyncio
+import csv
+import time
+import zipfile
 from src.strings import eschtml, item_id
 from typing import Optional
 
 from aiogram import Router, F
 from aiogram.enums import ContentType, PollType
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command
 from aiogram.filters.callback_data import CallbackData
 from aiogram.fsm.context import FSMContext
 from aiogram.types import Message, CallbackQuery, InlineKeyboardButton, FSInputFile
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from aiogram_album import AlbumMessage
+from openpyxl.utils.exceptions import InvalidFileException
 
 from data.asvttk_service.exceptions import (TokenNotValidError, AccessError, NotFoundError,
                                             TrainingAlreadyHasThisStateError, TrainingIsActiveError,
                                             TrainingIsNotActiveError,
                                             TrainingHasStudentsError, TrainingIsEmptyError, UnknownError,
-                                            TrainingNotFoundError, NotChooseRoleError)
+                                            TrainingNotFoundError, NotChooseRoleError, ReportJobAlreadyExistsError,
+                                            ReportJobQueueIsFullError, ReportJobCancelledError)
 from data.asvttk_service.models import LevelType, AccountType
-from data.asvttk_service.types import TrainingData, StudentData
+from data.asvttk_service.report_jobs import report_job_queue, ReportJobState
+from data.asvttk_service.types import TrainingData, StudentData, TrainingReportData, CreatedAccountData
+from data.asvttk_service.xlsx_generation import xlsx_engine
+from data.asvttk_service.xlsx_generation.report_backends import is_report_format_available
+from data.asvttk_service.xlsx_generation.tables import StudentRosterRT
+from data.asvttk_service.xlsx_generation.types import ReportFormat
 from handlers.handlers_confirmation import ConfirmationCD, show_confirmation
 from handlers.handlers_list import ListItem, get_pages, get_safe_page_index, list_keyboard, get_items_by_page, ListCD
 from handlers.handlers_utils import get_token, token_not_valid_error, token_not_valid_error_for_callback, reset_state, \
     send_msg, get_content_text, unknown_error, unknown_error_for_callback, set_updated_msg, access_error_for_callback, \
     set_updated_item, get_updated_item, get_updated_msg, access_error, get_content_type_str, delete_msg
-from data.asvttk_service import asvttk_service as service
+from data.asvttk_service import asvttk_service as service, unit_of_work
 from handlers.value_validators import valid_content_type_msg, valid_full_name, ValueNotValidError, valid_name, \
-    valid_one_msg
+    valid_one_msg, valid_document, valid_full_names
 from middlewares.one_message_middleware import OneMessageMiddleware
 from src import commands, strings
 from src.keyboards import invite_keyboard
@@ -35,7 +46,8 @@ from src.strings import blockquote
 from src.time_utils import get_date_str, DateFormat
 from src.utils import show, ellipsis_text, get_training_status, CONTENT_TYPE__MEDIA_GROUP, \
     get_level_type_from_content_type, is_started_training, get_full_name_by_account, get_access_key_link, \
-    CONTENT_TYPE__POLL__QUIZ, get_student_state_str
+    CONTENT_TYPE__POLL__QUIZ, get_student_state_str, DOCUMENT_EXTENSION__CSV, DOCUMENT_EXTENSION__XLSX, \
+    read_document_rows, get_full_name_from_row
 
 router = Router()
 OneMessageMiddleware(router, one_message_states=[LevelCreateStates.CONTENT, LevelEditStates.CONTENT])
@@ -54,6 +66,10 @@ TAG_DELETE_LEVEL = "l_del"
 NEW_TRAINING_NAME = "new_training_name"
 NEW_LEVEL_TITLE = "new_level_title"
 
+STUDENTS_DOCUMENT_EXTENSIONS = [DOCUMENT_EXTENSION__CSV, DOCUMENT_EXTENSION__XLSX]
+STUDENTS_DOCUMENT_MAX_SIZE = 20 * 1024 * 1024  # Bots cannot download bigger files
+STUDENTS_DOCUMENT_MAX_COUNT = 1000
+
 
 class TrainingCD(CallbackData, prefix="t"):
     token: str
@@ -70,6 +86,9 @@ class TrainingCD(CallbackData, prefix="t"):
         STUDENTS = 6
         REPORT = 7
         CLEAR_DATA = 8
+        CANCEL_REPORT = 9
+        REPORT_CSV = 10
+        REPORT_PARQUET = 11
 
 
 class LevelCD(CallbackData, prefix="l"):
@@ -86,6 +105,8 @@ class LevelCD(CallbackData, prefix="l"):
         PREVIOUS_LEVEL = 4
         EDIT_TITLE = 5
         EDIT = 6
+        MOVE_UP = 7
+        MOVE_DOWN = 8
 
 
 class StartLevelCD(CallbackData, prefix="st_l"):
@@ -128,8 +149,16 @@ def training_keyboard(token: str, training_id: Optional[int] = None, is_started:
             kbb.add(InlineKeyboardButton(text=strings.BTN_TRAINING_START, callback_data=btn_start_data.pack()))
         adjust += [1]
         btn_report_data = TrainingCD(token=token, training_id=training_id, action=TrainingCD.Action.REPORT)
+        btn_report_csv_data = TrainingCD(token=token, training_id=training_id, action=TrainingCD.Action.REPORT_CSV)
         kbb.add(InlineKeyboardButton(text=strings.BTN_REPORT, callback_data=btn_report_data.pack()))
-        adjust += [1]
+        kbb.add(InlineKeyboardButton(text=strings.BTN_REPORT_CSV, callback_data=btn_report_csv_data.pack()))
+        if is_report_format_available(ReportFormat.PARQUET):
+            btn_report_parquet_data = TrainingCD(token=token, training_id=training_id,
+                                                 action=TrainingCD.Action.REPORT_PARQUET)
+            kbb.add(InlineKeyboardButton(text=strings.BTN_REPORT_PARQUET, callback_data=btn_report_parquet_data.pack()))
+            adjust += [3]
+        else:
+            adjust += [2]
         btn_students_data = TrainingCD(token=token, training_id=training_id, action=TrainingCD.Action.STUDENTS)
         btn_levels_data = TrainingCD(token=token, training_id=training_id, action=TrainingCD.Action.LEVELS)
         btn_edit_name_data = TrainingCD(token=token, training_id=training_id, action=TrainingCD.Action.EDIT_NAME)
@@ -163,6 +192,13 @@ def level_keyboard(token: str, training_id: int, level_id: Optional[int] = None,
         kbb.add(InlineKeyboardButton(text=f"{i} / {ii}", callback_data=btn_counter_data.pack()))
         kbb.add(InlineKeyboardButton(text=strings.BTN_NEXT_SYMBOL, callback_data=btn_next_data.pack()))
         adjust += [3]
+        btn_move_up_data = LevelCD(token=token, level_id=level_id, training_id=training_id,
+                                   action=LevelCD.Action.MOVE_UP)
+        btn_move_down_data = LevelCD(token=token, level_id=level_id, training_id=training_id,
+                                     action=LevelCD.Action.MOVE_DOWN)
+        kbb.add(InlineKeyboardButton(text=strings.BTN_MOVE_UP, callback_data=btn_move_up_data.pack()))
+        kbb.add(InlineKeyboardButton(text=strings.BTN_MOVE_DOWN, callback_data=btn_move_down_data.pack()))
+        adjust += [2]
         btn_delete_data = LevelCD(token=token, level_id=level_id, training_id=training_id, action=LevelCD.Action.DELETE)
         btn_edit_title_data = LevelCD(token=token, level_id=level_id, training_id=training_id,
                                       action=LevelCD.Action.EDIT_TITLE)
@@ -193,6 +229,13 @@ def training_start_keyboard(token: str, training_id: int):
     return kbb.as_markup()
 
 
+def report_keyboard(token: str, training_id: int):
+    kbb = InlineKeyboardBuilder()
+    btn_cancel_data = TrainingCD(token=token, training_id=training_id, action=TrainingCD.Action.CANCEL_REPORT)
+    kbb.add(InlineKeyboardButton(text=strings.BTN_CANCEL_REPORT, callback_data=btn_cancel_data.pack()))
+    return kbb.as_markup()
+
+
 def student_keyboard(token: str, training_id: int, student_id: Optional[int] = None):
     kbb = InlineKeyboardBuilder()
     adjust = []
@@ -297,6 +340,15 @@ async def training_callback(callback: CallbackQuery, state: FSMContext):
         elif data.action == data.Action.REPORT:
             await callback.answer()
             await show_training_report(data.token, data.training_id, callback.message)
+        elif data.action == data.Action.REPORT_CSV:
+            await callback.answer()
+            await show_training_report(data.token, data.training_id, callback.message, ReportFormat.CSV)
+        elif data.action == data.Action.REPORT_PARQUET and is_report_format_available(ReportFormat.PARQUET):
+            await callback.answer()
+            await show_training_report(data.token, data.training_id, callback.message, ReportFormat.PARQUET)
+        elif data.action == data.Action.CANCEL_REPORT:
+            report_job_queue.cancel(callback.message.chat.id)
+            await callback.answer(strings.REPORT_CANCELED)
     except TrainingHasStudentsError:
         await callback.answer(strings.TRAINING_HAS_STUDENTS_ERROR)
     except TrainingIsActiveError:
@@ -403,6 +455,41 @@ async def delete_student_callback(callback: CallbackQuery, state: FSMContext):
         await unknown_error_for_callback(callback, state)
 
 
+@router.message(StudentCreateState.FULL_NAME, F.document)
+async def create_students_handler(msg: Message, state: FSMContext):
+    token = await get_token(state)
+    try:
+        await service.token_validate(token)
+        extension = valid_document(msg, STUDENTS_DOCUMENT_EXTENSIONS, STUDENTS_DOCUMENT_MAX_SIZE)
+        file = await msg.bot.download(msg.document)
+        rows = (get_full_name_from_row(i) for i in read_document_rows(file, extension))
+        full_names = valid_full_names(rows, STUDENTS_DOCUMENT_MAX_COUNT, null_if_empty=True)
+        updated_item_id, args = await get_updated_item(state)
+        accounts = await service.create_students(token, updated_item_id, full_names)
+        await unit_of_work.commit()
+        await send_students_roster(msg, updated_item_id, full_names, accounts)
+        await reset_state(state)
+        await asyncio.sleep(0.5)
+        updated_msg_id, updated_msg_args = await get_updated_msg(state)
+        await show_students(token, msg, updated_item_id, edited_msg_id=updated_msg_id, is_answer=True)
+    except ValueNotValidError as e:
+        await msg.answer(strings.error_value(error_msg=e.error_msg))
+    except (UnicodeDecodeError, csv.Error, zipfile.BadZipFile, InvalidFileException):
+        await msg.answer(strings.error_value(error_msg=strings.ERROR__DOCUMENT_READ))
+    except TrainingIsNotActiveError:
+        await msg.answer(strings.TRAINING_IS_NOT_STARTED_ERROR)
+        await reset_state(state)
+    except AccessError:
+        await access_error(msg, state)
+    except (NotFoundError, TrainingNotFoundError):
+        await msg.answer(strings.TRAINING__NOT_FOUND)
+        await reset_state(state)
+    except TokenNotValidError:
+        await token_not_valid_error(msg, state)
+    except UnknownError:
+        await unknown_error(msg, state)
+
+
 @router.message(StudentCreateState.FULL_NAME)
 async def create_student_handler(msg: Message, state: FSMContext):
     token = await get_token(state)
@@ -719,6 +806,15 @@ async def level_callback(callback: CallbackQuery, state: FSMContext):
                                         args=data.training_id)
             elif data.action == data.Action.COUNTER:
                 await show_level(data.token, callback.message, data.level_id)
+            elif data.action == data.Action.MOVE_UP and level.previous_level_id:
+                previous_level = await service.get_level_by_id(data.token, level.previous_level_id)
+                await service.move_level_by_id(data.token, data.level_id, previous_level.previous_level_id)
+                await show_about_level(data.token, callback.message, data.training_id, data.level_id,
+                                       is_answer=False)
+            elif data.action == data.Action.MOVE_DOWN and level.next_level_id:
+                await service.move_level_by_id(data.token, data.level_id, level.next_level_id)
+                await show_about_level(data.token, callback.message, data.training_id, data.level_id,
+                                       is_answer=False)
             elif data.action == data.Action.EDIT:
                 await service.check_training_is_not_active(data.token, data.training_id)
                 await service.check_training_has_not_students(data.token, data.training_id)
@@ -1149,7 +1245,7 @@ async def show_students(token: str, msg: Message, training_id: int, edited_msg_i
         student_items = []
         for item in page_items:
             student: StudentData = item.obj.student
-            progress_percent = round(len(item.obj.answers) / len(item.obj.training.levels) * 100)
+            progress_percent = round(item.obj.answered_count / len(item.obj.training.levels) * 100)
             state = get_student_state_str(item.obj.progress_state)
             student_item = strings.STUDENT_ITEM.format(index=item.name,
                                                        full_name=eschtml(get_full_name_by_account(student)),
@@ -1171,12 +1267,12 @@ async def show_student(token: str, training_id: int, student_id: int, msg: Messa
     try:
         progress = await service.get_student_progress(token, student_id)
         student: StudentData = progress.student
-        progress_percent = round(len(progress.answers) / len(progress.training.levels) * 100)
+        progress_percent = round(progress.answered_count / len(progress.training.levels) * 100)
         text = strings.STUDENT.format(
             last_name=eschtml(student.last_name), first_name=eschtml(student.first_name), item_id=item_id(student.id),
             patronymic=eschtml(student.patronymic), state=get_student_state_str(progress.progress_state),
             date_create=get_date_str(student.date_create, DateFormat.FORMAT_DAY_MONTH_YEAR_HOUR_MINUTE),
-            answer_count=len(progress.answers), level_count=len(progress.training.levels),
+            answer_count=progress.answered_count, level_count=len(progress.training.levels),
             progress_percent=progress_percent,
         )
         keyboard = student_keyboard(token, training_id, student_id)
@@ -1188,30 +1284,70 @@ async def show_student(token: str, training_id: int, student_id: int, msg: Messa
         await show(msg, text, edited_msg_id=edited_msg_id, keyboard=keyboard, is_answer=is_answer)
 
 
-async def show_training_report(token: str, training_id: int, msg: Message):
-    bot_msg = await msg.answer(text=strings.WAIT_OF_REPORT_GENERATING)
+async def send_training_report(msg: Message, report_data: TrainingReportData):
+    caption = strings.REPORT_TRAINING.format(
+        date_create=get_date_str(report_data.date_create, DateFormat.FORMAT_DAY_MONTH_YEAR_HOUR_MINUTE),
+        training_name=eschtml(ellipsis_text(report_data.training_name)), training_id=report_data.training_id,
+        full_name=eschtml(get_full_name_by_account(report_data.account, full_patronymic=True)),
+    )
+    if report_data.file_id:
+        await msg.answer_document(document=report_data.file_id, caption=caption)
+        return
     try:
-        report_data = await service.get_training_report(token, training_id)
-        training = await service.get_training_by_id(token, training_id)
-        try:
-            account = await service.get_account_by_token(token)
-        except NotFoundError:
-            raise TokenNotValidError()
         file = FSInputFile(path=report_data.report_file.__absolute_path__)
-        caption = strings.REPORT_TRAINING.format(
-            date_create=get_date_str(report_data.date_create, DateFormat.FORMAT_DAY_MONTH_YEAR_HOUR_MINUTE),
-            training_name=eschtml(ellipsis_text(training.name)), training_id=training_id,
-            full_name=eschtml(get_full_name_by_account(account, full_patronymic=True)),
-        )
-        await msg.answer_document(document=file, caption=caption)
-        await delete_msg(bot_msg.bot, bot_msg.chat.id, bot_msg.message_id)
+        bot_msg = await msg.answer_document(document=file, caption=caption)
+        service.cache_training_report(report_data, bot_msg.document.file_id)
+    finally:
         report_data.report_file.delete()
+
+
+async def send_students_roster(msg: Message, training_id: int,
+                               full_names: list[tuple[Optional[str], str, Optional[str]]],
+                               accounts: list[CreatedAccountData]):
+    tables = (StudentRosterRT(id=acc.account_id, last_name=last_name, first_name=first_name, patronymic=patronymic,
+                              access_key=acc.access_key, access_link=get_access_key_link(acc.access_key))
+              for (last_name, first_name, patronymic), acc in zip(full_names, accounts))
+    date = get_date_str(int(time.time()), DateFormat.FORMAT_FULL_2)
+    report_file = await xlsx_engine.create_xlsx(f"Students_{training_id}_{date}", [StudentRosterRT], tables)
+    try:
+        file = FSInputFile(path=report_file.__absolute_path__)
+        await msg.answer_document(document=file, caption=strings.CREATE_STUDENTS__SUCCESS.format(count=len(accounts)))
+    finally:
+        report_file.delete()
+
+
+async def show_training_report(token: str, training_id: int, msg: Message, report_format: str = ReportFormat.XLSX):
+    keyboard = report_keyboard(token, training_id)
+    bot_msg: Optional[Message] = None
+
+    async def on_status(job_state: ReportJobState, position: int):
+        text = strings.WAIT_OF_REPORT_GENERATING
+        if job_state == ReportJobState.QUEUED:
+            text = strings.REPORT_IN_QUEUE.format(position=position + 1)
+        try:
+            await bot_msg.edit_text(text=text, reply_markup=keyboard)
+        except TelegramBadRequest as _:
+            pass
+
+    try:
+        report_data = await service.get_cached_training_report(token, training_id, report_format)
+        if report_data is None:
+            bot_msg = await msg.answer(text=strings.WAIT_OF_REPORT_GENERATING, reply_markup=keyboard)
+            report_data = await report_job_queue.run(
+                msg.chat.id, lambda: service.get_training_report(token, training_id, report_format), on_status)
+        await send_training_report(msg, report_data)
     except (TrainingNotFoundError, NotFoundError):
         await show(msg, text=strings.TRAINING__NOT_FOUND, is_answer=True)
-        await delete_msg(bot_msg.bot, bot_msg.chat.id, bot_msg.message_id)
     except AccessError:
         await show(msg, text=strings.ERROR__ACCESS, is_answer=True)
-        await delete_msg(bot_msg.bot, bot_msg.chat.id, bot_msg.message_id)
+    except ReportJobAlreadyExistsError:
+        await show(msg, text=strings.REPORT_ALREADY_GENERATING, is_answer=True)
+    except ReportJobQueueIsFullError:
+        await show(msg, text=strings.REPORT_QUEUE_IS_FULL, is_answer=True)
+    except ReportJobCancelledError:
+        await show(msg, text=strings.REPORT_CANCELED, is_answer=True)
     except UnknownError:
         await show(msg, text=strings.ERROR__UNKNOWN, is_answer=True)
-        await delete_msg(bot_msg.bot, bot_msg.chat.id, bot_msg.message_id)
+    finally:
+        if bot_msg:
+            await delete_msg(bot_msg.bot, bot_msg.chat.id, bot_msg.message_id)
@@ -1,5 +1,5 @@
 from src.strings import eschtml
-from typing import Optional, Any
+from typing import Optional, Any, Iterable
 
 import validators
 from aiogram.enums import ContentType, PollType
@@ -8,7 +8,7 @@ from aiogram_album import AlbumMessage
 from typeguard import typechecked
 
 from src.strings import code, italic
-from src.utils import CONTENT_TYPE__POLL__QUIZ, get_content_type_str
+from src.utils import CONTENT_TYPE__POLL__QUIZ, get_content_type_str, get_document_extension
 
 
 class ValueNotValidError(Exception):
@@ -36,6 +36,13 @@ ERROR__EMAIL = """Некорректный email."""
 ERROR__REQUIRED_FILL = """Обязательные значения: {required}."""
 ERROR__FULL_NAME_INTEGRITY__MORE = """Вы ввели больше аргументов, чем {than}."""
 ERROR__FULL_NAME_INTEGRITY__LESS = """Вы ввели меньше аргументов, чем {than}."""
+ERROR__DOCUMENT_EXTENSION = """Формат файла некорректен. Доступные форматы: {extensions}."""
+ERROR__DOCUMENT_ROWS = """Файл содержит ошибки:
+{errors}"""
+ERROR__DOCUMENT_ROW = """Строка {row_num}: {error_msg}"""
+ERROR__DOCUMENT_ROWS__MORE = """... и еще {count}."""
+
+MAX_SHOWN_ROW_ERRORS = 10
 
 
 def __is_not_empty(v: Any, arg: str = ""):
@@ -131,3 +138,38 @@ def valid_name(v: str) -> Optional[str]:
     if s:
         raise ValueNotValidError(ERROR__INVALID_CHARS.format(chars=__show_invalid_chars(s)))
     return res
+
+
+@typechecked
+def valid_document(v: Message, extensions: list[str], max_size: int) -> str:
+    extension = get_document_extension(v.document.file_name) if v.document else None
+    if extension not in extensions:
+        extensions_str = [italic(i) for i in extensions]
+        raise ValueNotValidError(ERROR__DOCUMENT_EXTENSION.format(extensions=", ".join(extensions_str)))
+    if v.document.file_size and v.document.file_size > max_size:
+        raise ValueNotValidError(ERROR__MAX_LIMIT.format(limit_value=f"{max_size // (1024 * 1024)} МБ"))
+    return extension
+
+
+@typechecked
+def valid_full_names(rows: Iterable[str], max_count: int, empty_v: str = "-",
+                     null_if_empty: bool = False) -> list[tuple[Optional[str], str, Optional[str]]]:
+    # Every row is checked, so that all mistakes of a file are reported at once. Empty rows are skipped.
+    res = []
+    errors = []
+    for row_num, full_name in enumerate(rows, 1):
+        if not full_name:
+            continue
+        if len(res) + len(errors) >= max_count:
+            raise ValueNotValidError(ERROR__MAX_LIMIT.format(limit_value=f"{max_count} строк"))
+        try:
+            res.append(valid_full_name(full_name, empty_v, null_if_empty))
+        except ValueNotValidError as e:
+            errors.append(ERROR__DOCUMENT_ROW.format(row_num=row_num, error_msg=e.error_msg))
+    if errors:
+        text = "\n".join(errors[:MAX_SHOWN_ROW_ERRORS])
+        if len(errors) > MAX_SHOWN_ROW_ERRORS:
+            text += "\n" + ERROR__DOCUMENT_ROWS__MORE.format(count=len(errors) - MAX_SHOWN_ROW_ERRORS)
+        raise ValueNotValidError(ERROR__DOCUMENT_ROWS.format(errors=text))
+    __is_not_empty(res)
+    return res
@@ -1,24 +1,30 @@
 import asyncio
 from asyncio import CancelledError
 
-from aiogram import Bot, Dispatcher
-from aiogram.client.default import DefaultBotProperties
-from aiogram_album.no_check_count_middleware import WithoutCountCheckAlbumMiddleware
 
-import config
-from custom_storage import CustomStorage
-from data.asvttk_service.database import database
-from handlers import main_handlers, trainings_handlers, admin_roles_handlers, my_account_handlers, \
-    admin_employees_handlers, student_handlers, last_handlers, authorization_handlers
-from config import settings
+async def main():
+    # The bot is imported here and not at the top: report workers are spawned processes that import this module
+    # again, and they only need the report writers.
+    from aiogram import Bot, Dispatcher
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram_album.no_check_count_middleware import WithoutCountCheckAlbumMiddleware
 
+    import config
+    from custom_storage import CustomStorage
+    from data.asvttk_service.database import database
+    from data.asvttk_service.report_jobs import report_job_queue
+    from handlers import main_handlers, trainings_handlers, admin_roles_handlers, my_account_handlers, \
+        admin_employees_handlers, student_handlers, last_handlers, authorization_handlers
+    from middlewares.unit_of_work_middleware import UnitOfWorkMiddleware, UnitOfWorkRequestMiddleware
+    from config import settings
 
-async def main():
     # logging.basicConfig(level=logging.INFO)
     bot_properties = DefaultBotProperties(parse_mode="HTML")
     bot = Bot(token=settings.BOT_TOKEN, default=bot_properties)
+    UnitOfWorkRequestMiddleware(bot=bot)
     storage = CustomStorage(ignore_users_id=[bot.id])
     dispatcher = Dispatcher(storage=storage)
+    UnitOfWorkMiddleware(router=dispatcher)
     WithoutCountCheckAlbumMiddleware(router=dispatcher, latency=0.5)
     dispatcher.include_routers(main_handlers.router, authorization_handlers.router, trainings_handlers.router,
                                admin_roles_handlers.router, my_account_handlers.router, admin_employees_handlers.router,
@@ -26,12 +32,14 @@ async def main():
     student_handlers.bot = bot
     try:
         await bot.set_my_commands(config.BOT_COMMANDS)
-        await database.connect(drop_all="yes")
+        await database.connect(drop_all=settings.DATABASE_DROP_ALL)
         await bot.delete_webhook(drop_pending_updates=True)
         print("bot started")
         await dispatcher.start_polling(bot)
     except CancelledError:
         print("bot ended")
+    finally:
+        await report_job_queue.close()
         await storage.close()
 
 
@@ -0,0 +1,34 @@
+from typing import Callable, Dict, Any, Awaitable, Optional
+
+from aiogram import BaseMiddleware, Router, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import TelegramMethod, Response
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject, User
+
+from data.asvttk_service import unit_of_work
+
+
+class UnitOfWorkMiddleware(BaseMiddleware):
+    def __init__(self, router: Optional[Router]):
+        if router:
+            router.update.outer_middleware(self)
+
+    async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+                       event: TelegramObject, data: Dict[str, Any]) -> Any:
+        user: Optional[User] = data.get("event_from_user")
+        async with unit_of_work.begin(user.id if user else None):
+            return await handler(event, data)
+
+
+class UnitOfWorkRequestMiddleware(BaseRequestMiddleware):
+    # The transaction of a handler is committed before it waits for Telegram, so that the database
+    # (SQLite locks it for every writer) is not held while the request is sent.
+    def __init__(self, bot: Optional[Bot]):
+        if bot:
+            bot.session.middleware(self)
+
+    async def __call__(self, make_request: NextRequestMiddlewareType[TelegramType], bot: Bot,
+                       method: TelegramMethod[TelegramType]) -> Response[TelegramType]:
+        await unit_of_work.commit()
+        return await make_request(bot, method)
@@ -55,9 +55,12 @@ BTN_ADD_SYMBOL = "+"
 BTN_DELETE_YES = "Да, всё верно!"
 BTN_DELETE_NO = "Нет"
 BTN_DELETE_NO_1 = "Отменить!"
+BTN_CANCEL_REPORT = "Отменить"
 BTN_DELETE_BACK = "« Назад"
 BTN_PREVIOUS_SYMBOL = "«"
 BTN_NEXT_SYMBOL = "»"
+BTN_MOVE_UP = "↑  Выше"
+BTN_MOVE_DOWN = "↓  Ниже"
 BTN_SHOW = "Показать"
 BTN_DELETE = "Удалить"
 BTN_LEVELS = "Уровни"
@@ -79,6 +82,8 @@ BTN_BEGIN = "Начать!"
 BTN_CONTINUE = "Продолжить"
 BTN_ALREADY_READ = "Прочитано"
 BTN_REPORT = "📗 Отчёт"
+BTN_REPORT_CSV = "📄 Отчёт CSV"
+BTN_REPORT_PARQUET = "📊 Отчёт Parquet"
 BTN_NEXT = "Далее"
 BTN_ACCESS_KEY = "🔑 Ключ доступа"
 BTN_GIVE_UP_ACCOUNT = "Отдать аккаунт"
@@ -545,6 +550,9 @@ STUDENTS__EMPTY = f"""Список учеников курса '<code>{{training
 STUDENTS__ENTER__FULL_NAME = f"""Введите <b>ФИО</b> ученика.
 Пример:  <code>Иванов Иван -</code>
 
+Чтобы добавить сразу несколько учеников, отправьте файл <b>CSV</b> или <b>XLSX</b> без заголовка:
+по одному ученику в строке, ФИО в одной ячейке или в трех (фамилия, имя, отчество).
+
 /{commands.CANCEL.command} - {commands.CANCEL.description}"""
 
 CREATE_STUDENT__SUCCESS = f"""Аккаунт для ученика готов!
@@ -554,6 +562,12 @@ CREATE_STUDENT__SUCCESS = f"""Аккаунт для ученика готов!
 
 Пригласите пользователя, нажав '<code>Пригласить</code>'."""
 
+CREATE_STUDENTS__SUCCESS = f"""Аккаунты для учеников готовы: <b>{{count}}</b>.
+
+Ключи доступа и ссылки-приглашения — в файле."""
+
+ERROR__DOCUMENT_READ = "Не удалось прочитать файл. Проверьте, что он не поврежден и сохранен в кодировке UTF-8."
+
 
 STUDENT_INVITE_LETTER = f"""Приглашаю вас пройти курс.
 Вы можете пройти его, пройдя по ссылке: {{invite_link}}."""
@@ -615,6 +629,14 @@ WAIT_OF_REPORT_GENERATING = "🔴  Пожалуйста, подождите. О
 
 REPORT_GENERATING_IS_READY = "✅  Отчёт готов!"
 
+REPORT_IN_QUEUE = "🕓  Отчёт в очереди. Место в очереди: {position}"
+
+REPORT_ALREADY_GENERATING = "Ошибка! Дождитесь завершения генерации предыдущего отчёта."
+
+REPORT_QUEUE_IS_FULL = "Сейчас генерируется слишком много отчётов. Попробуйте позже..."
+
+REPORT_CANCELED = "Генерация отчёта отменена."
+
 REPORT_TRAINING = f"""Курс:  <code>{{training_name}}</code>  (<code>ID:{{training_id}}</code>)
 Дата генерации:  <code>{{date_create}}</code>
 Составитель:  <code>{{full_name}}</code>
@@ -5,13 +5,18 @@ from enum import Enum
 import pytz
 
 
-locale.setlocale(locale.LC_TIME, 'ru_RU.UTF-8')
+try:
+    locale.setlocale(locale.LC_TIME, 'ru_RU.UTF-8')
+except locale.Error:
+    # Without the locale month names stay English, e.g. on CI machines.
+    pass
 
 moscow_tz = pytz.timezone('Europe/Moscow')
 
 
 class DateFormat(str, Enum):
     FORMAT_FULL = "%d.%m.%Y, %H:%M:%S"
+    FORMAT_FULL_2 = "%d.%m.%Y_%H-%M-%S"
     FORMAT_SHORT_DATE = "%d.%m.%Y"
     FORMAT_SHORT_TIME = "%H:%M"
     FORMAT_SHORT_TIME_SECOND = "%H:%M:%S"
@@ -1,12 +1,15 @@
+import csv
+import io
 import textwrap
 from functools import reduce
-from typing import Optional, Any
+from typing import Optional, Any, BinaryIO, Iterator
 
 from aiogram.enums import ContentType, PollType
 from aiogram.exceptions import TelegramBadRequest
 from aiogram.types import (Message, InputMediaPhoto, InputMediaVideo, InputMediaDocument, InputMediaAnimation,
                            InputMediaAudio)
 from aiogram_album import AlbumMessage
+from openpyxl import load_workbook
 
 from data.asvttk_service.exceptions import InitialsValueError
 from data.asvttk_service.models import LevelType, FileType, AccountType
@@ -21,6 +24,11 @@ END_PREVIOUS_SESSION_MSG_ID = "end_previous_session_msg_id"
 UPDATED_MSG = "updated_msg"
 UPDATED_ITEM = "updated_item_id"
 
+DOCUMENT_EXTENSION__CSV = "csv"
+DOCUMENT_EXTENSION__XLSX = "xlsx"
+CSV_DELIMITERS = ",;\t"
+CSV_SNIFF_SIZE = 4096
+
 
 def get_level_type_from_content_type(content_type: str, arg: Optional[Any] = None) -> str:
     if content_type in [CONTENT_TYPE__MEDIA_GROUP, ContentType.TEXT, ContentType.AUDIO, ContentType.VIDEO,
@@ -118,6 +126,49 @@ def ellipsis_text(it: str, max_length: int = 20, s: str = "...") -> str:
     return truncated + s
 
 
+def get_document_extension(file_name: Optional[str]) -> Optional[str]:
+    if not file_name or "." not in file_name:
+        return None
+    return file_name.rsplit(".", 1)[1].lower()
+
+
+def read_document_rows(file: BinaryIO, extension: str) -> Iterator[list[str]]:
+    # Rows are read one by one, so a large table is never loaded as a whole.
+    if extension == DOCUMENT_EXTENSION__CSV:
+        text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+        sample = text.read(CSV_SNIFF_SIZE)
+        fmtparams = {}
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=CSV_DELIMITERS)
+        except csv.Error:
+            # Rows with the full name in one cell confuse the sniffer, then the most frequent delimiter is used.
+            dialect = csv.excel
+            fmtparams["delimiter"] = max(CSV_DELIMITERS, key=sample.count)
+        text.seek(0)
+        for row in csv.reader(text, dialect, **fmtparams):
+            yield row
+    elif extension == DOCUMENT_EXTENSION__XLSX:
+        wb = load_workbook(file, read_only=True, data_only=True)
+        try:
+            for row in wb.active.iter_rows(values_only=True):
+                yield ["" if i is None else str(i) for i in row]
+        finally:
+            wb.close()
+    else:
+        raise ValueError(f"Unknown document extension: {extension}")
+
+
+def get_full_name_from_row(row: list[str], empty_v: str = "-") -> str:
+    # A row is either the full name in one cell or the last name, first name and patronymic in three cells.
+    cells = [i.strip() for i in row]
+    while cells and not cells[-1]:
+        cells.pop()
+    if len(cells) <= 1:
+        return cells[0] if cells else ""
+    cells += [""] * (3 - len(cells))
+    return " ".join(i if i else empty_v for i in cells)
+
+
 def is_started_training(training: TrainingData):
     if training.date_start and not training.date_end:
         return True
@@ -0,0 +1,50 @@
+import asyncio
+import os
+import tempfile
+from typing import Any, Coroutine
+
+import pytest
+
+# config.Settings is read on import, so the environment is prepared before any project module is imported.
+TEST_DATABASE_PATH = os.path.join(tempfile.mkdtemp(prefix="asvttk_tests_"), "asvttk.db")
+os.environ.setdefault("ASVTTK_DATABASE_URL", f"sqlite+aiosqlite:///{TEST_DATABASE_PATH}")
+os.environ.setdefault("ADMIN_ACCESS_KEY", "test_admin_access_key")
+os.environ.setdefault("BOT_TOKEN", "123456:test_bot_token")
+
+from config import settings  # noqa: E402
+from data.asvttk_service import asvttk_service as service, user_states_service  # noqa: E402
+from data.asvttk_service.database import database  # noqa: E402
+
+ADMIN_USER_ID = 1
+
+
+def run_with_database(coro: Coroutine) -> Any:
+    # Every test runs in its own event loop, so the pooled connections are not carried over to the next one.
+    async def main():
+        await database.connect()
+        try:
+            return await coro
+        finally:
+            await database.disconnect()
+    return asyncio.run(main())
+
+
+async def log_in(user_id: int, access_key: str) -> str:
+    await user_states_service.set_state(user_id, user_id, None)
+    log_in_data = await service.log_in(user_id, access_key)
+    return log_in_data.token
+
+
+@pytest.fixture
+def run():
+    return run_with_database
+
+
+@pytest.fixture(scope="session")
+def admin_token() -> str:
+    return run_with_database(log_in(ADMIN_USER_ID, settings.ADMIN_ACCESS_KEY))
+
+
+@pytest.fixture
+def log_in_user():
+    return log_in
@@ -0,0 +1,246 @@
+import itertools
+import secrets
+from datetime import datetime
+
+import pytest
+from aiogram.types import Message, Chat
+from openpyxl import load_workbook
+from sqlalchemy import text
+
+from data.asvttk_service import asvttk_service as service
+from data.asvttk_service.exceptions import UnknownError, ConflictError
+from data.asvttk_service.models import LevelType, StudentProgressState, LEVEL_POSITION_STEP
+from data.asvttk_service.xlsx_generation.tables import AnswerRT, LevelRT, StudentRT, TrainingRT, ReportRT
+
+STUDENT_USER_IDS = itertools.count(1000)
+
+
+def text_message(text: str) -> Message:
+    return Message(message_id=1, date=datetime.now(), chat=Chat(id=1, type="private"), text=text)
+
+
+async def create_started_training(token: str, level_count: int = 1) -> int:
+    training = await service.create_training(token, "Training")
+    for i in range(level_count):
+        await service.create_level(token, LevelType.INFO, training.id, f"Level {i}", [text_message(f"Text {i}")])
+    await service.start_training(token, training.id)
+    return training.id
+
+
+def test_advance_student_outside_unit_of_work(run, admin_token, log_in_user):
+    async def scenario():
+        training_id = await create_started_training(admin_token, level_count=2)
+        student = await service.create_student(admin_token, training_id, "Ivan", "Ivanov")
+        token = await log_in_user(next(STUDENT_USER_IDS), student.access_key)
+        first = await service.advance_student(token)
+        second = await service.advance_student(token, first.next_level.id)
+        return first, second
+
+    first, second = run(scenario())
+    assert first.answer is None
+    assert second.answer is not None
+    assert second.next_level is not None and second.next_level.id != first.next_level.id
+
+
+def test_training_report_streams_answers(run, admin_token, log_in_user):
+    async def scenario():
+        training_id = await create_started_training(admin_token, level_count=2)
+        for i in range(2):
+            student = await service.create_student(admin_token, training_id, f"Student {i}")
+            token = await log_in_user(next(STUDENT_USER_IDS), student.access_key)
+            step = await service.advance_student(token)
+            while step.next_level is not None:
+                step = await service.advance_student(token, step.next_level.id)
+        return await service.get_training_report(admin_token, training_id)
+
+    report = run(scenario())
+    try:
+        wb = load_workbook(report.report_file.__absolute_path__, read_only=True)
+        row_counts = {i: len(list(wb[i.__tablename__].iter_rows())) - 1
+                      for i in (AnswerRT, LevelRT, StudentRT, TrainingRT, ReportRT)}
+        wb.close()
+    finally:
+        report.report_file.delete()
+    assert row_counts == {AnswerRT: 4, LevelRT: 2, StudentRT: 2, TrainingRT: 1, ReportRT: 1}
+
+
+def test_create_students_start_at_the_first_level(run, admin_token):
+    full_names = [("Иванов", "Иван", "Иванович"), (None, "Пётр", None)]
+
+    async def scenario():
+        training_id = await create_started_training(admin_token, level_count=2)
+        accounts = await service.create_students(admin_token, training_id, full_names)
+        levels = await service.get_levels_by_training(admin_token, training_id)
+        progress = [await service.get_student_progress(admin_token, i.account_id) for i in accounts]
+        return accounts, levels, progress
+
+    accounts, levels, progress = run(scenario())
+    assert len({i.access_key for i in accounts}) == len(full_names)
+    assert [(i.student.last_name, i.student.first_name, i.student.patronymic) for i in progress] == full_names
+    first_level = min(levels, key=lambda i: i.position)
+    assert all(i.progress_state == StudentProgressState.CREATED for i in progress)
+    assert all(i.current_level.id == first_level.id and i.student.date_complete_training is None for i in progress)
+
+
+def colliding_keys(monkeypatch, taken_key: str, collisions: int):
+    # The first generated keys repeat a key in use, the following ones are new.
+    token_urlsafe = secrets.token_urlsafe
+    calls = itertools.count()
+    monkeypatch.setattr(secrets, "token_urlsafe",
+                        lambda n: taken_key if next(calls) < collisions else token_urlsafe(n))
+
+
+def test_access_key_collision_is_retried(run, admin_token, monkeypatch):
+    async def scenario():
+        training_id = await create_started_training(admin_token)
+        first = await service.create_student(admin_token, training_id, "Иван")
+        colliding_keys(monkeypatch, first.access_key, service.KEY_GENERATION_ATTEMPTS - 1)
+        second = await service.create_student(admin_token, training_id, "Пётр")
+        return first, second
+
+    first, second = run(scenario())
+    assert second.access_key != first.access_key
+
+
+def test_access_key_collisions_give_up(run, admin_token, monkeypatch):
+    async def scenario():
+        training_id = await create_started_training(admin_token)
+        first = await service.create_student(admin_token, training_id, "Иван")
+        colliding_keys(monkeypatch, first.access_key, service.KEY_GENERATION_ATTEMPTS)
+        with pytest.raises(UnknownError):
+            await service.create_student(admin_token, training_id, "Пётр")
+        monkeypatch.undo()
+        return await service.get_all_student_progresses(admin_token, training_id)
+
+    assert [i.student.first_name for i in run(scenario())] == ["Иван"]
+
+
+def bump_key_version_before_regenerating(monkeypatch, bumps: int) -> list[int]:
+    # Another update changes the key between the read and the write of the first attempts.
+    regenerate = getattr(service, "__regenerate_access_key")
+    attempts = []
+
+    async def conflicting_regenerate(s, key):
+        attempts.append(key.id)
+        if len(attempts) <= bumps:
+            # Behind the ORM's back, as a concurrent writer would: the loaded key keeps its old version.
+            await s.execute(text("UPDATE keys SET version = version + 1 WHERE id = :id"), {"id": key.id})
+        await regenerate(s, key)
+
+    monkeypatch.setattr(service, "__regenerate_access_key", conflicting_regenerate)
+    return attempts
+
+
+async def log_in_student(token: str, log_in_user) -> tuple[str, str]:
+    training_id = await create_started_training(token)
+    student = await service.create_student(token, training_id, "Иван")
+    student_token = await log_in_user(next(STUDENT_USER_IDS), student.access_key)
+    # The first log in replaces the access key.
+    log_in_data = await service.get_log_in_data_by_token(student_token)
+    return student_token, log_in_data.access_key
+
+
+def test_version_conflict_is_retried(run, admin_token, log_in_user, monkeypatch):
+    async def scenario():
+        token, access_key = await log_in_student(admin_token, log_in_user)
+        attempts = bump_key_version_before_regenerating(monkeypatch, 1)
+        log_in_data = await service.get_log_in_data_by_token(token, regenerate_access_key=True)
+        monkeypatch.undo()
+        return access_key, log_in_data, await service.get_log_in_data_by_token(token), attempts
+
+    access_key, log_in_data, stored_log_in_data, attempts = run(scenario())
+    assert len(attempts) == 2
+    assert log_in_data.access_key != access_key
+    assert stored_log_in_data.access_key == log_in_data.access_key
+
+
+def test_version_conflicts_give_up(run, admin_token, log_in_user, monkeypatch):
+    async def scenario():
+        token, access_key = await log_in_student(admin_token, log_in_user)
+        attempts = bump_key_version_before_regenerating(monkeypatch, service.CONFLICT_RETRIES)
+        with pytest.raises(ConflictError):
+            await service.get_log_in_data_by_token(token, regenerate_access_key=True)
+        monkeypatch.undo()
+        return access_key, await service.get_log_in_data_by_token(token), attempts
+
+    access_key, log_in_data, attempts = run(scenario())
+    assert len(attempts) == service.CONFLICT_RETRIES
+    assert log_in_data.access_key == access_key
+
+
+async def create_training_with_levels(token: str, titles: list[str]) -> tuple[int, dict[str, int]]:
+    training = await service.create_training(token, "Training")
+    for i in titles:
+        await service.create_level(token, LevelType.INFO, training.id, i, [text_message(i)])
+    levels = await service.get_levels_by_training(token, training.id)
+    return training.id, {i.title: i.id for i in levels}
+
+
+async def level_titles(token: str, training_id: int) -> list[str]:
+    return [i.title for i in await service.get_levels_by_training(token, training_id)]
+
+
+def test_move_level_to_first(run, admin_token):
+    async def scenario():
+        training_id, ids = await create_training_with_levels(admin_token, ["A", "B", "C"])
+        await service.move_level_by_id(admin_token, ids["C"])
+        return await level_titles(admin_token, training_id)
+
+    assert run(scenario()) == ["C", "A", "B"]
+
+
+def test_move_level_after_another(run, admin_token):
+    async def scenario():
+        training_id, ids = await create_training_with_levels(admin_token, ["A", "B", "C", "D"])
+        await service.move_level_by_id(admin_token, ids["A"], ids["C"])
+        first = await level_titles(admin_token, training_id)
+        await service.move_level_by_id(admin_token, ids["D"], ids["B"])
+        return first, await level_titles(admin_token, training_id)
+
+    assert run(scenario()) == (["B", "C", "A", "D"], ["B", "D", "C", "A"])
+
+
+def test_repeated_moves_into_one_gap_renumber_levels(run, admin_token):
+    async def scenario():
+        training_id, ids = await create_training_with_levels(admin_token, ["A", "B", "C", "D"])
+        # D goes below the first step, so renumbering is seen as A leaving its position.
+        await service.move_level_by_id(admin_token, ids["D"])
+        orders = []
+        for i in range(20):
+            moved, other = ("C", "B") if i % 2 == 0 else ("B", "C")
+            await service.move_level_by_id(admin_token, ids[moved], ids["A"])
+            levels = await service.get_levels_by_training(admin_token, training_id)
+            orders.append(([j.title for j in levels], ["D", "A", moved, other]))
+            if levels[1].position != LEVEL_POSITION_STEP:
+                return orders, levels
+        return orders, None
+
+    orders, levels = run(scenario())
+    assert all(order == expected for order, expected in orders)
+    assert levels is not None and len(orders) > 2
+    # The levels are renumbered by steps and the moved level takes the middle of the new gap.
+    assert [i.position for i in levels] == [i * LEVEL_POSITION_STEP for i in (1, 2, 2.5, 3)]
+
+
+def test_delete_training_forgets_level_manifest(run, admin_token):
+    async def scenario():
+        training_id, _ = await create_training_with_levels(admin_token, ["A"])
+        known = training_id in service.training_versions
+        await service.delete_training(admin_token, training_id)
+        return training_id, known
+
+    training_id, known = run(scenario())
+    assert known
+    assert training_id not in service.training_versions and training_id not in service.level_manifests
+
+
+def test_delete_training_forgets_reports(run, admin_token):
+    async def scenario():
+        training_id, _ = await create_training_with_levels(admin_token, ["A"])
+        known = training_id in service.report_versions
+        await service.delete_training(admin_token, training_id)
+        return training_id, known
+
+    training_id, known = run(scenario())
+    assert known
+    assert training_id not in service.report_versions
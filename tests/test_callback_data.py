@@ -0,0 +1,57 @@
+import secrets
+
+import pytest
+from aiogram.filters.callback_data import CallbackData
+
+from data.asvttk_service import asvttk_service as service
+from data.asvttk_service.models import LevelType
+from handlers import admin_employees_handlers, admin_roles_handlers, authorization_handlers, my_account_handlers, \
+    trainings_handlers
+from handlers.admin_employees_handlers import EmployeeCD
+from handlers.admin_roles_handlers import RoleCD
+from handlers.authorization_handlers import FirstLogInWarningCD
+from handlers.handlers_confirmation import ConfirmationCD
+from handlers.handlers_list import ListCD
+from handlers.my_account_handlers import MyAccountCD
+from handlers.student_handlers import LearningCD
+from handlers.trainings_handlers import TrainingCD, LevelCD, StartLevelCD, StudentCD
+from src.utils import CONTENT_TYPE__POLL__QUIZ, CONTENT_TYPE__MEDIA_GROUP
+
+MAX_CALLBACK_DATA_BYTES = 64
+# Ids are INTEGER columns.
+MAX_ID = 2 ** 31 - 1
+MAX_PAGE_INDEX = 999
+MAX_ACTION = 99
+
+WORST_TOKEN = "-" * len(secrets.token_urlsafe(service.SESSION_TOKEN_BYTES))
+TAG_MODULES = [admin_employees_handlers, admin_roles_handlers, authorization_handlers, my_account_handlers,
+               trainings_handlers]
+WORST_TAG = max((getattr(m, i) for m in TAG_MODULES for i in dir(m) if i.startswith("TAG_")), key=len)
+WORST_LEVEL_TYPE = max([LevelType.INFO, LevelType.CONTROL, CONTENT_TYPE__POLL__QUIZ, CONTENT_TYPE__MEDIA_GROUP],
+                       key=len)
+
+WORST_CALLBACKS = [
+    ConfirmationCD(token=WORST_TOKEN, tag=WORST_TAG, is_agree=True, item_id=MAX_ID, args=MAX_ID),
+    ListCD(token=WORST_TOKEN, tag=WORST_TAG, page_index=MAX_PAGE_INDEX, action=MAX_ACTION, arg=MAX_ID,
+           arg1=MAX_PAGE_INDEX, selected_item_id=MAX_ID),
+    LearningCD(token=WORST_TOKEN, action=MAX_ACTION, level_id=MAX_ID, level_type=WORST_LEVEL_TYPE),
+    EmployeeCD(token=WORST_TOKEN, employee_id=MAX_ID, action=MAX_ACTION),
+    RoleCD(token=WORST_TOKEN, role_id=MAX_ID, action=MAX_ACTION),
+    MyAccountCD(token=WORST_TOKEN, action=MAX_ACTION),
+    TrainingCD(token=WORST_TOKEN, training_id=MAX_ID, action=MAX_ACTION),
+    LevelCD(token=WORST_TOKEN, level_id=MAX_ID, training_id=MAX_ID, action=MAX_ACTION),
+    StartLevelCD(token=WORST_TOKEN, training_id=MAX_ID, action=MAX_ACTION),
+    StudentCD(token=WORST_TOKEN, training_id=MAX_ID, student_id=MAX_ID, action=MAX_ACTION),
+    FirstLogInWarningCD(action=MAX_ACTION),
+]
+
+
+@pytest.mark.parametrize("callback_data", WORST_CALLBACKS, ids=lambda i: type(i).__name__)
+def test_worst_case_callback_data_fits(callback_data: CallbackData):
+    # pack() itself raises ValueError when the data is longer than 64 bytes.
+    packed = callback_data.pack()
+    assert len(packed.encode("utf-8")) <= MAX_CALLBACK_DATA_BYTES
+
+
+def test_every_callback_data_is_checked():
+    assert set(CallbackData.__subclasses__()) == {type(i) for i in WORST_CALLBACKS}
@@ -0,0 +1,61 @@
+import json
+from datetime import datetime, timezone
+
+import pytest
+from aiogram.types import Message, Chat, MessageEntity, User, PhotoSize
+
+from data.asvttk_service.message_codec import encode_messages, decode_messages, is_legacy_messages, LazyMessages, \
+    MESSAGES_FORMAT_VERSION
+
+DATE = datetime(2024, 6, 1, 12, 30, tzinfo=timezone.utc)
+CHAT = Chat(id=1, type="private")
+
+
+def messages() -> list[Message]:
+    return [
+        Message(message_id=1, date=DATE, chat=CHAT, text="Текст <b>урока</b>",
+                entities=[MessageEntity(type="bold", offset=6, length=5)]),
+        Message(message_id=2, date=DATE, chat=CHAT, caption="Фото",
+                photo=[PhotoSize(file_id="file", file_unique_id="unique", width=90, height=90)]),
+    ]
+
+
+def test_round_trip():
+    value = encode_messages(messages())
+    assert value.startswith(f"{MESSAGES_FORMAT_VERSION}:")
+    assert not is_legacy_messages(value)
+    assert decode_messages(value) == messages()
+
+
+def test_only_content_is_stored():
+    message = Message(message_id=1, date=DATE, chat=Chat(id=1, type="private", first_name="Иван"), text="Текст",
+                      from_user=User(id=1, is_bot=False, first_name="Иван"))
+    decoded = decode_messages(encode_messages([message]))[0]
+    assert decoded.text == "Текст"
+    assert decoded.from_user is None
+    assert decoded.chat == CHAT
+
+
+def test_legacy_messages():
+    value = json.dumps([i.model_dump_json() for i in messages()])
+    assert is_legacy_messages(value)
+    assert decode_messages(value) == messages()
+    assert decode_messages(encode_messages(decode_messages(value))) == messages()
+
+
+def test_messages_are_decoded_lazily():
+    decoded = decode_messages(encode_messages(messages()))
+    assert all(isinstance(i, str) for i in decoded.raw_items())
+    assert decoded[1].caption == "Фото"
+    assert [type(i) for i in decoded.raw_items()] == [str, Message]
+    assert encode_messages(decoded) == encode_messages(messages())
+
+
+def test_empty_messages():
+    assert decode_messages(encode_messages([])) == []
+    assert isinstance(decode_messages(encode_messages([])), LazyMessages)
+
+
+def test_unknown_format_version():
+    with pytest.raises(ValueError):
+        decode_messages(f"{MESSAGES_FORMAT_VERSION + 1}:" + encode_messages(messages()).split(":", 1)[1])
@@ -0,0 +1,124 @@
+import asyncio
+import dataclasses
+import json
+import os
+import tempfile
+from datetime import datetime, timezone
+
+from aiogram.types import Message, Chat
+from sqlalchemy import text, inspect, select
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
+from data.asvttk_service.message_codec import is_legacy_messages, decode_messages
+from data.asvttk_service.migrations import migrate, get_schema_version, SCHEMA_VERSION
+from data.asvttk_service.models import AccountOrm, LevelOrm, StudentProgressState, TrainingOrm, KeyOrm
+
+# The tables as they were before the first migration: levels are a linked list, messages are JSON lists.
+BASELINE_SCHEMA = [
+    "CREATE TABLE trainings (id INTEGER PRIMARY KEY AUTOINCREMENT, name VARCHAR NOT NULL, message VARCHAR, "
+    "date_create INTEGER NOT NULL, date_start INTEGER, date_end INTEGER)",
+    "CREATE TABLE accounts (id INTEGER PRIMARY KEY AUTOINCREMENT, type VARCHAR(8) NOT NULL, email VARCHAR, "
+    "date_create INTEGER NOT NULL, first_name VARCHAR NOT NULL, last_name VARCHAR, patronymic VARCHAR, "
+    "training_id INTEGER REFERENCES trainings (id) ON DELETE CASCADE, date_complete_training INTEGER)",
+    "CREATE TABLE levels (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+    "previous_level_id INTEGER REFERENCES levels (id) ON DELETE SET NULL, "
+    "next_level_id INTEGER REFERENCES levels (id) ON DELETE SET NULL, "
+    "training_id INTEGER NOT NULL REFERENCES trainings (id) ON DELETE CASCADE, type VARCHAR NOT NULL, "
+    "date_create INTEGER NOT NULL, title VARCHAR NOT NULL, messages VARCHAR)",
+    "CREATE TABLE level_answers (id INTEGER PRIMARY KEY AUTOINCREMENT, date_create INTEGER NOT NULL, "
+    "account_id INTEGER NOT NULL REFERENCES accounts (id) ON DELETE CASCADE, "
+    "level_id INTEGER NOT NULL REFERENCES levels (id) ON DELETE CASCADE, answer_option_ids JSON, is_correct BOOLEAN)",
+    "CREATE TABLE keys (id INTEGER PRIMARY KEY AUTOINCREMENT, access_key VARCHAR NOT NULL UNIQUE, "
+    "date_create INTEGER NOT NULL, is_first_log_in BOOLEAN NOT NULL, "
+    "account_id INTEGER NOT NULL REFERENCES accounts (id) ON DELETE CASCADE)",
+]
+DATE = datetime(2024, 6, 1, tzinfo=timezone.utc)
+MESSAGE = Message(message_id=1, date=DATE, chat=Chat(id=1, type="private"), text="Текст")
+LEGACY_MESSAGES = json.dumps([MESSAGE.model_dump_json()])
+
+
+async def create_baseline(conn):
+    for statement in BASELINE_SCHEMA:
+        await conn.execute(text(statement))
+    await conn.execute(text("INSERT INTO trainings (id, name, message, date_create) VALUES (1, 'Training', :m, 0)"),
+                       {"m": LEGACY_MESSAGES})
+    # The order of the levels is 3, 1, 2.
+    await conn.execute(text("INSERT INTO levels (id, previous_level_id, next_level_id, training_id, type, date_create, "
+                            "title, messages) VALUES (:id, :previous, :next, 1, 'info', 0, 'Level', :m)"),
+                       [{"id": 3, "previous": None, "next": 1, "m": LEGACY_MESSAGES},
+                        {"id": 1, "previous": 3, "next": 2, "m": LEGACY_MESSAGES},
+                        {"id": 2, "previous": 1, "next": None, "m": LEGACY_MESSAGES}])
+    await conn.execute(text("INSERT INTO accounts (id, type, date_create, first_name, training_id) "
+                            "VALUES (:id, 'STUDENT', 0, 'Student', 1)"), [{"id": 1}, {"id": 2}, {"id": 3}])
+    await conn.execute(text("INSERT INTO keys (access_key, date_create, is_first_log_in, account_id) "
+                            "VALUES ('key', 0, 1, 1)"))
+    # The first student answered the first level twice, the third one answered all levels.
+    await conn.execute(text("INSERT INTO level_answers (date_create, account_id, level_id, is_correct) "
+                            "VALUES (0, :account_id, :level_id, 1)"),
+                       [{"account_id": 1, "level_id": 3}, {"account_id": 1, "level_id": 3},
+                        {"account_id": 3, "level_id": 3}, {"account_id": 3, "level_id": 1},
+                        {"account_id": 3, "level_id": 2}])
+
+
+@dataclasses.dataclass
+class MigratedDatabase:
+    version: int
+    indexes: list[dict]
+    levels: list[LevelOrm]
+    students: list[AccountOrm]
+    trainings: list[TrainingOrm]
+    keys: list[KeyOrm]
+    answer_count: int
+    raw_messages: list[str]
+
+
+async def migrate_database(create=None) -> MigratedDatabase:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'asvttk.db')}")
+    try:
+        async with engine.begin() as conn:
+            if create:
+                await create(conn)
+            await migrate(conn)
+        async with engine.begin() as conn:
+            # A second run finds the database up to date.
+            await migrate(conn)
+            version = await get_schema_version(conn)
+            indexes = await conn.run_sync(lambda c: inspect(c).get_indexes("level_answers"))
+        async with AsyncSession(engine) as s:
+            return MigratedDatabase(
+                version=version, indexes=indexes,
+                levels=(await s.scalars(select(LevelOrm).order_by(LevelOrm.position))).all(),
+                students=(await s.scalars(select(AccountOrm).order_by(AccountOrm.id))).all(),
+                trainings=(await s.scalars(select(TrainingOrm))).all(),
+                keys=(await s.scalars(select(KeyOrm))).all(),
+                answer_count=(await s.execute(text("SELECT COUNT(id) FROM level_answers"))).scalar(),
+                raw_messages=(await s.execute(text("SELECT messages FROM levels"))).scalars().all(),
+            )
+    finally:
+        await engine.dispose()
+
+
+def test_new_database():
+    db = asyncio.run(migrate_database())
+    assert db.version == SCHEMA_VERSION
+    assert "ux_level_answers_account_id_level_id" in [i["name"] for i in db.indexes]
+    assert (db.levels, db.students, db.trainings, db.keys, db.answer_count) == ([], [], [], [], 0)
+
+
+def test_baseline_database():
+    db = asyncio.run(migrate_database(create_baseline))
+    assert db.version == SCHEMA_VERSION
+    assert [i.id for i in db.levels] == [3, 1, 2]
+    assert not any(is_legacy_messages(i) for i in db.raw_messages)
+    assert all(i.messages == decode_messages(LEGACY_MESSAGES) for i in db.levels)
+    assert db.trainings[0].message == decode_messages(LEGACY_MESSAGES)
+    assert db.answer_count == 4
+    assert [(i.progress_state, i.current_level_id, i.answered_count, i.correct_count) for i in db.students] == [
+        (StudentProgressState.LEARNING, 1, 1, 1),
+        (StudentProgressState.CREATED, 3, 0, 0),
+        (StudentProgressState.COMPLETED, None, 3, 3),
+    ]
+    assert len(db.keys) == 1
+    assert all(i.version == 1 for i in [*db.levels, *db.students, *db.trainings, *db.keys])
+    assert {"name": "ux_level_answers_account_id_level_id", "column_names": ["account_id", "level_id"],
+            "unique": 1} in [{k: i[k] for k in ("name", "column_names", "unique")} for i in db.indexes]
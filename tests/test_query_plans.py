@@ -0,0 +1,39 @@
+import pytest
+from sqlalchemy import select, text, func
+
+from data.asvttk_service.database import database
+from data.asvttk_service.models import AccountOrm, LevelAnswerOrm, LevelOrm, SessionOrm, KeyOrm, AccountType
+
+pytestmark = pytest.mark.skipif(database.engine.dialect.name != "sqlite", reason="EXPLAIN QUERY PLAN is SQLite's")
+
+
+async def explain(query) -> str:
+    sql = query.compile(database.engine, compile_kwargs={"literal_binds": True})
+    async with database.engine.connect() as conn:
+        res = await conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))
+        return "\n".join(i[-1] for i in res.all())
+
+
+@pytest.mark.parametrize("query, index", [
+    (select(LevelAnswerOrm).filter(LevelAnswerOrm.account_id == 1, LevelAnswerOrm.level_id == 1),
+     "ux_level_answers_account_id_level_id"),
+    (select(AccountOrm.id, func.count(LevelAnswerOrm.id))
+     .outerjoin(LevelAnswerOrm, LevelAnswerOrm.account_id == AccountOrm.id)
+     .filter(AccountOrm.training_id == 1).group_by(AccountOrm.id), "ux_level_answers_account_id_level_id"),
+    (select(LevelOrm.id, func.count(LevelAnswerOrm.id))
+     .outerjoin(LevelAnswerOrm, LevelAnswerOrm.level_id == LevelOrm.id)
+     .filter(LevelOrm.training_id == 1).group_by(LevelOrm.id), "ix_level_answers_level_id"),
+    (select(AccountOrm).filter(AccountOrm.training_id == 1), "ix_accounts_training_id"),
+    (select(AccountOrm).filter(AccountOrm.type == AccountType.EMPLOYEE), "ix_accounts_type"),
+    (select(KeyOrm).filter(KeyOrm.account_id == 1), "ix_keys_account_id"),
+    (select(SessionOrm).filter(SessionOrm.key_id == 1), "ix_sessions_key_id"),
+    (select(SessionOrm).filter(SessionOrm.user_id == 1), "ix_sessions_user_id"),
+])
+def test_query_uses_index(run, query, index):
+    assert index in run(explain(query))
+
+
+def test_levels_are_read_in_position_order_from_the_index(run):
+    plan = run(explain(select(LevelOrm).filter(LevelOrm.training_id == 1).order_by(LevelOrm.position)))
+    assert "ix_levels_training_id_position" in plan
+    assert "TEMP B-TREE" not in plan
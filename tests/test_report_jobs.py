@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from data.asvttk_service import unit_of_work
+from data.asvttk_service.exceptions import ReportJobAlreadyExistsError, ReportJobCancelledError, \
+    ReportJobQueueIsFullError
+from data.asvttk_service.report_jobs import ReportJobQueue
+
+
+async def wait_forever(started: asyncio.Event):
+    started.set()
+    await asyncio.sleep(3600)
+
+
+def test_one_job_per_key():
+    async def scenario():
+        queue = ReportJobQueue(workers=1)
+        started = asyncio.Event()
+        try:
+            job = asyncio.create_task(queue.run("chat", lambda: wait_forever(started)))
+            await started.wait()
+            with pytest.raises(ReportJobAlreadyExistsError):
+                await queue.run("chat", lambda: wait_forever(asyncio.Event()))
+            assert queue.cancel("chat")
+            with pytest.raises(ReportJobCancelledError):
+                await job
+        finally:
+            await queue.close()
+
+    asyncio.run(scenario())
+
+
+def test_cancel_stops_the_running_job():
+    async def scenario():
+        queue = ReportJobQueue(workers=1)
+        started = asyncio.Event()
+        try:
+            job = asyncio.create_task(queue.run("chat", lambda: wait_forever(started)))
+            await started.wait()
+            assert queue.cancel("chat")
+            with pytest.raises(ReportJobCancelledError):
+                await job
+            assert not queue.cancel("chat")
+            # The worker is free again.
+            assert await queue.run("chat", lambda: asyncio.sleep(0, "done")) == "done"
+        finally:
+            await queue.close()
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_is_rejected():
+    async def scenario():
+        queue = ReportJobQueue(workers=1, max_size=1)
+        started = asyncio.Event()
+        try:
+            running = asyncio.create_task(queue.run(1, lambda: wait_forever(started)))
+            await started.wait()
+            queued = asyncio.create_task(queue.run(2, lambda: wait_forever(asyncio.Event())))
+            await asyncio.sleep(0)
+            with pytest.raises(ReportJobQueueIsFullError):
+                await queue.run(3, lambda: wait_forever(asyncio.Event()))
+            queue.cancel(1)
+            queue.cancel(2)
+            await asyncio.gather(running, queued, return_exceptions=True)
+        finally:
+            await queue.close()
+
+    asyncio.run(scenario())
+
+
+def test_jobs_run_in_the_context_of_their_requester():
+    async def request(queue: ReportJobQueue, user_id: int):
+        async with unit_of_work.begin(user_id):
+            return await queue.run(user_id, get_user_id)
+
+    async def get_user_id():
+        await asyncio.sleep(0)
+        return unit_of_work.get_user_id()
+
+    async def scenario():
+        queue = ReportJobQueue(workers=1)
+        try:
+            first = await request(queue, 1)
+            second = await request(queue, 2)
+            return first, second
+        finally:
+            await queue.close()
+
+    assert asyncio.run(scenario()) == (1, 2)
@@ -0,0 +1,63 @@
+import dataclasses
+import time
+from datetime import datetime
+
+import pytest
+
+from data.asvttk_service.xlsx_generation.convertes import LIST, MSKDATE, ENUM
+from data.asvttk_service.xlsx_generation.tables import AnswerRT, StudentRT, ResultConverter, RStudentState
+
+BENCHMARK_ROW_COUNT = 20000
+BENCHMARK_REPEATS = 3
+
+
+def answers(count: int) -> list[AnswerRT]:
+    return [AnswerRT(id=i, training_id=1, student_id=i % 100, level_id=i % 10, date=datetime.fromtimestamp(i),
+                     select_answer="1, 2", result=[True, False, None][i % 3]) for i in range(count)]
+
+
+def students(count: int) -> list[StudentRT]:
+    return [StudentRT(id=i, first_name="Иван", last_name="Иванов", patronymic=None,
+                      date_create=datetime.fromtimestamp(i), state=list(RStudentState)[i % 3], progress=i / count,
+                      answered_count=i, correct_count=i // 2) for i in range(count)]
+
+
+def convert_row_by_row(tables: list) -> list[list]:
+    # The conversion that batches replaced: every value of every row goes through convert().
+    res = []
+    for table in tables:
+        columns = list(table.__columns__.values())
+        values = list(dataclasses.asdict(table).values())
+        res.append([c.converter.convert(v) if c.converter else v for c, v in zip(columns, values)])
+    return res
+
+
+@pytest.mark.parametrize("converter, values", [
+    (LIST(), [[1, 2], [], None, ["a"]]),
+    (MSKDATE(), [datetime(2024, 6, 1, 12, 30), None]),
+    (ENUM(), [RStudentState.CREATED, None, RStudentState.CREATED, RStudentState.COMPLETED]),
+    (ResultConverter(), [True, False, None, 1, 0]),
+])
+def test_convert_many_matches_convert(converter, values):
+    assert converter.convert_many(values) == [converter.convert(i) for i in values]
+
+
+@pytest.mark.parametrize("tables", [answers(10), students(10)])
+def test_batch_conversion_matches_rows(tables):
+    table_type = type(tables[0])
+    assert table_type.__convert_rows__(tables) == convert_row_by_row(tables)
+    assert tables[0].__values_converted__ == convert_row_by_row(tables)[0]
+
+
+def best_time(func, *args) -> float:
+    res = float("inf")
+    for _ in range(BENCHMARK_REPEATS):
+        start = time.perf_counter()
+        func(*args)
+        res = min(res, time.perf_counter() - start)
+    return res
+
+
+def test_batch_conversion_is_faster_than_rows():
+    tables = answers(BENCHMARK_ROW_COUNT)
+    assert best_time(AnswerRT.__convert_columns__, tables) < best_time(convert_row_by_row, tables)
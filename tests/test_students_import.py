@@ -0,0 +1,64 @@
+import io
+
+import pytest
+from openpyxl import Workbook
+
+from handlers.value_validators import valid_full_names, ValueNotValidError
+from src.utils import read_document_rows, get_full_name_from_row, DOCUMENT_EXTENSION__CSV, DOCUMENT_EXTENSION__XLSX
+
+ROWS = [["Иванов", "Иван", "Иванович"], ["", "", ""], ["Петров Пётр -"], ["Сидорова", "Анна", ""]]
+FULL_NAMES = [("Иванов", "Иван", "Иванович"), ("Петров", "Пётр", None), ("Сидорова", "Анна", None)]
+
+
+def csv_document(delimiter: str) -> io.BytesIO:
+    text = "\r\n".join(delimiter.join(i) for i in ROWS)
+    return io.BytesIO(text.encode("utf-8-sig"))
+
+
+def xlsx_document() -> io.BytesIO:
+    wb = Workbook()
+    for row in ROWS:
+        wb.active.append([i or None for i in row])
+    file = io.BytesIO()
+    wb.save(file)
+    file.seek(0)
+    return file
+
+
+@pytest.mark.parametrize("delimiter", [",", ";", "\t"])
+def test_csv_document(delimiter):
+    rows = read_document_rows(csv_document(delimiter), DOCUMENT_EXTENSION__CSV)
+    assert valid_full_names((get_full_name_from_row(i) for i in rows), 10, null_if_empty=True) == FULL_NAMES
+
+
+def test_xlsx_document():
+    rows = read_document_rows(xlsx_document(), DOCUMENT_EXTENSION__XLSX)
+    assert valid_full_names((get_full_name_from_row(i) for i in rows), 10, null_if_empty=True) == FULL_NAMES
+
+
+def test_unknown_document_extension():
+    with pytest.raises(ValueError):
+        list(read_document_rows(io.BytesIO(), "txt"))
+
+
+@pytest.mark.parametrize("row, full_name", [
+    (["Иванов Иван Иванович"], "Иванов Иван Иванович"),
+    ([" Иванов ", "Иван", "Иванович", "", ""], "Иванов Иван Иванович"),
+    (["Иванов", "Иван"], "Иванов Иван -"),
+    (["", "Иван", ""], "- Иван -"),
+    (["", ""], ""),
+    ([], ""),
+])
+def test_full_name_from_row(row, full_name):
+    assert get_full_name_from_row(row) == full_name
+
+
+def test_every_invalid_row_is_reported():
+    with pytest.raises(ValueNotValidError) as e:
+        valid_full_names(["Иванов Иван -", "Петров", "", "Сидоров - -"], 10)
+    assert "2" in e.value.error_msg and "4" in e.value.error_msg
+
+
+def test_too_many_rows():
+    with pytest.raises(ValueNotValidError):
+        valid_full_names(["Иванов Иван -"] * 3, 2)
@@ -0,0 +1,134 @@
+import asyncio
+import functools
+
+import pytest
+from aiogram import Bot
+from aiogram.methods import GetMe
+
+from config import settings
+from data.asvttk_service import asvttk_service as service, unit_of_work
+from data.asvttk_service.caches import LRUCache
+from data.asvttk_service.database import database
+from data.asvttk_service.models import TrainingOrm
+from middlewares.unit_of_work_middleware import UnitOfWorkRequestMiddleware
+
+
+async def is_committed(training_id: int) -> bool:
+    async with database.session_factory() as s:
+        return await s.get(TrainingOrm, training_id) is not None
+
+
+def test_telegram_request_commits_the_unit_of_work(run, admin_token):
+    middleware = UnitOfWorkRequestMiddleware(bot=None)
+
+    async def scenario():
+        async with unit_of_work.begin(1):
+            training = await service.create_training(admin_token, "Training")
+            committed = [await is_committed(training.id)]
+
+            async def make_request(bot, method):
+                committed.append(await is_committed(training.id))
+
+            await middleware(make_request, Bot(settings.BOT_TOKEN), GetMe())
+        return committed
+
+    assert run(scenario()) == [False, True]
+
+
+STICKINESS = 0.05
+
+
+class FakeSession:
+    # Tells which session factory made it.
+    def __init__(self, factory: str):
+        self.factory = factory
+        self.read_only = False
+        self.savepoint = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def begin_nested(self):
+        return FakeSavepoint()
+
+    async def commit(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+class FakeSavepoint:
+    is_active = False
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    monkeypatch.setattr(database, "has_replica", True)
+    monkeypatch.setattr(unit_of_work, "recent_writers", LRUCache(ttl=STICKINESS))
+    for module in (database, unit_of_work):
+        for name in ("session_factory", "read_only_session_factory", "replica_session_factory"):
+            monkeypatch.setattr(module, name, functools.partial(FakeSession, name))
+
+
+async def read_session_factories(user_id: int) -> list[str]:
+    # The sessions of a read in a unit of work and of a read outside of it.
+    async with unit_of_work.begin(user_id):
+        async with unit_of_work.session(read_only=True) as s:
+            res = [s.factory]
+    async with unit_of_work.session(read_only=True) as s:
+        res.append(s.factory)
+    return res
+
+
+async def write(user_id: int):
+    async with unit_of_work.begin(user_id):
+        async with unit_of_work.session() as s:
+            assert s.factory == "session_factory"
+
+
+def test_stickiness_follows_settings():
+    assert unit_of_work.recent_writers.ttl == settings.DATABASE_REPLICA_STICKINESS
+    assert unit_of_work.recent_writers.max_size == settings.DATABASE_REPLICA_STICKY_WRITERS
+
+
+def test_reads_go_to_the_replica(replica):
+    assert asyncio.run(read_session_factories(1)) == ["replica_session_factory", "replica_session_factory"]
+
+
+def test_writer_reads_from_the_primary_for_a_while(replica):
+    async def scenario():
+        await write(1)
+        pinned = await read_session_factories(1)
+        other_user = await read_session_factories(2)
+        await asyncio.sleep(STICKINESS * 2)
+        return pinned, other_user, await read_session_factories(1)
+
+    pinned, other_user, released = asyncio.run(scenario())
+    # Outside a unit of work the user is not known, so such reads always go to the replica.
+    assert pinned == ["read_only_session_factory", "replica_session_factory"]
+    assert other_user == ["replica_session_factory", "replica_session_factory"]
+    assert released == ["replica_session_factory", "replica_session_factory"]
+
+
+def test_writes_do_not_pin_without_a_replica(replica, monkeypatch):
+    monkeypatch.setattr(database, "has_replica", False)
+    asyncio.run(write(1))
+    assert 1 not in unit_of_work.recent_writers
+
+
+def test_delayed_invalidation_needs_a_replica(monkeypatch):
+    monkeypatch.setattr(settings, "DATABASE_REPLICA_STICKINESS", STICKINESS)
+
+    async def invalidations(has_replica: bool) -> int:
+        monkeypatch.setattr(database, "has_replica", has_replica)
+        calls = []
+        unit_of_work.invalidate(lambda: calls.append(1))
+        await asyncio.sleep(STICKINESS * 2)
+        return len(calls)
+
+    assert asyncio.run(invalidations(False)) == 1
+    assert asyncio.run(invalidations(True)) == 2
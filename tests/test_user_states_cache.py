@@ -0,0 +1,153 @@
+import asyncio
+
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError
+
+from data.asvttk_service import user_states_service
+from data.asvttk_service.user_states_cache import UserStatesCache
+
+FLUSH_DELAY = 0.01
+BAD_KEY = (13, 13)
+
+
+class FakeUserStates:
+    # The table behind the cache: counts the reads and writes, and fails the writes it is told to.
+    def __init__(self, monkeypatch):
+        self.rows: dict[tuple[int, int], tuple] = {}
+        self.loads: list[tuple[int, int]] = []
+        self.flushes: list[dict] = []
+        self.failures = 0
+        monkeypatch.setattr(user_states_service, "get_state_and_data", self.get_state_and_data)
+        monkeypatch.setattr(user_states_service, "set_states_and_data", self.set_states_and_data)
+
+    async def get_state_and_data(self, user_id: int, chat_id: int):
+        self.loads.append((user_id, chat_id))
+        return self.rows.get((user_id, chat_id), (None, {}))
+
+    async def set_states_and_data(self, items: dict):
+        self.flushes.append(dict(items))
+        if self.failures:
+            self.failures -= 1
+            raise OperationalError("INSERT", {}, Exception("database is locked"))
+        if BAD_KEY in items:
+            raise IntegrityError("INSERT", {}, Exception("UNIQUE constraint failed: user_states.chat_id"))
+        self.rows.update(items)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    return FakeUserStates(monkeypatch)
+
+
+def test_writes_are_coalesced(db):
+    async def scenario():
+        cache = UserStatesCache(flush_delay=FLUSH_DELAY)
+        await cache.set_state(1, 1, "first")
+        await cache.set_state(1, 1, "second")
+        await cache.set_data(1, 1, {"key": 1})
+        await asyncio.sleep(FLUSH_DELAY * 5)
+        return await cache.close()
+
+    assert asyncio.run(scenario()) == 0
+    assert db.flushes == [{(1, 1): ("second", {"key": 1})}]
+
+
+def test_entries_expire(db):
+    async def scenario():
+        cache = UserStatesCache(ttl=0.05)
+        await cache.get_state(1, 1)
+        await cache.get_state(1, 1)
+        await asyncio.sleep(0.1)
+        await cache.get_state(1, 1)
+
+    asyncio.run(scenario())
+    assert db.loads == [(1, 1), (1, 1)]
+
+
+def test_least_recently_used_entry_is_evicted(db):
+    async def scenario():
+        cache = UserStatesCache(max_size=2)
+        for key in [(1, 1), (2, 2), (1, 1), (3, 3), (1, 1), (2, 2)]:
+            await cache.get_state(*key)
+
+    asyncio.run(scenario())
+    assert db.loads == [(1, 1), (2, 2), (3, 3), (2, 2)]
+
+
+def test_state_set_during_a_read_is_kept(db, monkeypatch):
+    db.rows[(1, 1)] = ("stale", {})
+
+    async def scenario():
+        release = asyncio.Event()
+        load = db.get_state_and_data
+
+        async def slow_first_load(user_id, chat_id):
+            monkeypatch.setattr(user_states_service, "get_state_and_data", load)
+            res = await load(user_id, chat_id)
+            await release.wait()
+            return res
+
+        monkeypatch.setattr(user_states_service, "get_state_and_data", slow_first_load)
+        cache = UserStatesCache(flush_delay=FLUSH_DELAY)
+        read = asyncio.create_task(cache.get_state(1, 1))
+        await asyncio.sleep(0)
+        await cache.set_state(1, 1, "new")
+        release.set()
+        res = await read, await cache.get_state(1, 1)
+        await cache.close()
+        return res
+
+    assert asyncio.run(scenario()) == ("new", "new")
+    assert db.rows[(1, 1)] == ("new", {})
+
+
+def test_failed_flush_is_retried(db):
+    db.failures = 2
+
+    async def scenario():
+        cache = UserStatesCache(flush_delay=FLUSH_DELAY)
+        await cache.set_state(1, 1, "state")
+        await asyncio.sleep(FLUSH_DELAY * 20)
+        return await cache.close()
+
+    assert asyncio.run(scenario()) == 0
+    assert len(db.flushes) == 3
+    assert db.rows[(1, 1)] == ("state", {})
+
+
+def test_row_breaking_a_constraint_is_dropped(db):
+    async def scenario():
+        cache = UserStatesCache(flush_delay=FLUSH_DELAY)
+        await cache.set_state(1, 1, "state")
+        await cache.set_state(*BAD_KEY, "state")
+        await cache.set_state(2, 2, "state")
+        await asyncio.sleep(FLUSH_DELAY * 5)
+        return await cache.close()
+
+    assert asyncio.run(scenario()) == 1
+    assert set(db.rows) == {(1, 1), (2, 2)}
+
+
+def test_retries_are_capped(db):
+    db.failures = 100
+
+    async def scenario():
+        cache = UserStatesCache(flush_delay=FLUSH_DELAY, max_flush_attempts=3)
+        await cache.set_state(1, 1, "state")
+        await asyncio.sleep(FLUSH_DELAY * 20)
+        flush_count = len(db.flushes)
+        return flush_count, await cache.close()
+
+    assert asyncio.run(scenario()) == (3, 1)
+
+
+def test_close_reports_unsaved_states(db):
+    db.failures = 100
+
+    async def scenario():
+        cache = UserStatesCache(flush_delay=10)
+        await cache.set_state(1, 1, "state")
+        await cache.set_state(2, 2, "state")
+        return await cache.close()
+
+    assert asyncio.run(scenario()) == 2
@@ -0,0 +1,68 @@
+import itertools
+
+from sqlalchemy import event
+
+from data.asvttk_service import user_states_service
+from data.asvttk_service.database import database
+
+USER_IDS = itertools.count(5000)
+
+writes: list[str] = []
+
+
+def record_writes(conn, cursor, statement, *args):
+    if statement.lstrip().upper().startswith(("INSERT", "UPDATE", "DELETE")):
+        writes.append(statement)
+
+
+def test_known_state_is_read_without_writing(run):
+    user_id = next(USER_IDS)
+
+    async def scenario():
+        await user_states_service.set_state(user_id, user_id, "state")
+        writes.clear()
+        event.listen(database.engine.sync_engine, "before_cursor_execute", record_writes)
+        try:
+            return await user_states_service.get_state_and_data(user_id, user_id)
+        finally:
+            event.remove(database.engine.sync_engine, "before_cursor_execute", record_writes)
+
+    assert run(scenario()) == ("state", {})
+    assert writes == []
+
+
+def test_missing_state_is_created(run):
+    user_id = next(USER_IDS)
+
+    async def scenario():
+        res = await user_states_service.get_state_and_data(user_id, user_id)
+        await user_states_service.set_data(user_id, user_id, {"key": 1})
+        return res, await user_states_service.get_state_and_data(user_id, user_id)
+
+    assert run(scenario()) == ((None, {}), (None, {"key": 1}))
+
+
+def test_state_of_another_chat_is_not_returned(run):
+    user_id, other_user_id = next(USER_IDS), next(USER_IDS)
+
+    async def scenario():
+        await user_states_service.set_state(user_id, user_id, "state")
+        await user_states_service.set_state(other_user_id, other_user_id, "other state")
+        # The same user in another chat, and another user in the chat of the first one.
+        return (await user_states_service.get_state_and_data(user_id, next(USER_IDS)),
+                await user_states_service.get_state_and_data(next(USER_IDS), user_id),
+                await user_states_service.get_state_and_data(user_id, user_id))
+
+    assert run(scenario()) == ((None, {}), (None, {}), ("state", {}))
+
+
+def test_batch_with_two_chats_of_one_user(run):
+    user_id = next(USER_IDS)
+    chat_ids = [next(USER_IDS), next(USER_IDS)]
+
+    async def scenario():
+        await user_states_service.set_states_and_data({(user_id, chat_ids[0]): ("first", {}),
+                                                       (user_id, chat_ids[1]): ("second", {"key": 1})})
+        return [await user_states_service.get_state(user_id, i) for i in chat_ids]
+
+    assert run(scenario()) == [None, "second"]
@@ -0,0 +1,99 @@
+import asyncio
+import csv
+import subprocess
+import sys
+from datetime import datetime
+
+import pytest
+from openpyxl import load_workbook
+
+from data.asvttk_service.xlsx_generation import xlsx_engine
+from data.asvttk_service.xlsx_generation.tables import ReportRT
+from data.asvttk_service.xlsx_generation.types import ReportFormat
+
+ROW_COUNT = xlsx_engine.REPORT_CHUNK_SIZE * xlsx_engine.REPORT_QUEUE_CHUNKS * 2 + 1
+
+
+@pytest.fixture
+def engine():
+    # One worker: a worker left waiting for rows would block every later report.
+    xlsx_engine.start_executor(max_workers=1)
+    yield xlsx_engine
+    xlsx_engine.shutdown_executor()
+
+
+def report_tables():
+    for i in range(ROW_COUNT):
+        yield ReportRT(date_create=datetime.fromtimestamp(i))
+
+
+async def async_report_tables():
+    for i in report_tables():
+        yield i
+
+
+@pytest.mark.parametrize("tables", [report_tables, async_report_tables])
+def test_report_is_streamed_to_the_worker(engine, tables):
+    report_file = asyncio.run(engine.create_report("test_report", [ReportRT], tables(), ReportFormat.CSV))
+    try:
+        with open(report_file.__absolute_path__, encoding="utf-8") as f:
+            assert len(list(csv.reader(f))) == ROW_COUNT + 1
+    finally:
+        report_file.delete()
+
+
+def test_xlsx_report(engine):
+    report_file = asyncio.run(engine.create_xlsx("test_report", [ReportRT], report_tables()))
+    try:
+        wb = load_workbook(report_file.__absolute_path__, read_only=True)
+        assert len(list(wb[ReportRT.__tablename__].iter_rows())) == ROW_COUNT + 1
+        wb.close()
+    finally:
+        report_file.delete()
+
+
+def test_failed_producer_stops_the_worker(engine):
+    calls = []
+
+    async def on_tables_read():
+        calls.append("read")
+
+    def failing_tables():
+        yield from list(report_tables())[:xlsx_engine.REPORT_CHUNK_SIZE * 2]
+        raise RuntimeError("database is gone")
+
+    with pytest.raises(RuntimeError, match="database is gone"):
+        asyncio.run(engine.create_report("test_report", [ReportRT], failing_tables(), ReportFormat.CSV,
+                                         on_tables_read))
+    assert calls == []
+    report_file = asyncio.run(engine.create_report("test_report", [ReportRT], report_tables(), ReportFormat.CSV))
+    report_file.delete()
+
+
+def test_parquet_report(engine):
+    parquet = pytest.importorskip("pyarrow.parquet")
+    report_file = asyncio.run(engine.create_report("test_report", [ReportRT], report_tables(), ReportFormat.PARQUET))
+    try:
+        assert parquet.read_table(report_file.__absolute_path__).num_rows == ROW_COUNT
+    finally:
+        report_file.delete()
+
+
+def test_tables_are_released_once_read(engine):
+    calls = []
+
+    async def on_tables_read():
+        calls.append("read")
+
+    report_file = asyncio.run(engine.create_report("test_report", [ReportRT], report_tables(), ReportFormat.CSV,
+                                                   on_tables_read))
+    report_file.delete()
+    assert calls == ["read"]
+
+
+
+def test_workers_do_not_import_the_bot():
+    # A spawned worker runs main.py again as __mp_main__.
+    code = "import runpy, sys; runpy.run_path('main.py', run_name='__mp_main__'); print('aiogram' in sys.modules)"
+    res = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert res.stdout.strip() == "False"